@@ -5,13 +5,19 @@ from PIL import Image, ImageTk
 import time
 import numpy as np
 
-from modules.face_recognition_ai import FaceRecognitionAI as FaceRecognitionSystem
-from modules.emotion_analysis import EmotionAnalyzer
 from modules.database import DatabaseManager
+from modules.face_tracker import FaceTracker
+from modules.inference_worker import InferenceWorker
+from modules.detection_writer import DetectionWriter
+from modules.camera_utils import CameraGrabber, abrir_fuente
+from modules.detection_pipeline import DetectionPipeline
 
 class DetectionWindow:
-    def __init__(self, parent):
+    def __init__(self, parent, fuente=None, velocidad=1.0, detector='haar'):
         self.parent = parent
+        # Cámara por defecto; un video, directorio o 'sintetico' para reproducir grabaciones
+        self.fuente = fuente
+        self.velocidad = velocidad
         self.window = tk.Toplevel(parent)
         self.window.title("Detección en Tiempo Real - IA Optimizada")
         self.window.geometry("1200x800")
@@ -19,16 +25,29 @@ class DetectionWindow:
         self.window.protocol("WM_DELETE_WINDOW", self.cerrar)
         
         
+        # Los módulos de IA (torch, keras) se importan recién aquí; al iniciar
+        # la aplicación el precalentamiento ya los importa en segundo plano
+        from modules.face_recognition_ai import FaceRecognitionAI as FaceRecognitionSystem
+        from modules.emotion_analysis import EmotionAnalyzer
         self.face_system = FaceRecognitionSystem()
         self.emotion_analyzer = EmotionAnalyzer()
         self.db = DatabaseManager()
+        # El historial se escribe en lotes desde otro hilo
+        self.escritor = DetectionWriter(self.db)
+        self.escritor.iniciar()
         
         self.cap = None
+        self.grabber = None
+        self.ultima_secuencia = 0
         self.detection_enabled = False
         self.ultima_deteccion = None
         self.current_image = None
         self.frame_count = 0
-        self.last_recognition_time = 0
+        self.tracker = FaceTracker()
+        # Una sola detección por frame ('haar' o 'mtcnn') para reconocimiento y emociones
+        self.pipeline = DetectionPipeline(self.face_system, self.emotion_analyzer, self.tracker, detector)
+        self.worker = InferenceWorker(self.pipeline.analizar)
+        self.anotaciones = []
         
         self.setup_ui()
         self.verificar_modelos()
@@ -155,7 +174,8 @@ class DetectionWindow:
             ("Persona:", "persona", "---"),
             ("Emoción:", "emocion", "---"),
             ("Confianza:", "confianza", "---"),
-            ("Tiempo:", "tiempo", "---")
+            ("Tiempo:", "tiempo", "---"),
+            ("Latencia:", "latencia", "---")
         ]
         
         for i, (label_text, key, default_value) in enumerate(info_fields):
@@ -224,24 +244,24 @@ class DetectionWindow:
     def iniciar_deteccion(self):
         """Iniciar el proceso de detección con IA"""
         try:
-            self.cap = cv2.VideoCapture(0)
-            if not self.cap.isOpened():
-                
-                self.cap = cv2.VideoCapture(1)
-                if not self.cap.isOpened():
-                    raise Exception("No se pudo acceder a ninguna cámara")
-            
+            self.cap = abrir_fuente(self.fuente, velocidad=self.velocidad, ancho=640, alto=480, fps=30)
+            print(f"🎬 Fuente de video: {self.cap.descripcion()}")
             
-            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
-            self.cap.set(cv2.CAP_PROP_FPS, 30)
+            # Un hilo vacía la cámara; la interfaz solo toma el último frame
+            self.grabber = CameraGrabber(self.cap)
+            self.grabber.iniciar()
+            self.ultima_secuencia = 0
             
             self.detection_enabled = True
             self.btn_iniciar.config(state='disabled')
             self.btn_detener.config(state='normal')
             self.info_labels['estado'].config(text="Detectando con IA...", fg='#2ecc71')
             self.frame_count = 0
-            self.last_recognition_time = 0
+            self.tracker.reiniciar()
+            self.anotaciones = []
+            # Recoger altas/bajas hechas por otro proceso mientras la ventana estaba abierta
+            self.face_system.sincronizar()
+            self.worker.iniciar()
             self.procesar_deteccion()
             
         except Exception as e:
@@ -254,6 +274,15 @@ class DetectionWindow:
         self.btn_detener.config(state='disabled')
         self.info_labels['estado'].config(text="Detenido", fg='#e74c3c')
         
+        self.worker.detener()
+        
+        if self.grabber is not None:
+            self.grabber.detener()
+            estadisticas = self.grabber.estadisticas()
+            print(f"📷 Frames capturados: {estadisticas['capturados']}, mostrados: {estadisticas['entregados']}, "
+                  f"descartados: {estadisticas['descartados']} ({estadisticas['fps']:.1f} FPS de cámara)")
+            self.grabber = None
+        
         if self.cap is not None:
             self.cap.release()
             self.cap = None
@@ -262,82 +291,37 @@ class DetectionWindow:
         self.camera_label.configure(image='')
 
     def procesar_deteccion(self):
-        """Procesar frame por frame para detección con IA - OPTIMIZADO"""
-        if not self.detection_enabled or self.cap is None:
+        """Leer y mostrar frames; la inferencia corre en el hilo de trabajo"""
+        if not self.detection_enabled or self.grabber is None:
             return
         
         try:
-            ret, frame = self.cap.read()
-            if ret:
+            # Nunca bloquea: si la cámara no dio un frame nuevo se reintenta en el próximo ciclo
+            captura = self.grabber.ultimo(self.ultima_secuencia)
+            if captura is None and not self.grabber.activo():
+                # Terminó la grabación que se estaba reproduciendo
+                self.detener_deteccion()
+                return
+            if captura is not None:
+                self.ultima_secuencia, marca_captura, frame = captura
                 self.frame_count += 1
-                current_time = time.time()
-                
-                
-                frame_small = cv2.resize(frame, (320, 240))
-                frame_display = frame.copy()
-                
-                
-                gray = cv2.cvtColor(frame_small, cv2.COLOR_BGR2GRAY)
-                face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-                faces = face_cascade.detectMultiScale(gray, 1.1, 4, minSize=(50, 50))
-                
-                nombre = "Desconocido"
-                confianza = 0.0
-                emocion = "---"
-                confianza_emocion = 0.0
-                persona_id = None
-                
-                
-                should_recognize = (self.frame_count % 10 == 0 or 
-                                  current_time - self.last_recognition_time > 0.5)
                 
-                if should_recognize and len(faces) > 0:
-                    self.last_recognition_time = current_time
-                    
-                    persona_id, nombre, confianza = self.face_system.reconocer_rostro(frame)
-                    print(f"🎭 Reconocimiento IA: {nombre} ({confianza:.2f})")
+                # El hilo de inferencia siempre recibe el frame más reciente,
+                # con la marca de captura para medir la latencia de punta a punta
+                self.worker.enviar(frame, marca_captura)
                 
+                resultado = self.worker.obtener_resultado()
+                if resultado is not None:
+                    self.anotaciones = resultado['anotaciones']
+                    self.actualizar_interfaz(*resultado['panel'])
                 
-                for (x, y, w, h) in faces:
-                    
-                    scale_x = frame.shape[1] / frame_small.shape[1]
-                    scale_y = frame.shape[0] / frame_small.shape[0]
-                    x_orig = int(x * scale_x)
-                    y_orig = int(y * scale_y)
-                    w_orig = int(w * scale_x)
-                    h_orig = int(h * scale_y)
-                    
-                    
-                    try:
-                        face_roi = frame[y_orig:y_orig+h_orig, x_orig:x_orig+w_orig]
-                        if face_roi.size > 0:
-                            emocion, confianza_emocion = self.emotion_analyzer.predecir_emocion(face_roi)
-                            print(f"😊 Emoción detectada: {emocion} ({confianza_emocion:.2f})")
-                    except Exception as e:
-                        print(f"❌ Error en análisis de emociones: {e}")
-                        emocion, confianza_emocion = "Error", 0.0
-                    
-                    
-                    if nombre != "Desconocido" and confianza > 0.6:
-                        color = (0, 255, 0)  
-                        texto = f"{nombre} ({confianza:.1%})"
-                        if emocion != "---":
-                            texto += f" | {emocion}"
-                    else:
-                        color = (0, 0, 255)  
-                        texto = "No registrado"
-                        if emocion != "---":
-                            texto += f" | {emocion}"
-                    
-                   
-                    cv2.rectangle(frame_display, (x_orig, y_orig), 
-                                (x_orig+w_orig, y_orig+h_orig), color, 2)
-                    cv2.putText(frame_display, texto, (x_orig, y_orig-10),
+                # Dibujar las últimas anotaciones disponibles sobre el frame actual
+                frame_display = frame.copy()
+                for (x, y, w, h), texto, color in self.anotaciones:
+                    cv2.rectangle(frame_display, (x, y), (x+w, y+h), color, 2)
+                    cv2.putText(frame_display, texto, (x, y-10),
                               cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
                 
-               
-                self.actualizar_interfaz(nombre, emocion, max(confianza, confianza_emocion), persona_id)
-                
                 
                 frame_display = cv2.resize(frame_display, (640, 480))
                 rgb_frame = cv2.cvtColor(frame_display, cv2.COLOR_BGR2RGB)
@@ -348,6 +332,9 @@ class DetectionWindow:
                 self.current_image = imgtk
                 self.camera_label.imgtk = imgtk
                 self.camera_label.configure(image=imgtk)
+                
+                if self.frame_count % 15 == 0:
+                    self.mostrar_latencia(time.time() - marca_captura)
             
         except Exception as e:
             print(f"Error en procesamiento IA: {e}")
@@ -357,7 +344,14 @@ class DetectionWindow:
         if self.detection_enabled:
             self.window.after(15, self.procesar_deteccion)
     
-    def actualizar_interfaz(self, nombre, emocion, confianza, persona_id):
+    def mostrar_latencia(self, latencia_vista):
+        """Latencia captura→pantalla, captura→resultado de IA y frames descartados"""
+        self.info_labels['latencia'].config(
+            text=f"vista {latencia_vista * 1000:.0f} ms | IA {self.worker.ultima_latencia * 1000:.0f} ms | "
+                 f"{self.grabber.descartados} descartados"
+        )
+    
+    def actualizar_interfaz(self, nombre, emocion, confianza, persona_id, guardar=True):
         """Actualizar la interfaz con la información de detección"""
         tiempo_actual = time.strftime("%H:%M:%S")
         
@@ -373,9 +367,9 @@ class DetectionWindow:
         self.info_labels['tiempo'].config(text=tiempo_actual)
         
         
-        if persona_id is not None and nombre != "Desconocido" and confianza > 0.7:
+        if guardar and persona_id is not None and nombre != "Desconocido" and confianza > 0.7:
             try:
-                self.db.guardar_deteccion_emocion(persona_id, emocion, confianza)
+                self.escritor.guardar(persona_id, emocion, confianza)
                 
                 
                 self.history_tree.insert(
@@ -393,6 +387,13 @@ class DetectionWindow:
     def cerrar(self):
         """Cerrar la ventana y liberar recursos"""
         self.detener_deteccion()
+        self.escritor.detener()
+        estadisticas = self.escritor.estadisticas()
+        print(f"💾 Detecciones guardadas: {estadisticas['escritas']} en {estadisticas['lotes']} lotes, "
+              f"{estadisticas['descartadas']} descartadas")
+        self.pipeline.liberar()
+        self.face_system.liberar()
+        self.emotion_analyzer.liberar()
         self.window.destroy()
 
 
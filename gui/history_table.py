@@ -0,0 +1,241 @@
+import threading
+import tkinter as tk
+from collections import OrderedDict
+from tkinter import ttk
+
+
+class VirtualHistoryTable:
+    """Tabla del historial que solo dibuja las filas visibles
+
+    El Treeview tiene tantos ítems como filas caben en pantalla y al
+    desplazarse solo se cambian sus valores. Las filas se piden a la base
+    por bloques con paginación por clave y se guardan unos pocos bloques
+    en memoria. Los cursores de cada bloque los calcula un hilo que recorre
+    solo el índice, así abrir la tabla cuesta lo mismo con mil que con un
+    millón de detecciones. El hilo nunca toca Tk: la interfaz consulta su
+    avance con `after`.
+
+    Al abrir, la barra se dimensiona con la estimación del resumen diario;
+    el hilo la reemplaza primero por el conteo exacto de las mismas filas
+    que devuelven las páginas y al terminar por el total indexado.
+    """
+
+    COLUMNAS = ('ID', 'Fecha', 'Hora', 'Persona', 'Emoción', 'Confianza')
+
+    def __init__(self, parent, db, tam_bloque=200, bloques_en_memoria=32, alto_fila=20):
+        self.db = db
+        self.tam_bloque = tam_bloque
+        self.bloques_en_memoria = bloques_en_memoria
+        self.alto_fila = alto_fila
+
+        self.filtros = {}
+        self.total = 0
+        self.posicion = 0
+        self.visibles = 20
+        self.anclas = []
+        self.bloques = OrderedDict()
+        self.indexado = False
+        self._total_contado = None
+        self._total_exacto = None
+        self._generacion = 0
+
+        self.frame = tk.Frame(parent, bg='#2c3e50')
+
+        # Indicador de progreso del indexado
+        estado_frame = tk.Frame(self.frame, bg='#2c3e50')
+        estado_frame.pack(fill='x', padx=10)
+        self.estado_label = tk.Label(estado_frame, text="", font=('Arial', 9),
+                                     bg='#2c3e50', fg='#bdc3c7', anchor='w')
+        self.estado_label.pack(side='left', fill='x', expand=True)
+        self.progreso = ttk.Progressbar(estado_frame, mode='determinate', maximum=100, length=200)
+        self.progreso.pack(side='right')
+
+        tabla_frame = tk.Frame(self.frame, bg='#2c3e50')
+        tabla_frame.pack(expand=True, fill='both', padx=10, pady=10)
+
+        self.tree = ttk.Treeview(tabla_frame, columns=self.COLUMNAS, show='headings', height=self.visibles)
+        for col in self.COLUMNAS:
+            self.tree.heading(col, text=col)
+            self.tree.column(col, width=100)
+
+        # La barra no desplaza el Treeview: mueve la posición dentro del historial
+        self.scrollbar = ttk.Scrollbar(tabla_frame, orient='vertical', command=self.desplazar_barra)
+        self.scrollbar.pack(side='right', fill='y')
+        self.tree.pack(side='left', expand=True, fill='both')
+
+        self.tree.bind('<Configure>', self.ajustar_alto)
+        self.tree.bind('<MouseWheel>', self.rueda)
+        self.tree.bind('<Button-4>', lambda e: self.mover(-3))
+        self.tree.bind('<Button-5>', lambda e: self.mover(3))
+        self.tree.bind('<Up>', lambda e: self.mover(-1))
+        self.tree.bind('<Down>', lambda e: self.mover(1))
+        self.tree.bind('<Prior>', lambda e: self.mover(-self.visibles))
+        self.tree.bind('<Next>', lambda e: self.mover(self.visibles))
+        self.tree.bind('<Home>', lambda e: self.ir_a(0))
+        self.tree.bind('<End>', lambda e: self.ir_a(self.total))
+        self.frame.bind('<Destroy>', self.cerrar)
+
+    def pack(self, **opciones):
+        self.frame.pack(**opciones)
+
+    def cargar(self, persona_id=None, emocion=None):
+        """Mostrar el historial (filtrado) desde la detección más reciente"""
+        self._generacion += 1
+        generacion = self._generacion
+        self.filtros = {'persona_id': persona_id, 'emocion': emocion}
+        self.bloques.clear()
+        self.posicion = 0
+        self.indexado = False
+        self._total_contado = None
+        self._total_exacto = None
+
+        # Se fija la fila más reciente como tope: las detecciones que lleguen
+        # mientras se mira la tabla no desplazan las posiciones ya indexadas
+        primera, _ = self.db.pagina_historial(limite=1, tuplas=True, **self.filtros)
+        if not primera:
+            self.anclas = []
+            self.total = 0
+            self.indexado = True
+            self.estado_label.config(text="Sin detecciones")
+            self.progreso['value'] = 100
+            self.dibujar()
+            return
+
+        tope = (primera[0][1], primera[0][0] + 1)
+        self.anclas = [tope]
+        self.total = self.db.estimar_historial(**self.filtros)
+        self.progreso['value'] = 0
+        self.dibujar()
+
+        threading.Thread(target=self._indexar, args=(generacion, tope, dict(self.filtros)),
+                         name="indice-historial", daemon=True).start()
+        self.tree.after(100, self._vigilar, generacion)
+
+    def _indexar(self, generacion, tope, filtros):
+        """Calcular el cursor de cada bloque (hilo en segundo plano)"""
+        anclas = self.anclas
+        try:
+            # Mismas filas que recorren las páginas, hasta el tope fijado
+            contado = self.db.contar_historial(despues=tope, **filtros)
+            if generacion != self._generacion:
+                return
+            self._total_contado = contado
+            for ancla in self.db.anclas_historial(self.tam_bloque, despues=tope, **filtros):
+                if generacion != self._generacion:
+                    return
+                anclas.append(ancla)
+            resto, _ = self.db.pagina_historial(despues=anclas[-1], limite=self.tam_bloque,
+                                                tuplas=True, **filtros)
+            if generacion == self._generacion:
+                self._total_exacto = (len(anclas) - 1) * self.tam_bloque + len(resto)
+        except Exception as e:
+            print(f"❌ Error indexando historial: {e}")
+            if generacion == self._generacion:
+                self._total_exacto = (len(anclas) - 1) * self.tam_bloque
+        finally:
+            self.db.conexiones.soltar_lectura()
+
+    def _vigilar(self, generacion):
+        if generacion != self._generacion:
+            return
+        if self._total_exacto is not None:
+            self.total = self._total_exacto
+            self.indexado = True
+            self.progreso['value'] = 100
+            self.estado_label.config(text=f"{self.total:,} detecciones".replace(',', '.'))
+            self.dibujar()
+            return
+        if self._total_contado is not None:
+            self.total = self._total_contado
+
+        indexadas = len(self.anclas) * self.tam_bloque
+        porcentaje = min(100, indexadas * 100 // max(self.total, 1))
+        self.progreso['value'] = porcentaje
+        self.estado_label.config(text=f"Indexando historial... {porcentaje}% "
+                                      f"({self.total:,} detecciones)".replace(',', '.'))
+        self.dibujar()
+        self.tree.after(150, self._vigilar, generacion)
+
+    def _bloque(self, numero):
+        """Filas de un bloque (None si su cursor todavía no está calculado)"""
+        if numero in self.bloques:
+            self.bloques.move_to_end(numero)
+            return self.bloques[numero]
+        if numero >= len(self.anclas):
+            return None
+
+        filas, _ = self.db.pagina_historial(despues=self.anclas[numero], limite=self.tam_bloque,
+                                            tuplas=True, **self.filtros)
+        self.bloques[numero] = filas
+        if len(self.bloques) > self.bloques_en_memoria:
+            self.bloques.popitem(last=False)
+        return filas
+
+    def _valores(self, indice):
+        if indice >= self.total:
+            return ('',) * len(self.COLUMNAS)
+        numero, desplazamiento = divmod(indice, self.tam_bloque)
+        bloque = self._bloque(numero)
+        if bloque is None:
+            return ('', '...', '', 'Indexando...', '', '')
+        if desplazamiento >= len(bloque):
+            return ('',) * len(self.COLUMNAS)
+
+        id_deteccion, timestamp, _, nombre, apellido, emocion, confianza = bloque[desplazamiento]
+        fecha_hora = timestamp.split(' ')
+        fecha = fecha_hora[0] if len(fecha_hora) > 0 else ''
+        hora = fecha_hora[1] if len(fecha_hora) > 1 else ''
+        return (id_deteccion, fecha, hora, f"{nombre} {apellido}", emocion, f"{confianza:.1%}")
+
+    def dibujar(self):
+        """Cargar en los ítems visibles las filas desde `posicion`"""
+        items = self.tree.get_children()
+        if len(items) < self.visibles:
+            for _ in range(self.visibles - len(items)):
+                self.tree.insert('', 'end', values=('',) * len(self.COLUMNAS))
+        elif len(items) > self.visibles:
+            self.tree.delete(*items[self.visibles:])
+
+        for desplazamiento, item in enumerate(self.tree.get_children()):
+            self.tree.item(item, values=self._valores(self.posicion + desplazamiento))
+
+        if self.total:
+            self.scrollbar.set(self.posicion / self.total,
+                               min(1.0, (self.posicion + self.visibles) / self.total))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+    def ir_a(self, posicion):
+        posicion = max(0, min(int(posicion), self.total - self.visibles))
+        if posicion != self.posicion:
+            self.posicion = posicion
+            self.dibujar()
+        return 'break'
+
+    def mover(self, filas):
+        return self.ir_a(self.posicion + filas)
+
+    def rueda(self, event):
+        # Windows envía múltiplos de 120; macOS, pasos pequeños
+        pasos = event.delta // 120 if abs(event.delta) >= 120 else event.delta
+        return self.mover(-3 * pasos)
+
+    def desplazar_barra(self, accion, cantidad, unidad=None):
+        if accion == 'moveto':
+            self.ir_a(float(cantidad) * self.total)
+        elif unidad == 'pages':
+            self.mover(int(cantidad) * self.visibles)
+        else:
+            self.mover(int(cantidad))
+
+    def ajustar_alto(self, event):
+        # El encabezado ocupa aproximadamente una fila
+        visibles = max(1, event.height // self.alto_fila - 1)
+        if visibles != self.visibles:
+            self.visibles = visibles
+            self.posicion = max(0, min(self.posicion, self.total - self.visibles))
+            self.dibujar()
+
+    def cerrar(self, event=None):
+        # Cambiar de generación detiene el hilo de indexado
+        self._generacion += 1
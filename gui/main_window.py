@@ -4,15 +4,26 @@ from gui.registration_window import RegistrationWindow
 from gui.detection_window import DetectionWindow
 from gui.reports_window import ReportsWindow
 from gui.simple_delete_window import SimpleDeleteWindow  # NUEVO IMPORT
+from modules.warmup import ModelWarmup
 
 class MainWindow:
-    def __init__(self, root):
+    def __init__(self, root, precalentar=False, fuente=None, detector='haar'):
         self.root = root
+        # Fuente de video de registro y detección (None = cámara)
+        self.fuente = fuente
+        self.detector = detector
         self.root.title("Sistema de Reconocimiento Facial con Análisis de Emociones")
         self.root.geometry("800x600")
         self.root.configure(bg='#2c3e50')
         
+        self.warmup = None
+        
         self.setup_ui()
+        
+        # Cargar y calentar los modelos en segundo plano (opcional)
+        if precalentar:
+            self.warmup = ModelWarmup()
+            self.root.after(100, self.iniciar_precalentamiento)
     
     def setup_ui(self):
         # Frame principal
@@ -96,12 +107,37 @@ class MainWindow:
             **{**button_style, 'bg': '#95a5a6'}
         )
         btn_salir.pack(pady=15)
+        
+        # Estado de los modelos de IA
+        self.status_label = tk.Label(
+            main_frame,
+            text="",
+            font=('Arial', 10),
+            fg='#bdc3c7',
+            bg='#2c3e50'
+        )
+        self.status_label.pack(pady=5)
+    
+    def iniciar_precalentamiento(self):
+        """Arrancar el precalentamiento cuando la ventana ya está visible"""
+        self.warmup.iniciar()
+        self.actualizar_estado_modelos()
+    
+    def actualizar_estado_modelos(self):
+        """Mostrar el progreso del precalentamiento en la barra de estado"""
+        if self.warmup.terminado:
+            prefijo = "✅ Modelos listos: " if self.warmup.listo() else "⚠️ Modelos: "
+            self.status_label.config(text=prefijo + self.warmup.resumen(), fg='#2ecc71' if self.warmup.listo() else '#f39c12')
+            return
+        
+        self.status_label.config(text="⏳ Preparando modelos: " + self.warmup.resumen(), fg='#f39c12')
+        self.root.after(250, self.actualizar_estado_modelos)
     
     def abrir_registro(self):
-        RegistrationWindow(self.root)
+        RegistrationWindow(self.root, fuente=self.fuente)
     
     def abrir_deteccion(self):
-        DetectionWindow(self.root)
+        DetectionWindow(self.root, fuente=self.fuente, detector=self.detector)
     
     def abrir_reportes(self):
         ReportsWindow(self.root)
@@ -3,17 +3,24 @@ from tkinter import ttk, messagebox
 import cv2
 from PIL import Image, ImageTk
 import os
-from modules.face_recognition import FaceRecognitionSystem
+from modules.camera_utils import abrir_fuente
+from modules.face_detectors import HaarDetector
 
 class RegistrationWindow:
-    def __init__(self, parent):
+    def __init__(self, parent, fuente=None):
         self.parent = parent
+        self.fuente = fuente
         self.window = tk.Toplevel(parent)
         self.window.title("Registro de Personas")
         self.window.geometry("900x600")
         self.window.configure(bg='#2c3e50')
+        self.window.protocol("WM_DELETE_WINDOW", self.cerrar)
         
+        # torch y FaceNet se importan al abrir la ventana, no al iniciar la aplicación
+        from modules.face_recognition_ai import FaceRecognitionAI as FaceRecognitionSystem
         self.face_system = FaceRecognitionSystem()
+        # Detector ligero para la vista previa y la validación de capturas
+        self.detector = HaarDetector(ancho_deteccion=None, factor_escala=1.1, vecinos=5, tam_minimo=None)
         self.capturas = []
         self.cap = None
         self.is_camera_active = False
@@ -192,13 +199,8 @@ class RegistrationWindow:
     def iniciar_camara(self):
         """Iniciar la cámara web"""
         try:
-            self.cap = cv2.VideoCapture(0)
-            if not self.cap.isOpened():
-                # Intentar con índice 1 si el 0 falla
-                self.cap = cv2.VideoCapture(1)
-                if not self.cap.isOpened():
-                    messagebox.showerror("Error", "No se pudo acceder a ninguna cámara")
-                    return
+            # Cámara 0 (o 1 si falla), o la grabación indicada al abrir la ventana
+            self.cap = abrir_fuente(self.fuente, repetir=True)
             
             self.is_camera_active = True
             self.btn_toggle_cam.config(text="🟢 Desactivar Cámara", bg='#e74c3c')
@@ -236,8 +238,7 @@ class RegistrationWindow:
                 frame = cv2.resize(frame, (400, 300))
                 
                 # Detectar rostros
-                gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-                rostros = self.face_system.face_cascade.detectMultiScale(gray, 1.1, 5)
+                rostros = self.detector.detectar(frame)
                 
                 # Dibujar cuadros alrededor de rostros
                 for (x, y, w, h) in rostros:
@@ -268,8 +269,7 @@ class RegistrationWindow:
         ret, frame = self.cap.read()
         if ret:
             # Verificar que se detecte un rostro
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            rostros = self.face_system.face_cascade.detectMultiScale(gray, 1.1, 5)
+            rostros = self.detector.detectar(frame)
             
             if len(rostros) > 0:
                 self.capturas.append(frame)
@@ -309,9 +309,9 @@ class RegistrationWindow:
             messagebox.showerror("Error", "Ingrese un email válido")
             return
         
-        # Registrar persona
+        # Registrar persona con todas las capturas como plantillas
         success, message = self.face_system.registrar_nueva_persona(
-            nombre, apellido, email, self.capturas[0]
+            nombre, apellido, email, self.capturas
         )
         
         if success:
@@ -337,4 +337,5 @@ class RegistrationWindow:
         self.is_camera_active = False
         if self.cap is not None:
             self.cap.release()
+        self.face_system.liberar()
         self.window.destroy()
\ No newline at end of file
@@ -2,9 +2,9 @@ import tkinter as tk
 from tkinter import ttk, messagebox
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-import sqlite3
 from datetime import datetime, timedelta
 from modules.database import DatabaseManager
+from gui.history_table import VirtualHistoryTable
 import json
 
 class ReportsWindow:
@@ -16,6 +16,7 @@ class ReportsWindow:
         self.window.configure(bg='#2c3e50')
         
         self.db = DatabaseManager()
+        self.ids_personas = {}
         
         self.setup_ui()
         self.cargar_datos()
@@ -110,7 +111,7 @@ class ReportsWindow:
         persona_dropdown.pack(side='left', padx=5)
         
         # Dropdown para emociones
-        emociones = ["Todas", "Felicidad", "Tristeza", "Enojo", "Sorpresa", "Neutral", "Miedo", "Disgusto"]
+        emociones = ["Todas", "Felicidad", "Tristeza", "Enojo", "Sorpresa", "Neutral", "Miedo", "Desagrado"]
         emocion_dropdown = ttk.Combobox(control_frame, textvariable=self.filtro_emocion_var,
                                        values=emociones, state="readonly", width=15)
         emocion_dropdown.pack(side='left', padx=5)
@@ -127,20 +128,9 @@ class ReportsWindow:
                                 bg='#2ecc71', fg='white', font=('Arial', 10))
         btn_exportar.pack(side='left', padx=5)
         
-        # Treeview para el historial
-        columns = ('ID', 'Fecha', 'Hora', 'Persona', 'Emoción', 'Confianza')
-        self.history_tree = ttk.Treeview(parent, columns=columns, show='headings', height=20)
-        
-        for col in columns:
-            self.history_tree.heading(col, text=col)
-            self.history_tree.column(col, width=100)
-        
-        self.history_tree.pack(expand=True, fill='both', padx=10, pady=10)
-        
-        # Scrollbar
-        scrollbar = ttk.Scrollbar(self.history_tree, orient='vertical', command=self.history_tree.yview)
-        self.history_tree.configure(yscrollcommand=scrollbar.set)
-        scrollbar.pack(side='right', fill='y')
+        # Tabla virtual: solo se dibujan las filas visibles
+        self.tabla_historial = VirtualHistoryTable(parent, self.db)
+        self.tabla_historial.pack(expand=True, fill='both')
     
     def setup_person_tab(self, parent):
         # Frame para selección de persona
@@ -245,9 +235,6 @@ class ReportsWindow:
     
     def obtener_datos_estadisticos(self):
         """Obtener datos estadísticos según el rango seleccionado"""
-        conn = sqlite3.connect('data/database.db')
-        cursor = conn.cursor()
-        
         # Determinar fecha límite según el rango
         if self.rango_var.get() == "7dias":
             fecha_limite = datetime.now() - timedelta(days=7)
@@ -256,94 +243,33 @@ class ReportsWindow:
         elif self.rango_var.get() == "90dias":
             fecha_limite = datetime.now() - timedelta(days=90)
         else:
-            fecha_limite = datetime.min
-        
-        # Distribución de emociones
-        cursor.execute('''
-            SELECT emocion, COUNT(*) as count 
-            FROM detecciones_emociones 
-            WHERE datetime(timestamp) >= datetime(?)
-            GROUP BY emocion
-        ''', (fecha_limite,))
-        
-        distribucion_emociones = {row[0]: row[1] for row in cursor.fetchall()}
-        
-        # Actividad temporal
-        cursor.execute('''
-            SELECT DATE(timestamp) as fecha, COUNT(*) as count
-            FROM detecciones_emociones
-            WHERE datetime(timestamp) >= datetime(?)
-            GROUP BY DATE(timestamp)
-            ORDER BY fecha DESC
-            LIMIT 10
-        ''', (fecha_limite,))
-        
-        actividad_temporal = {row[0]: row[1] for row in cursor.fetchall()}
-        
-        conn.close()
+            fecha_limite = None
         
-        return {
-            'distribucion_emociones': distribucion_emociones,
-            'actividad_temporal': actividad_temporal
-        }
+        return self.db.obtener_estadisticas(fecha_limite)
     
     def obtener_datos_persona(self, persona_nombre):
         """Obtener datos de emociones para una persona específica"""
-        conn = sqlite3.connect('data/database.db')
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT de.emocion, COUNT(*) as count
-            FROM detecciones_emociones de
-            JOIN personas p ON de.persona_id = p.id
-            WHERE p.nombre || ' ' || p.apellido = ?
-            GROUP BY de.emocion
-        ''', (persona_nombre,))
-        
-        datos = {row[0]: row[1] for row in cursor.fetchall()}
-        conn.close()
-        
-        return datos
+        persona_id = self.ids_personas.get(persona_nombre)
+        if persona_id is None:
+            return {}
+        return self.db.obtener_emociones_persona(persona_id)
     
     def obtener_lista_personas(self):
         """Obtener lista de todas las personas registradas"""
-        conn = sqlite3.connect('data/database.db')
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT nombre, apellido FROM personas')
-        personas = [f"{row[0]} {row[1]}" for row in cursor.fetchall()]
-        conn.close()
-        
-        return personas
+        self.ids_personas = self.db.obtener_nombres_personas()
+        return list(self.ids_personas)
     
     def cargar_historial_completo(self):
-        """Cargar todo el historial en el treeview"""
-        historial = self.db.obtener_historial_emociones()
-        
-        # Limpiar treeview
-        for item in self.history_tree.get_children():
-            self.history_tree.delete(item)
-        
-        # Cargar datos
-        for registro in historial:
-            fecha_hora = registro['timestamp'].split(' ')
-            fecha = fecha_hora[0] if len(fecha_hora) > 0 else ''
-            hora = fecha_hora[1] if len(fecha_hora) > 1 else ''
-            
-            self.history_tree.insert('', 'end', values=(
-                registro.get('id', ''),
-                fecha,
-                hora,
-                f"{registro['nombre']} {registro['apellido']}",
-                registro['emocion'],
-                f"{registro['confianza']:.1%}"
-            ))
+        """Cargar el historial en la tabla virtual (el indexado sigue en segundo plano)"""
+        self.tabla_historial.cargar()
     
     def aplicar_filtros(self):
         """Aplicar filtros al historial"""
-        # Esta función se implementaría para filtrar el treeview
-        # según los criterios seleccionados
-        messagebox.showinfo("Info", "Funcionalidad de filtros en desarrollo")
+        persona = self.filtro_persona_var.get()
+        emocion = self.filtro_emocion_var.get()
+        persona_id = None if persona == "Todas" else self.ids_personas.get(persona)
+        self.tabla_historial.cargar(persona_id=persona_id,
+                                    emocion=None if emocion == "Todas" else emocion)
     
     def exportar_csv(self):
         """Exportar historial a CSV"""
@@ -351,17 +277,16 @@ class ReportsWindow:
             from datetime import datetime
             filename = f"reporte_emociones_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
             
-            historial = self.db.obtener_historial_emociones()
-            
+            # Se escribe página a página: la memoria no crece con el historial
             with open(filename, 'w', encoding='utf-8') as f:
                 f.write("Fecha,Hora,Persona,Emoción,Confianza\n")
-                for registro in historial:
-                    fecha_hora = registro['timestamp'].split(' ')
+                for _, timestamp, _, nombre, apellido, emocion, confianza in self.db.iterar_historial(tuplas=True):
+                    fecha_hora = timestamp.split(' ')
                     fecha = fecha_hora[0] if len(fecha_hora) > 0 else ''
                     hora = fecha_hora[1] if len(fecha_hora) > 1 else ''
                     
-                    f.write(f"{fecha},{hora},{registro['nombre']} {registro['apellido']},"
-                           f"{registro['emocion']},{registro['confianza']:.4f}\n")
+                    f.write(f"{fecha},{hora},{nombre} {apellido},"
+                           f"{emocion},{confianza:.4f}\n")
             
             messagebox.showinfo("Éxito", f"Reporte exportado como: {filename}")
             
@@ -1,47 +1,13 @@
 import tkinter as tk
 from gui.main_window import MainWindow
-from modules.face_recognition_ai import FaceRecognitionAI as FaceRecognitionSystem
-import sqlite3
+from modules.model_registry import registro
+from modules.database import DatabaseManager, ConnectionPool
 import os
+import sys
 
 def initialize_database():
-    """Inicializar la base de datos"""
-    conn = sqlite3.connect('data/database.db')
-    cursor = conn.cursor()
-    
-    # Tabla de personas
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS personas (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            nombre TEXT NOT NULL,
-            apellido TEXT NOT NULL,
-            email TEXT UNIQUE NOT NULL,
-            fecha_registro TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    # Tabla de embeddings faciales
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS embeddings (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            persona_id INTEGER,
-            embedding BLOB NOT NULL,
-            FOREIGN KEY (persona_id) REFERENCES personas (id)
-        )
-    ''')
-    
-    # Tabla de detecciones emocionales
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS detecciones_emociones (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            persona_id INTEGER,
-            emocion TEXT NOT NULL,
-            confianza REAL NOT NULL,
-            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (persona_id) REFERENCES personas (id)
-        )
-    ''')
-   conn.commit()
-    conn.close()
+    """Inicializar la base de datos (esquema y migraciones en DatabaseManager)"""
+    DatabaseManager()
 
 if __name__ == "__main__":
     # Crear directorios necesarios
@@ -52,9 +18,18 @@ if __name__ == "__main__":
     initialize_database()
     
     # Iniciar aplicación
+    # --precalentar carga y calienta los modelos en segundo plano al abrir el menú
+    # --fuente=<video|directorio|sintetico|índice> usa esa fuente en lugar de la cámara
+    # --detector=<haar|lbp|mtcnn> elige el detector de rostros de la detección en vivo
+    fuente = next((arg.split('=', 1)[1] for arg in sys.argv if arg.startswith('--fuente=')), None)
+    detector = next((arg.split('=', 1)[1] for arg in sys.argv if arg.startswith('--detector=')), 'haar')
     root = tk.Tk()
-    app = MainWindow(root)
+    app = MainWindow(root, precalentar='--precalentar' in sys.argv, fuente=fuente, detector=detector)
     root.mainloop()
+    
+    # Liberar los modelos compartidos al salir
+    registro.descargar_todos(forzar=True)
+    ConnectionPool.cerrar_todos()
 
    
 
@@ -0,0 +1,320 @@
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import time
+import numpy as np
+
+EXTENSIONES = ('.jpg', '.jpeg', '.png', '.bmp')
+
+# Modelos de cada proceso trabajador (se cargan una vez en el inicializador)
+_modelos = {}
+
+
+def es_imagen(ruta):
+    return ruta.lower().endswith(EXTENSIONES)
+
+
+def leer_directorio(ruta, dominio='registro.local'):
+    """Personas de un directorio: una subcarpeta o una imagen por persona
+
+    El nombre sale de la subcarpeta o del archivo (`Nombre_Apellido`) y el
+    email se genera con `dominio`.
+    """
+    personas = {}
+    for entrada in sorted(os.listdir(ruta)):
+        completa = os.path.join(ruta, entrada)
+        if os.path.isdir(completa):
+            imagenes = sorted(os.path.join(completa, f) for f in os.listdir(completa) if es_imagen(f))
+            clave = entrada
+        elif es_imagen(entrada):
+            imagenes = [completa]
+            clave = os.path.splitext(entrada)[0]
+        else:
+            continue
+
+        partes = clave.replace('-', '_').split('_')
+        email = f"{'.'.join(partes).lower()}@{dominio}"
+        persona = personas.setdefault(email, {
+            'nombre': partes[0],
+            'apellido': ' '.join(partes[1:]) or '-',
+            'email': email,
+            'imagenes': [],
+        })
+        persona['imagenes'].extend(imagenes)
+    return list(personas.values())
+
+
+def leer_manifiesto(ruta):
+    """Personas de un CSV con columnas nombre, apellido, email, imagen
+
+    Varias filas con el mismo email aportan varias plantillas. Las rutas
+    relativas se resuelven desde la carpeta del CSV.
+    """
+    base = os.path.dirname(os.path.abspath(ruta))
+    personas = {}
+    with open(ruta, newline='', encoding='utf-8') as f:
+        for fila in csv.DictReader(f):
+            email = fila['email'].strip()
+            imagen = fila['imagen'].strip()
+            persona = personas.setdefault(email, {
+                'nombre': fila['nombre'].strip(),
+                'apellido': fila['apellido'].strip(),
+                'email': email,
+                'imagenes': [],
+            })
+            persona['imagenes'].append(imagen if os.path.isabs(imagen) else os.path.join(base, imagen))
+    return list(personas.values())
+
+
+def leer_diario(ruta):
+    """Estado por email de una ejecución anterior"""
+    estados = {}
+    if ruta and os.path.exists(ruta):
+        with open(ruta, encoding='utf-8') as f:
+            for linea in f:
+                try:
+                    entrada = json.loads(linea)
+                    estados[entrada['email']] = entrada['estado']
+                except (ValueError, KeyError):
+                    # Línea cortada por una interrupción
+                    continue
+    return estados
+
+
+def _iniciar_trabajador(hilos, prob_minima):
+    """Cargar MTCNN y FaceNet una sola vez por proceso"""
+    import torch
+    import modules.face_recognition_ai  # noqa: F401  registra las fábricas
+    from modules.face_detectors import MTCNNDetector
+    from modules.model_registry import registro
+
+    # Con varios procesos, un hilo de torch por proceso evita la sobresuscripción
+    torch.set_num_threads(hilos)
+    _modelos['mtcnn'] = registro.obtener('mtcnn')
+    _modelos['facenet'] = registro.obtener('facenet')
+    # Las fotos suelen ser grandes: se detecta sobre una copia reducida
+    _modelos['detector'] = MTCNNDetector(prob_minima=0.0)
+    _modelos['prob_minima'] = prob_minima
+
+
+def procesar_lote(personas):
+    """Detectar el mejor rostro de cada imagen y extraer todos los embeddings del lote en un forward"""
+    import cv2
+    import torch
+    from modules.face_recognition_ai import detectar_y_alinear
+
+    inicio = time.perf_counter()
+    caras = []
+    duenos = []
+    resultados = []
+    for persona in personas:
+        resultado = dict(persona, embeddings=None, errores={})
+        for ruta in persona['imagenes']:
+            try:
+                imagen = cv2.imread(ruta)
+                if imagen is None:
+                    resultado['errores'][ruta] = "No se pudo leer la imagen"
+                    continue
+                _, probs, caras_imagen = detectar_y_alinear(_modelos['mtcnn'], imagen, _modelos['detector'])
+                if caras_imagen is None:
+                    resultado['errores'][ruta] = "No se detectó rostro"
+                    continue
+                mejor = int(np.argmax(probs))
+                if probs[mejor] < _modelos['prob_minima']:
+                    resultado['errores'][ruta] = f"Rostro poco claro ({probs[mejor]:.2f})"
+                    continue
+                caras.append(caras_imagen[mejor])
+                duenos.append(len(resultados))
+            except Exception as e:
+                resultado['errores'][ruta] = str(e)
+        resultados.append(resultado)
+
+    if caras:
+        with torch.no_grad():
+            embeddings = _modelos['facenet'](torch.stack(caras)).numpy()
+        duenos = np.array(duenos)
+        for i, resultado in enumerate(resultados):
+            propios = embeddings[duenos == i]
+            if len(propios):
+                resultado['embeddings'] = propios
+
+    return resultados, len(caras), time.perf_counter() - inicio
+
+
+class BulkEnrollment:
+    """Registro masivo sin interfaz a partir de fotos
+
+    Los lotes de personas se procesan en un pool de procesos (cada uno con
+    sus propios modelos) y los resultados se escriben en transacciones
+    grandes. Cada persona terminada se anota en un diario para poder
+    retomar tras una interrupción.
+    """
+
+    def __init__(self, db, procesos=None, tam_lote=16, tam_transaccion=200,
+                 hilos=1, prob_minima=0.9, diario=None, reintentar_fallidos=False):
+        self.db = db
+        self.procesos = max(1, (os.cpu_count() or 2) // 2) if procesos is None else procesos
+        self.tam_lote = tam_lote
+        self.tam_transaccion = tam_transaccion
+        self.hilos = hilos
+        self.prob_minima = prob_minima
+        self.diario = diario
+        self.reintentar_fallidos = reintentar_fallidos
+
+        self.registrados = 0
+        self.fallidos = 0
+        self.omitidos = 0
+        self.imagenes = 0
+        self.rostros = 0
+        self.errores = {}
+
+    def pendientes(self, personas):
+        """Quitar las personas ya registradas o ya fallidas en una ejecución anterior"""
+        registrados = self.db.obtener_emails()
+        diario = leer_diario(self.diario)
+        pendientes = []
+        for persona in personas:
+            estado = diario.get(persona['email'])
+            if persona['email'] in registrados or (estado == 'fallido' and not self.reintentar_fallidos):
+                self.omitidos += 1
+            else:
+                pendientes.append(persona)
+        return pendientes
+
+    def _anotar(self, f, email, estado, errores=None):
+        if f is not None:
+            f.write(json.dumps({'email': email, 'estado': estado, 'errores': errores or {}}, ensure_ascii=False) + '\n')
+
+    def _escribir(self, lote, f):
+        """Guardar un grupo de personas en una transacción y anotarlas en el diario"""
+        if not lote:
+            return
+        personas = [(r['nombre'], r['apellido'], r['email'], r['embeddings']) for r in lote]
+        for resultado, (email, exito, mensaje) in zip(lote, self.db.registrar_personas_lote(personas)):
+            if exito:
+                self.registrados += 1
+                self._anotar(f, email, 'registrado', resultado['errores'])
+            else:
+                self.fallidos += 1
+                self.errores[email] = mensaje
+                self._anotar(f, email, 'fallido', {'': mensaje})
+        if f is not None:
+            f.flush()
+            os.fsync(f.fileno())
+        lote.clear()
+
+    def ejecutar(self, personas):
+        personas = self.pendientes(personas)
+        lotes = [personas[i:i + self.tam_lote] for i in range(0, len(personas), self.tam_lote)]
+        print(f"📋 {len(personas)} personas pendientes ({self.omitidos} omitidas), "
+              f"{len(lotes)} lotes en {self.procesos} procesos")
+
+        inicio = time.perf_counter()
+        por_escribir = []
+        f = open(self.diario, 'a', encoding='utf-8') if self.diario else None
+        try:
+            if self.procesos > 1:
+                pool = multiprocessing.Pool(self.procesos, initializer=_iniciar_trabajador,
+                                            initargs=(self.hilos, self.prob_minima))
+                resultados = pool.imap_unordered(procesar_lote, lotes)
+            else:
+                pool = None
+                _iniciar_trabajador(self.hilos, self.prob_minima)
+                resultados = map(procesar_lote, lotes)
+
+            try:
+                for resultados_lote, rostros, _ in resultados:
+                    self.rostros += rostros
+                    for resultado in resultados_lote:
+                        self.imagenes += len(resultado['imagenes'])
+                        for ruta, error in resultado['errores'].items():
+                            print(f"⚠️  {ruta}: {error}")
+                        if resultado['embeddings'] is None:
+                            self.fallidos += 1
+                            self.errores[resultado['email']] = "Ninguna imagen válida"
+                            self._anotar(f, resultado['email'], 'fallido', resultado['errores'])
+                        else:
+                            por_escribir.append(resultado)
+
+                    if len(por_escribir) >= self.tam_transaccion:
+                        self._escribir(por_escribir, f)
+                    self._progreso(inicio)
+            finally:
+                if pool is not None:
+                    pool.close()
+                    pool.join()
+            self._escribir(por_escribir, f)
+        finally:
+            if f is not None:
+                f.close()
+
+        return self.resumen(time.perf_counter() - inicio)
+
+    def _progreso(self, inicio):
+        duracion = max(time.perf_counter() - inicio, 1e-9)
+        print(f"⏳ {self.imagenes} imágenes ({self.imagenes / duracion:.1f} img/s), "
+              f"{self.registrados} registrados, {self.fallidos} fallidos")
+
+    def resumen(self, duracion):
+        duracion = max(duracion, 1e-9)
+        return {
+            'registrados': self.registrados,
+            'fallidos': self.fallidos,
+            'omitidos': self.omitidos,
+            'imagenes': self.imagenes,
+            'rostros': self.rostros,
+            'segundos': duracion,
+            'imagenes_por_segundo': self.imagenes / duracion,
+            'errores': self.errores,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Registro masivo de personas desde un directorio o un CSV")
+    parser.add_argument('origen', help="Directorio de fotos o CSV con columnas nombre, apellido, email, imagen")
+    parser.add_argument('--db', default='data/database.db')
+    parser.add_argument('--dominio', default='registro.local', help="Dominio de los emails generados (modo directorio)")
+    parser.add_argument('--procesos', type=int, default=None, help="Procesos trabajadores (1 = sin pool)")
+    parser.add_argument('--hilos', type=int, default=1, help="Hilos de torch por proceso")
+    parser.add_argument('--lote', type=int, default=16, help="Personas por lote de inferencia")
+    parser.add_argument('--transaccion', type=int, default=200, help="Personas por transacción")
+    parser.add_argument('--prob-minima', type=float, default=0.9)
+    parser.add_argument('--formato', default='float32', choices=('json', 'float32', 'float16', 'int8'),
+                        help="Formato de almacenamiento de los embeddings")
+    parser.add_argument('--diario', default=None, help="Archivo de diario para retomar (por defecto junto al origen)")
+    parser.add_argument('--reintentar-fallidos', action='store_true')
+    args = parser.parse_args()
+
+    from modules.database import DatabaseManager
+
+    if os.path.isdir(args.origen):
+        personas = leer_directorio(args.origen, args.dominio)
+    else:
+        personas = leer_manifiesto(args.origen)
+    diario = args.diario or os.path.abspath(args.origen).rstrip(os.sep) + '.diario.jsonl'
+
+    registro_masivo = BulkEnrollment(
+        DatabaseManager(args.db, formato_embedding=args.formato),
+        procesos=args.procesos,
+        tam_lote=args.lote,
+        tam_transaccion=args.transaccion,
+        hilos=args.hilos,
+        prob_minima=args.prob_minima,
+        diario=diario,
+        reintentar_fallidos=args.reintentar_fallidos,
+    )
+    resumen = registro_masivo.ejecutar(personas)
+
+    print(f"\n✅ Registrados: {resumen['registrados']}  ❌ Fallidos: {resumen['fallidos']}  "
+          f"⏭️  Omitidos: {resumen['omitidos']}")
+    print(f"📊 {resumen['imagenes']} imágenes, {resumen['rostros']} rostros en {resumen['segundos']:.1f}s "
+          f"({resumen['imagenes_por_segundo']:.1f} img/s)")
+    for email, error in resumen['errores'].items():
+        print(f"   - {email}: {error}")
+    print(f"📝 Diario: {diario}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,12 +1,410 @@
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import deque
 import cv2
 import numpy as np
 
+EXTENSIONES_IMAGEN = ('.jpg', '.jpeg', '.png', '.bmp')
+
+class FrameSource(ABC):
+    """Origen de frames con la misma interfaz que cv2.VideoCapture
+    
+    `read`, `isOpened`, `get`, `set` y `release` permiten usarlo donde hoy
+    se usa una cámara, incluido CameraGrabber. Las fuentes grabadas numeran
+    los frames y `instante()` da la posición en el tiempo del medio, así una
+    repetición entrega siempre los mismos frames con las mismas marcas.
+    `velocidad` 1.0 reproduce al ritmo nativo, 2.0 al doble y None sin
+    límite; con `repetir` se vuelve al principio al terminar, si la fuente
+    sabe rebobinar. Cada fuente implementa `_leer`.
+    """
+    
+    en_vivo = False
+    
+    def __init__(self, fps=30.0, velocidad=1.0, repetir=False):
+        self.fps = float(fps) if fps and fps > 0 else 30.0
+        self.velocidad = velocidad
+        self.repetir = repetir
+        self.indice = -1
+        self.agotada = False
+        self._abierta = True
+        self._inicio = None
+    
+    def descripcion(self):
+        return self.__class__.__name__
+    
+    @abstractmethod
+    def _leer(self):
+        """Siguiente frame o None al terminar"""
+    
+    def _rebobinar(self):
+        """Volver al primer frame; False si la fuente no puede rebobinar"""
+        return False
+    
+    def read(self):
+        if not self._abierta or self.agotada:
+            return False, None
+        frame = self._leer()
+        if frame is None and self.repetir and self.indice >= 0 and self._rebobinar():
+            self.indice = -1
+            self._inicio = None
+            frame = self._leer()
+        if frame is None:
+            self.agotada = True
+            return False, None
+        self.indice += 1
+        self._esperar()
+        return True, frame
+    
+    def _esperar(self):
+        """Dormir hasta el instante del frame según la velocidad de reproducción"""
+        if self.velocidad is None:
+            return
+        periodo = 1.0 / (self.fps * self.velocidad)
+        ahora = time.perf_counter()
+        # Si el consumidor se atrasó más de un segundo se reanuda desde aquí, sin ráfagas
+        if self._inicio is None or ahora - (self._inicio + self.indice * periodo) > 1.0:
+            self._inicio = ahora - self.indice * periodo
+        espera = self._inicio + self.indice * periodo - ahora
+        if espera > 0:
+            time.sleep(espera)
+    
+    def instante(self):
+        """Tiempo del medio (segundos) del último frame entregado"""
+        return max(self.indice, 0) / self.fps
+    
+    def isOpened(self):
+        return self._abierta
+    
+    def get(self, propiedad):
+        if propiedad == cv2.CAP_PROP_FPS:
+            return self.fps
+        if propiedad == cv2.CAP_PROP_POS_FRAMES:
+            return float(self.indice + 1)
+        return 0.0
+    
+    def set(self, propiedad, valor):
+        return False
+    
+    def release(self):
+        self._abierta = False
+
+class CameraSource(FrameSource):
+    """Cámara en vivo: prueba los índices en orden y usa el primero que abre"""
+    
+    en_vivo = True
+    
+    def __init__(self, indices=(0, 1), ancho=None, alto=None, fps=None):
+        super().__init__(fps or 30.0, velocidad=None)
+        self.cap = None
+        for indice in indices:
+            cap = cv2.VideoCapture(indice)
+            if cap.isOpened():
+                self.cap = cap
+                self.indice_camara = indice
+                break
+            cap.release()
+        if self.cap is None:
+            raise Exception("No se pudo acceder a ninguna cámara")
+        
+        if ancho:
+            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, ancho)
+        if alto:
+            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, alto)
+        if fps:
+            self.cap.set(cv2.CAP_PROP_FPS, fps)
+    
+    def descripcion(self):
+        return f"cámara {self.indice_camara}"
+    
+    def _leer(self):
+        ret, frame = self.cap.read()
+        return frame if ret else None
+    
+    def read(self):
+        # El ritmo lo pone la cámara
+        ret, frame = self.cap.read()
+        if ret:
+            self.indice += 1
+        return ret, frame
+    
+    def instante(self):
+        return time.time()
+    
+    def isOpened(self):
+        return self.cap.isOpened()
+    
+    def get(self, propiedad):
+        return self.cap.get(propiedad)
+    
+    def set(self, propiedad, valor):
+        return self.cap.set(propiedad, valor)
+    
+    def release(self):
+        self.cap.release()
+
+class VideoFileSource(FrameSource):
+    """Archivo de video a su FPS nativo (o a la velocidad indicada)"""
+    
+    def __init__(self, ruta, velocidad=1.0, repetir=False):
+        self.ruta = ruta
+        self.cap = cv2.VideoCapture(ruta)
+        if not self.cap.isOpened():
+            raise Exception(f"No se pudo abrir el video: {ruta}")
+        super().__init__(self.cap.get(cv2.CAP_PROP_FPS), velocidad, repetir)
+    
+    def descripcion(self):
+        return f"video {os.path.basename(self.ruta)} ({self.fps:.0f} FPS)"
+    
+    def _leer(self):
+        ret, frame = self.cap.read()
+        return frame if ret else None
+    
+    def _rebobinar(self):
+        return bool(self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0))
+    
+    def get(self, propiedad):
+        if propiedad in (cv2.CAP_PROP_FPS, cv2.CAP_PROP_POS_FRAMES):
+            return super().get(propiedad)
+        return self.cap.get(propiedad)
+    
+    def release(self):
+        super().release()
+        self.cap.release()
+
+class ImageSequenceSource(FrameSource):
+    """Imágenes de un directorio en orden alfabético, como frames a `fps`"""
+    
+    def __init__(self, directorio, fps=30.0, velocidad=1.0, repetir=False):
+        self.directorio = directorio
+        self.rutas = sorted(
+            os.path.join(directorio, f) for f in os.listdir(directorio)
+            if f.lower().endswith(EXTENSIONES_IMAGEN)
+        )
+        if not self.rutas:
+            raise Exception(f"No hay imágenes en {directorio}")
+        self._siguiente = 0
+        super().__init__(fps, velocidad, repetir)
+    
+    def descripcion(self):
+        return f"{len(self.rutas)} imágenes de {self.directorio}"
+    
+    def _leer(self):
+        while self._siguiente < len(self.rutas):
+            ruta = self.rutas[self._siguiente]
+            self._siguiente += 1
+            frame = cv2.imread(ruta)
+            if frame is not None:
+                return frame
+            print(f"⚠️  No se pudo leer {ruta}, se omite")
+        return None
+    
+    def _rebobinar(self):
+        self._siguiente = 0
+        return True
+    
+    def get(self, propiedad):
+        if propiedad == cv2.CAP_PROP_FRAME_COUNT:
+            return float(len(self.rutas))
+        return super().get(propiedad)
+
+class SyntheticSource(FrameSource):
+    """Frames generados de forma determinista (carga y pruebas sin cámara)
+    
+    Fondo con ruido fijo por semilla y `rostros` óvalos claros con ojos que
+    se desplazan; sirve para medir rendimiento, no garantiza detecciones.
+    """
+    
+    def __init__(self, ancho=640, alto=480, fps=30.0, total=300, rostros=1, semilla=0,
+                 velocidad=1.0, repetir=False):
+        self.ancho = ancho
+        self.alto = alto
+        self.total = total
+        self.rostros = rostros
+        rng = np.random.RandomState(semilla)
+        self._fondo = rng.randint(40, 90, size=(alto, ancho, 3)).astype(np.uint8)
+        self._fases = rng.uniform(0, 2 * np.pi, size=(rostros, 2))
+        self._generados = 0
+        super().__init__(fps, velocidad, repetir)
+    
+    def descripcion(self):
+        return f"sintética {self.ancho}x{self.alto}, {self.total} frames"
+    
+    def _leer(self):
+        if self.total is not None and self._generados >= self.total:
+            return None
+        t = self._generados / self.fps
+        self._generados += 1
+        
+        frame = self._fondo.copy()
+        radio_x, radio_y = self.ancho // 10, self.alto // 6
+        for fase_x, fase_y in self._fases:
+            cx = int(self.ancho / 2 + (self.ancho / 2 - radio_x) * 0.8 * np.sin(0.5 * t + fase_x))
+            cy = int(self.alto / 2 + (self.alto / 2 - radio_y) * 0.6 * np.sin(0.3 * t + fase_y))
+            # Solo se dibuja dentro del recuadro del óvalo
+            yy, xx = np.ogrid[-radio_y:radio_y + 1, -radio_x:radio_x + 1]
+            ovalo = (xx / radio_x) ** 2 + (yy / radio_y) ** 2 <= 1.0
+            ojos = np.zeros_like(ovalo)
+            for lado in (-1, 1):
+                ojos |= ((xx - lado * radio_x * 0.4) / (radio_x * 0.15)) ** 2 + \
+                        ((yy + radio_y * 0.25) / (radio_y * 0.1)) ** 2 <= 1.0
+            region = frame[cy - radio_y:cy + radio_y + 1, cx - radio_x:cx + radio_x + 1]
+            region[ovalo[:region.shape[0], :region.shape[1]]] = (150, 170, 200)
+            region[ojos[:region.shape[0], :region.shape[1]]] = (30, 30, 30)
+        return frame
+    
+    def _rebobinar(self):
+        self._generados = 0
+        return True
+    
+    def get(self, propiedad):
+        if propiedad == cv2.CAP_PROP_FRAME_WIDTH:
+            return float(self.ancho)
+        if propiedad == cv2.CAP_PROP_FRAME_HEIGHT:
+            return float(self.alto)
+        if propiedad == cv2.CAP_PROP_FRAME_COUNT:
+            return float(self.total or 0)
+        return super().get(propiedad)
+
+def abrir_fuente(fuente=None, velocidad=1.0, repetir=False, ancho=640, alto=480, fps=30):
+    """Abrir una fuente de frames a partir de su especificación
+    
+    None = cámara 0 (o 1 si falla), un número = esa cámara, 'sintetico' =
+    generador, un directorio = secuencia de imágenes y cualquier otra ruta
+    = archivo de video. `velocidad` solo afecta a las fuentes grabadas.
+    """
+    if fuente is None or str(fuente).strip() == '':
+        return CameraSource((0, 1), ancho, alto, fps)
+    fuente = str(fuente)
+    if fuente.isdigit():
+        return CameraSource((int(fuente),), ancho, alto, fps)
+    if fuente.lower() in ('sintetico', 'sintético'):
+        return SyntheticSource(ancho, alto, fps, velocidad=velocidad, repetir=repetir)
+    if os.path.isdir(fuente):
+        return ImageSequenceSource(fuente, fps, velocidad, repetir)
+    if not os.path.exists(fuente):
+        raise Exception(f"No existe la fuente: {fuente}")
+    return VideoFileSource(fuente, velocidad, repetir)
+
 def inicializar_camara(indice_camara=0):
     """Inicializar la cámara web"""
-    cap = cv2.VideoCapture(indice_camara)
-    if not cap.isOpened():
-        raise Exception("No se pudo inicializar la cámara")
-    return cap
+    return CameraSource((indice_camara,))
+
+class CameraGrabber:
+    """Hilo que vacía la cámara continuamente y guarda solo los últimos frames
+    
+    Si el bucle de la interfaz lee con `cap.read()` a su ritmo, los frames
+    se acumulan en el buffer del driver y lo que se muestra llega con
+    retraso. Aquí un hilo lee sin parar; cada frame lleva número de
+    secuencia y marca de tiempo de captura, y los que nadie llegó a pedir
+    se cuentan como descartados. Con `buffer` > 1 se conservan los últimos
+    frames en un anillo.
+    """
+    
+    def __init__(self, cap, buffer=1, nombre="captura"):
+        self.cap = cap
+        self.nombre = nombre
+        self.anillo = deque(maxlen=max(1, buffer))
+        self.condicion = threading.Condition()
+        
+        self.secuencia = 0
+        self.entregada = 0
+        self.capturados = 0
+        self.entregados = 0
+        self.descartados = 0
+        self.errores_lectura = 0
+        self._marcas_fps = deque(maxlen=30)
+        
+        self._detener = threading.Event()
+        self._hilo = None
+        
+        # Pedir al driver el menor buffer posible (no todos los backends lo respetan)
+        try:
+            self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        except Exception:
+            pass
+    
+    def iniciar(self):
+        if self._hilo is not None and self._hilo.is_alive():
+            return
+        self._detener.clear()
+        self._hilo = threading.Thread(target=self._bucle, name=self.nombre, daemon=True)
+        self._hilo.start()
+    
+    def activo(self):
+        return self._hilo is not None and self._hilo.is_alive()
+    
+    def _bucle(self):
+        while not self._detener.is_set():
+            ret, frame = self.cap.read()
+            marca = time.time()
+            if not ret:
+                # Fin de un video o de una secuencia grabada
+                if getattr(self.cap, 'agotada', False):
+                    break
+                self.errores_lectura += 1
+                time.sleep(0.01)
+                continue
+            
+            with self.condicion:
+                # El frame anterior se pierde si nadie lo pidió antes de llegar este
+                if self.secuencia > self.entregada:
+                    self.descartados += 1
+                self.secuencia += 1
+                self.capturados += 1
+                self._marcas_fps.append(marca)
+                self.anillo.append((self.secuencia, marca, frame))
+                self.condicion.notify_all()
+        
+        # Despertar a quien espere un frame que ya no llegará
+        with self.condicion:
+            self.condicion.notify_all()
+    
+    def ultimo(self, despues_de=0, timeout=0.0):
+        """Frame más reciente como (secuencia, marca, frame)
+        
+        Devuelve None si no hay uno más nuevo que `despues_de` tras esperar
+        hasta `timeout` segundos (0 = no bloquear, para el hilo de Tk).
+        """
+        with self.condicion:
+            if self.secuencia <= despues_de and timeout:
+                self.condicion.wait_for(lambda: self.secuencia > despues_de or not self.activo(), timeout)
+            if self.secuencia <= despues_de or not self.anillo:
+                return None
+            captura = self.anillo[-1]
+            if captura[0] > self.entregada:
+                self.entregados += 1
+                self.entregada = captura[0]
+            return captura
+    
+    def recientes(self):
+        """Copia del anillo, del frame más viejo al más nuevo"""
+        with self.condicion:
+            return list(self.anillo)
+    
+    def fps(self):
+        with self.condicion:
+            if len(self._marcas_fps) < 2:
+                return 0.0
+            return (len(self._marcas_fps) - 1) / max(self._marcas_fps[-1] - self._marcas_fps[0], 1e-9)
+    
+    def estadisticas(self):
+        return {
+            'capturados': self.capturados,
+            'entregados': self.entregados,
+            'descartados': self.descartados,
+            'errores_lectura': self.errores_lectura,
+            'fps': self.fps(),
+        }
+    
+    def detener(self, timeout=2.0):
+        self._detener.set()
+        with self.condicion:
+            self.condicion.notify_all()
+        if self._hilo is not None:
+            self._hilo.join(timeout)
+            self._hilo = None
 
 def capturar_rostros(cap, num_capturas=3):
     """Capturar múltiples rostros de la cámara"""
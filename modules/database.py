@@ -1,114 +1,547 @@
+import argparse
 import sqlite3
 import numpy as np
 import json
-from datetime import datetime
+from datetime import datetime, timezone
 import os
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from modules.quantization import codificar_embedding, decodificar_embedding
+
+# Modelo que produce cada tamaño de embedding
+MODELOS_EMBEDDING = {
+    512: 'facenet-vggface2',
+    100 * 100: 'haar-gris-100x100',
+}
+
+
+def modelo_por_dimension(dimension):
+    return MODELOS_EMBEDDING.get(dimension)
+
+
+def marca_bd(fecha):
+    """Convertir un datetime local al texto UTC de CURRENT_TIMESTAMP ('' = sin límite)
+
+    Así los filtros comparan la columna directamente (`timestamp >= ?`) y
+    pueden usar los índices.
+    """
+    if fecha is None:
+        return ''
+    return fecha.astimezone(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+
+class ConnectionPool:
+    """Conexiones de larga duración a una base de datos, compartidas por el proceso
+    
+    Una única conexión de escritura protegida por un lock y una conexión de
+    lectura por hilo. Con WAL los lectores no bloquean al escritor ni al
+    revés, así las ventanas de reportes y detección no compiten entre sí.
+    """
+    
+    _pools = {}
+    _lock_pools = threading.Lock()
+    
+    PRAGMAS = (
+        "PRAGMA synchronous = NORMAL",
+        "PRAGMA cache_size = -16000",
+        "PRAGMA temp_store = MEMORY",
+        "PRAGMA mmap_size = 268435456",
+        "PRAGMA busy_timeout = 5000",
+    )
+    
+    def __init__(self, db_path, sentencias_cacheadas=256):
+        self.db_path = db_path
+        self.sentencias_cacheadas = sentencias_cacheadas
+        self.lock_escritura = threading.RLock()
+        self._local = threading.local()
+        self._lectores = []
+        self._lock_lectores = threading.Lock()
+        self._escritor = self._conectar()
+        self._escritor.execute("PRAGMA journal_mode = WAL")
+    
+    @classmethod
+    def para(cls, db_path):
+        """Pool compartido de una ruta (se crea la primera vez)"""
+        ruta = os.path.abspath(db_path)
+        with cls._lock_pools:
+            if ruta not in cls._pools:
+                cls._pools[ruta] = cls(ruta)
+            return cls._pools[ruta]
+    
+    @classmethod
+    def cerrar_todos(cls):
+        with cls._lock_pools:
+            pools = list(cls._pools.values())
+            cls._pools.clear()
+        for pool in pools:
+            pool.cerrar()
+    
+    def _conectar(self, **opciones):
+        # check_same_thread=False: el lock o el hilo dueño garantizan el uso exclusivo
+        conn = sqlite3.connect(self.db_path, check_same_thread=False,
+                               cached_statements=self.sentencias_cacheadas, **opciones)
+        for pragma in self.PRAGMAS:
+            conn.execute(pragma)
+        return conn
+    
+    @contextmanager
+    def escritura(self):
+        """Usar la conexión de escritura en exclusiva: commit al salir, rollback si falla"""
+        with self.lock_escritura:
+            try:
+                yield self._escritor
+                self._escritor.commit()
+            except Exception:
+                self._escritor.rollback()
+                raise
+    
+    def lectura(self):
+        """Conexión de lectura del hilo actual (autocommit: cada consulta ve lo último confirmado)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._conectar(isolation_level=None)
+            self._local.conn = conn
+            with self._lock_lectores:
+                self._lectores.append(conn)
+        return conn
+    
+    def soltar_lectura(self):
+        """Cerrar la conexión de lectura del hilo actual (al terminar hilos de vida corta)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            self._local.conn = None
+            with self._lock_lectores:
+                if conn in self._lectores:
+                    self._lectores.remove(conn)
+            conn.close()
+    
+    def cerrar(self):
+        with self._lock_lectores:
+            lectores, self._lectores = self._lectores, []
+        for conn in lectores:
+            conn.close()
+        with self.lock_escritura:
+            self._escritor.close()
+
 
 class DatabaseManager:
-    def __init__(self, db_path='data/database.db'):
+    # Suscriptores a cambios del padrón, compartidos por todas las instancias
+    # del proceso para que cualquier ventana vea las altas y bajas de otra
+    _suscriptores = []
+    _lock_suscriptores = threading.Lock()
+    
+    def __init__(self, db_path='data/database.db', formato_embedding='float32'):
         self.db_path = db_path
+        # Formato de los embeddings nuevos: 'json', 'float32', 'float16' o 'int8'
+        self.formato_embedding = formato_embedding
         
         # Asegurarse de que el directorio data existe
         os.makedirs(os.path.dirname(db_path), exist_ok=True)
         
+        # Conexiones compartidas con las demás instancias de la misma base
+        self.conexiones = ConnectionPool.para(db_path)
+        
         # Inicializar la base de datos
         self.init_database()
         print(f"📍 Base de datos: {os.path.abspath(self.db_path)}")
     
     def init_database(self):
-        """Inicializar la base de datos con las tablas necesarias"""
+        """Inicializar la base de datos aplicando las migraciones pendientes"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # Tabla de personas
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS personas (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    nombre TEXT NOT NULL,
-                    apellido TEXT NOT NULL,
-                    email TEXT UNIQUE NOT NULL,
-                    fecha_registro DATETIME DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            
-            # Tabla de embeddings
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS embeddings (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    persona_id INTEGER NOT NULL,
-                    embedding TEXT NOT NULL,
-                    FOREIGN KEY (persona_id) REFERENCES personas (id) ON DELETE CASCADE
-                )
-            ''')
-            
-            # Tabla de detecciones_emociones (corregida para coincidir con tu código)
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS detecciones_emociones (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    persona_id INTEGER NOT NULL,
-                    emocion TEXT NOT NULL,
-                    confianza REAL NOT NULL,
-                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (persona_id) REFERENCES personas (id) ON DELETE CASCADE
-                )
-            ''')
-            
-            conn.commit()
-            conn.close()
+            self.migrar()
             print("✅ Base de datos inicializada correctamente")
             
         except Exception as e:
             print(f"❌ Error inicializando base de datos: {e}")
     
-    def registrar_persona(self, nombre, apellido, email, embedding):
-        """Registrar una nueva persona en la base de datos"""
-        conn = sqlite3.connect(self.db_path)
+    def migraciones(self):
+        """Migraciones del esquema en orden: (versión, descripción, función)"""
+        return [
+            (1, "esquema inicial", self._migracion_esquema_inicial),
+            (2, "formato de embeddings y versión del padrón", self._migracion_formato_y_padron),
+            (3, "columnas de dimensión y modelo", self._migracion_dimension_y_modelo),
+            (4, "embeddings JSON a BLOB float32", self._migracion_json_a_blob),
+            (5, "índices del historial de emociones", self._migracion_indices_historial),
+            (6, "resúmenes diarios y por hora del historial", self._migracion_resumenes),
+            (7, "índice de paginación del historial", self._migracion_indice_paginacion),
+        ]
+    
+    def migrar(self):
+        """Aplicar las migraciones cuya versión supera PRAGMA user_version"""
+        with self.conexiones.escritura() as conn:
+            actual = conn.execute("PRAGMA user_version").fetchone()[0]
+            for version, descripcion, migracion in self.migraciones():
+                if version <= actual:
+                    continue
+                print(f"🛠️  Migración {version}: {descripcion}")
+                migracion(conn)
+                conn.execute(f"PRAGMA user_version = {version}")
+                conn.commit()
+    
+    def _migracion_esquema_inicial(self, conn):
         cursor = conn.cursor()
         
-        try:
-            # Verificar si el email ya existe
-            cursor.execute("SELECT id FROM personas WHERE email = ?", (email,))
-            if cursor.fetchone():
-                return False, "El email ya está registrado"
-            
-            # Insertar persona
-            cursor.execute(
-                "INSERT INTO personas (nombre, apellido, email) VALUES (?, ?, ?)",
-                (nombre, apellido, email)
+        # Tabla de personas
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS personas (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                nombre TEXT NOT NULL,
+                apellido TEXT NOT NULL,
+                email TEXT UNIQUE NOT NULL,
+                fecha_registro DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        
+        # Tabla de embeddings (las bases antiguas la tienen como TEXT; el
+        # tipo declarado no convierte los BLOB, así que ambas conviven)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS embeddings (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                persona_id INTEGER NOT NULL,
+                embedding BLOB NOT NULL,
+                FOREIGN KEY (persona_id) REFERENCES personas (id) ON DELETE CASCADE
+            )
+        ''')
+        
+        # Tabla de detecciones_emociones (corregida para coincidir con tu código)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS detecciones_emociones (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                persona_id INTEGER NOT NULL,
+                emocion TEXT NOT NULL,
+                confianza REAL NOT NULL,
+                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (persona_id) REFERENCES personas (id) ON DELETE CASCADE
             )
-            persona_id = cursor.lastrowid
+        ''')
+    
+    def _migracion_indices_historial(self, conn):
+        # (timestamp, emocion) cubre por sí solo la distribución y la actividad por rango
+        conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_detecciones_timestamp
+            ON detecciones_emociones (timestamp, emocion)
+        ''')
+        conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_detecciones_persona_timestamp
+            ON detecciones_emociones (persona_id, timestamp)
+        ''')
+        conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_detecciones_emocion_timestamp
+            ON detecciones_emociones (emocion, timestamp)
+        ''')
+        conn.execute("ANALYZE detecciones_emociones")
+    
+    def _migracion_indice_paginacion(self, conn):
+        # Mismo orden que las páginas (timestamp DESC, id DESC, recorrido al
+        # revés); persona_id al final resuelve el JOIN con personas sin leer
+        # la tabla, así los cursores del historial no ordenan nada
+        conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_detecciones_timestamp_id
+            ON detecciones_emociones (timestamp, id, persona_id)
+        ''')
+        conn.execute("ANALYZE detecciones_emociones")
+    
+    # Resúmenes: (tabla, columna de periodo, expresión del periodo sobre la detección)
+    RESUMENES = (
+        ('resumen_emociones_dia', 'fecha', "DATE({fila}.timestamp)"),
+        ('resumen_emociones_hora', 'hora', "strftime('%Y-%m-%d %H', {fila}.timestamp)"),
+    )
+    
+    def _migracion_resumenes(self, conn):
+        for tabla, periodo, expresion in self.RESUMENES:
+            conn.execute(f'''
+                CREATE TABLE IF NOT EXISTS {tabla} (
+                    {periodo} TEXT NOT NULL,
+                    persona_id INTEGER NOT NULL,
+                    emocion TEXT NOT NULL,
+                    conteo INTEGER NOT NULL,
+                    suma_confianza REAL NOT NULL,
+                    PRIMARY KEY ({periodo}, persona_id, emocion)
+                ) WITHOUT ROWID
+            ''')
+            conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{tabla}_persona ON {tabla} (persona_id, {periodo})")
             
-            # Guardar embedding
-            embedding_blob = json.dumps(embedding.tolist() if hasattr(embedding, 'tolist') else embedding)
-            cursor.execute(
-                "INSERT INTO embeddings (persona_id, embedding) VALUES (?, ?)",
-                (persona_id, embedding_blob)
+            # Cada detección suma en su periodo; al borrarla se resta y se
+            # quitan los grupos que quedan vacíos
+            nueva = expresion.format(fila='NEW')
+            vieja = expresion.format(fila='OLD')
+            conn.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_{tabla}_alta
+                AFTER INSERT ON detecciones_emociones
+                BEGIN
+                    INSERT INTO {tabla} ({periodo}, persona_id, emocion, conteo, suma_confianza)
+                    VALUES ({nueva}, NEW.persona_id, NEW.emocion, 1, NEW.confianza)
+                    ON CONFLICT ({periodo}, persona_id, emocion) DO UPDATE SET
+                        conteo = conteo + 1,
+                        suma_confianza = suma_confianza + excluded.suma_confianza;
+                END
+            ''')
+            conn.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_{tabla}_baja
+                AFTER DELETE ON detecciones_emociones
+                BEGIN
+                    UPDATE {tabla} SET conteo = conteo - 1, suma_confianza = suma_confianza - OLD.confianza
+                    WHERE {periodo} = {vieja} AND persona_id = OLD.persona_id AND emocion = OLD.emocion;
+                    DELETE FROM {tabla}
+                    WHERE {periodo} = {vieja} AND persona_id = OLD.persona_id AND emocion = OLD.emocion
+                      AND conteo <= 0;
+                END
+            ''')
+        self._reconstruir_resumenes(conn)
+    
+    def _reconstruir_resumenes(self, conn):
+        for tabla, periodo, expresion in self.RESUMENES:
+            conn.execute(f"DELETE FROM {tabla}")
+            conn.execute(f'''
+                INSERT INTO {tabla} ({periodo}, persona_id, emocion, conteo, suma_confianza)
+                SELECT {expresion.format(fila='d')}, d.persona_id, d.emocion, COUNT(*), SUM(d.confianza)
+                FROM detecciones_emociones d
+                GROUP BY 1, 2, 3
+            ''')
+    
+    def reconstruir_resumenes(self):
+        """Recalcular los resúmenes desde el historial completo (relleno o reparación)"""
+        inicio = time.perf_counter()
+        with self.conexiones.escritura() as conn:
+            self._reconstruir_resumenes(conn)
+            filas = {tabla: conn.execute(f"SELECT COUNT(*) FROM {tabla}").fetchone()[0]
+                     for tabla, _, _ in self.RESUMENES}
+        print(f"📊 Resúmenes reconstruidos en {time.perf_counter() - inicio:.2f}s: {filas}")
+        return filas
+    
+    def _columnas(self, conn, tabla):
+        return [columna[1] for columna in conn.execute(f"PRAGMA table_info({tabla})")]
+    
+    def _migracion_formato_y_padron(self, conn):
+        # Formato de cada embedding (NULL = JSON de versiones anteriores)
+        if 'formato' not in self._columnas(conn, 'embeddings'):
+            conn.execute("ALTER TABLE embeddings ADD COLUMN formato TEXT")
+        
+        # Metadatos: versión del padrón, se incrementa en cada alta o baja
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS metadatos (
+                clave TEXT PRIMARY KEY,
+                valor INTEGER NOT NULL
             )
+        ''')
+        conn.execute("INSERT OR IGNORE INTO metadatos (clave, valor) VALUES ('version_padron', 0)")
+    
+    def _migracion_dimension_y_modelo(self, conn):
+        columnas = self._columnas(conn, 'embeddings')
+        if 'dimension' not in columnas:
+            conn.execute("ALTER TABLE embeddings ADD COLUMN dimension INTEGER")
+        if 'modelo' not in columnas:
+            conn.execute("ALTER TABLE embeddings ADD COLUMN modelo TEXT")
+    
+    def _migracion_json_a_blob(self, conn, tam_lote=1000):
+        """Convertir por lotes los embeddings JSON a BLOB float32 y completar dimensión y modelo
+        
+        Cada lote se confirma por separado: si se interrumpe, la próxima
+        apertura sigue donde quedó, y mientras tanto las lecturas funcionan
+        porque cada fila indica su formato.
+        """
+        tam_archivo = os.path.getsize(self.db_path)
+        convertidos = 0
+        bytes_antes = 0
+        bytes_despues = 0
+        ultimo_id = -1
+        
+        while True:
+            filas = conn.execute('''
+                SELECT id, embedding, formato FROM embeddings
+                WHERE dimension IS NULL AND id > ?
+                ORDER BY id LIMIT ?
+            ''', (ultimo_id, tam_lote)).fetchall()
+            if not filas:
+                break
+            ultimo_id = filas[-1][0]
             
-            conn.commit()
-            return True, "Persona registrada exitosamente"
+            cambios = []
+            for embedding_id, valor, formato in filas:
+                try:
+                    vector = decodificar_embedding(valor, formato)
+                except Exception as e:
+                    print(f"⚠️  Embedding {embedding_id} ilegible, se deja como está: {e}")
+                    continue
+                
+                if formato in (None, 'json') or isinstance(valor, str):
+                    blob = codificar_embedding(vector, 'float32')
+                    bytes_antes += len(valor.encode('utf-8') if isinstance(valor, str) else valor)
+                    bytes_despues += len(blob)
+                    convertidos += 1
+                    cambios.append((blob, 'float32', len(vector), modelo_por_dimension(len(vector)), embedding_id))
+                else:
+                    cambios.append((valor, formato, len(vector), modelo_por_dimension(len(vector)), embedding_id))
             
+            conn.executemany(
+                "UPDATE embeddings SET embedding = ?, formato = ?, dimension = ?, modelo = ? WHERE id = ?",
+                cambios
+            )
+            conn.commit()
+        
+        if convertidos:
+            # Devolver al sistema las páginas liberadas
+            conn.commit()
+            conn.execute("VACUUM")
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            print(f"♻️  {convertidos} embeddings convertidos a float32: "
+                  f"{bytes_antes / 1024:.1f} KB → {bytes_despues / 1024:.1f} KB, "
+                  f"archivo {tam_archivo / 1024:.1f} KB → {os.path.getsize(self.db_path) / 1024:.1f} KB")
+    
+    def suscribir(self, callback):
+        """Recibir los cambios del padrón como callback(evento, datos)
+        
+        Eventos: 'alta' con persona_id, nombre, embeddings [(embedding_id,
+        vector)] y version; 'baja' con persona_id y version. Los métodos
+        ligados se guardan con referencia débil.
+        """
+        if hasattr(callback, '__self__'):
+            referencia = weakref.WeakMethod(callback)
+        else:
+            referencia = lambda: callback
+        with DatabaseManager._lock_suscriptores:
+            DatabaseManager._suscriptores.append((os.path.abspath(self.db_path), referencia))
+    
+    def desuscribir(self, callback):
+        with DatabaseManager._lock_suscriptores:
+            DatabaseManager._suscriptores = [
+                (ruta, referencia) for ruta, referencia in DatabaseManager._suscriptores
+                if referencia() is not None and referencia() != callback
+            ]
+    
+    def _notificar(self, evento, **datos):
+        ruta = os.path.abspath(self.db_path)
+        with DatabaseManager._lock_suscriptores:
+            callbacks = [referencia() for r, referencia in DatabaseManager._suscriptores if r == ruta]
+        for callback in callbacks:
+            if callback is None:
+                continue
+            try:
+                callback(evento, datos)
+            except Exception as e:
+                print(f"⚠️  Error notificando '{evento}': {e}")
+    
+    def _incrementar_version(self, cursor):
+        cursor.execute("UPDATE metadatos SET valor = valor + 1 WHERE clave = 'version_padron'")
+        cursor.execute("SELECT valor FROM metadatos WHERE clave = 'version_padron'")
+        return cursor.fetchone()[0]
+    
+    def obtener_version_padron(self):
+        """Versión actual del padrón (cambia con cada alta o baja)"""
+        conn = self.conexiones.lectura()
+        fila = conn.execute("SELECT valor FROM metadatos WHERE clave = 'version_padron'").fetchone()
+        return fila[0] if fila else 0
+    
+    def registrar_persona(self, nombre, apellido, email, embedding):
+        """Registrar una nueva persona en la base de datos
+        
+        `embedding` puede ser un vector o varios (una plantilla por fila).
+        """
+        try:
+            with self.conexiones.escritura() as conn:
+                cursor = conn.cursor()
+                
+                # Verificar si el email ya existe
+                cursor.execute("SELECT id FROM personas WHERE email = ?", (email,))
+                if cursor.fetchone():
+                    return False, "El email ya está registrado"
+                
+                # Insertar persona
+                cursor.execute(
+                    "INSERT INTO personas (nombre, apellido, email) VALUES (?, ?, ?)",
+                    (nombre, apellido, email)
+                )
+                persona_id = cursor.lastrowid
+                
+                # Guardar una fila por plantilla, consecutivas para la misma persona
+                guardados = []
+                for plantilla in np.atleast_2d(np.asarray(embedding, dtype=np.float32)):
+                    embedding_blob = codificar_embedding(plantilla, self.formato_embedding)
+                    cursor.execute(
+                        "INSERT INTO embeddings (persona_id, embedding, formato, dimension, modelo) VALUES (?, ?, ?, ?, ?)",
+                        (persona_id, embedding_blob, self.formato_embedding, len(plantilla), modelo_por_dimension(len(plantilla)))
+                    )
+                    guardados.append((cursor.lastrowid, embedding_blob))
+                version = self._incrementar_version(cursor)
         except Exception as e:
-            conn.rollback()
             return False, f"Error al registrar: {str(e)}"
-        finally:
-            conn.close()
+        
+        # Se notifican los vectores tal como quedaron guardados (con la misma pérdida de precisión)
+        embeddings = [(embedding_id, decodificar_embedding(blob, self.formato_embedding))
+                      for embedding_id, blob in guardados]
+        self._notificar('alta', persona_id=persona_id, nombre=f"{nombre} {apellido}",
+                        embeddings=embeddings, version=version)
+        return True, "Persona registrada exitosamente"
+    
+    def registrar_personas_lote(self, personas):
+        """Registrar muchas personas en una sola transacción
+        
+        `personas` es una lista de (nombre, apellido, email, embeddings).
+        Los emails ya registrados se omiten. Devuelve una lista de
+        (email, exito, mensaje) en el mismo orden.
+        """
+        resultados = []
+        altas = []
+        
+        try:
+            with self.conexiones.escritura() as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT email FROM personas")
+                existentes = {fila[0] for fila in cursor.fetchall()}
+                
+                for nombre, apellido, email, embeddings in personas:
+                    if email in existentes:
+                        resultados.append((email, False, "El email ya está registrado"))
+                        continue
+                    existentes.add(email)
+                    
+                    cursor.execute(
+                        "INSERT INTO personas (nombre, apellido, email) VALUES (?, ?, ?)",
+                        (nombre, apellido, email)
+                    )
+                    persona_id = cursor.lastrowid
+                    
+                    plantillas = np.atleast_2d(np.asarray(embeddings, dtype=np.float32))
+                    dimension = plantillas.shape[1]
+                    guardados = []
+                    for plantilla in plantillas:
+                        blob = codificar_embedding(plantilla, self.formato_embedding)
+                        cursor.execute(
+                            "INSERT INTO embeddings (persona_id, embedding, formato, dimension, modelo) VALUES (?, ?, ?, ?, ?)",
+                            (persona_id, blob, self.formato_embedding, dimension, modelo_por_dimension(dimension))
+                        )
+                        guardados.append((cursor.lastrowid, blob))
+                    altas.append((persona_id, f"{nombre} {apellido}", guardados))
+                    resultados.append((email, True, "Persona registrada exitosamente"))
+                
+                version = self._incrementar_version(cursor) if altas else None
+        except Exception as e:
+            return [(persona[2], False, f"Error al registrar: {str(e)}") for persona in personas]
+        
+        for persona_id, nombre, guardados in altas:
+            embeddings = [(embedding_id, decodificar_embedding(blob, self.formato_embedding))
+                          for embedding_id, blob in guardados]
+            self._notificar('alta', persona_id=persona_id, nombre=nombre, embeddings=embeddings, version=version)
+        return resultados
+    
+    def obtener_emails(self):
+        """Conjunto de emails registrados"""
+        return {fila[0] for fila in self.conexiones.lectura().execute("SELECT email FROM personas")}
     
     def obtener_persona_por_email(self, email):
         """Obtener información de una persona por email"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        cursor = self.conexiones.lectura().cursor()
         
         cursor.execute('''
-            SELECT p.id, p.nombre, p.apellido, p.email, e.embedding 
+            SELECT p.id, p.nombre, p.apellido, p.email, e.embedding, e.formato 
             FROM personas p 
             LEFT JOIN embeddings e ON p.id = e.persona_id 
             WHERE p.email = ?
         ''', (email,))
         
         result = cursor.fetchone()
-        conn.close()
         
         if result:
             return {
@@ -116,15 +549,14 @@ class DatabaseManager:
                 'nombre': result[1],
                 'apellido': result[2],
                 'email': result[3],
-                'embedding': json.loads(result[4]) if result[4] else None
+                'embedding': decodificar_embedding(result[4], result[5]).tolist() if result[4] else None
             }
         return None
     
     def obtener_todas_personas(self):
         """Obtener todas las personas registradas - VERSIÓN CORREGIDA"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
+            cursor = self.conexiones.lectura().cursor()
             
             # Verificar si la tabla existe
             cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='personas'")
@@ -139,7 +571,6 @@ class DatabaseManager:
             ''')
             
             personas = cursor.fetchall()
-            conn.close()
             
             print(f"✅ Se encontraron {len(personas)} personas en la base de datos")
             for persona in personas:
@@ -150,34 +581,63 @@ class DatabaseManager:
             print(f"❌ Error al obtener personas: {e}")
             return []
     
+    def obtener_embeddings(self, desde_id=None, dimension=None):
+        """Obtener los embeddings como (persona_id, nombre completo, embedding_id, vector)
+        
+        Con `desde_id` solo devuelve los embeddings con id mayor (los nuevos).
+        Con `dimension` solo los de ese tamaño (los de un mismo modelo), sin
+        decodificar los demás.
+        """
+        cursor = self.conexiones.lectura().cursor()
+        
+        filtro_dimension = "AND e.dimension = :dimension" if dimension is not None else ""
+        cursor.execute(f'''
+            SELECT p.id, p.nombre, p.apellido, e.id, e.embedding, e.formato 
+            FROM personas p 
+            JOIN embeddings e ON p.id = e.persona_id
+            WHERE e.id > :desde {filtro_dimension}
+            ORDER BY e.id
+        ''', {'desde': -1 if desde_id is None else desde_id, 'dimension': dimension})
+        
+        resultados = cursor.fetchall()
+        
+        embeddings = []
+        for persona_id, nombre, apellido, embedding_id, valor, formato in resultados:
+            try:
+                embeddings.append((persona_id, f"{nombre} {apellido}", embedding_id,
+                                   decodificar_embedding(valor, formato)))
+            except Exception as e:
+                print(f"❌ Error cargando embedding de {nombre}: {e}")
+        return embeddings
+    
+    def obtener_ids_personas(self):
+        """Conjunto de ids de personas registradas (sin leer embeddings)"""
+        return {fila[0] for fila in self.conexiones.lectura().execute("SELECT id FROM personas")}
+    
     def eliminar_persona(self, persona_id):
         """Eliminar una persona y sus datos relacionados"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # Primero obtener información de la persona para el mensaje
-            cursor.execute("SELECT nombre, apellido FROM personas WHERE id = ?", (persona_id,))
-            persona_info = cursor.fetchone()
-            
-            if not persona_info:
-                return False, "La persona no existe"
-            
-            # Eliminar de la tabla detecciones_emociones primero
-            try:
+            with self.conexiones.escritura() as conn:
+                cursor = conn.cursor()
+                
+                # Primero obtener información de la persona para el mensaje
+                cursor.execute("SELECT nombre, apellido FROM personas WHERE id = ?", (persona_id,))
+                persona_info = cursor.fetchone()
+                
+                if not persona_info:
+                    return False, "La persona no existe"
+                
+                # Eliminar de la tabla detecciones_emociones primero
                 cursor.execute('DELETE FROM detecciones_emociones WHERE persona_id = ?', (persona_id,))
-            except:
-                pass  # La tabla puede no existir
-            
-            # Eliminar de la tabla embeddings
-            cursor.execute('DELETE FROM embeddings WHERE persona_id = ?', (persona_id,))
-            
-            # Eliminar de la tabla personas
-            cursor.execute('DELETE FROM personas WHERE id = ?', (persona_id,))
-            
-            conn.commit()
-            conn.close()
+                
+                # Eliminar de la tabla embeddings
+                cursor.execute('DELETE FROM embeddings WHERE persona_id = ?', (persona_id,))
+                
+                # Eliminar de la tabla personas
+                cursor.execute('DELETE FROM personas WHERE id = ?', (persona_id,))
+                version = self._incrementar_version(cursor)
             
+            self._notificar('baja', persona_id=int(persona_id), version=version)
             nombre_completo = f"{persona_info[0]} {persona_info[1]}"
             return True, f"Persona '{nombre_completo}' eliminada correctamente"
             
@@ -187,62 +647,244 @@ class DatabaseManager:
     def guardar_deteccion_emocion(self, persona_id, emocion, confianza):
         """Guardar detección emocional en el historial"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute(
-                "INSERT INTO detecciones_emociones (persona_id, emocion, confianza) VALUES (?, ?, ?)",
-                (persona_id, emocion, confianza)
-            )
-            
-            conn.commit()
-            conn.close()
+            with self.conexiones.escritura() as conn:
+                conn.execute(
+                    "INSERT INTO detecciones_emociones (persona_id, emocion, confianza) VALUES (?, ?, ?)",
+                    (persona_id, emocion, confianza)
+                )
             return True
         except Exception as e:
             print(f"❌ Error guardando detección: {e}")
             return False
     
+    def guardar_detecciones_emociones(self, detecciones):
+        """Guardar varias detecciones (persona_id, emocion, confianza, timestamp) en una transacción"""
+        with self.conexiones.escritura() as conn:
+            conn.executemany(
+                "INSERT INTO detecciones_emociones (persona_id, emocion, confianza, timestamp) VALUES (?, ?, ?, ?)",
+                detecciones
+            )
+        return len(detecciones)
+    
+    # Columnas de cada fila del historial (modo tuplas y claves del modo diccionario)
+    COLUMNAS_HISTORIAL = ('id', 'timestamp', 'persona_id', 'nombre', 'apellido', 'emocion', 'confianza')
+    # Filas del historial: páginas, cursores y conteos usan este mismo conjunto
+    ORIGEN_HISTORIAL = "FROM detecciones_emociones de JOIN personas p ON de.persona_id = p.id"
+    
+    def pagina_historial(self, persona_id=None, emocion=None, desde=None, hasta=None,
+                         despues=None, limite=500, tuplas=False):
+        """Una página del historial, de la detección más reciente a la más antigua
+        
+        Paginación por clave: `despues` es el cursor (timestamp, id) devuelto
+        por la página anterior y la consulta sigue el índice desde ahí, así
+        la página 1000 cuesta lo mismo que la primera. `desde` y `hasta`
+        (datetime local, `hasta` exclusivo) acotan el rango. Devuelve
+        (filas, cursor) con cursor None en la última página.
+        """
+        donde, parametros = self._filtros_historial(persona_id, emocion, desde, hasta, despues)
+        parametros['limite'] = limite
+        
+        cursor = self.conexiones.lectura().cursor()
+        cursor.execute(f'''
+            SELECT de.id, de.timestamp, de.persona_id, p.nombre, p.apellido, de.emocion, de.confianza
+            {self.ORIGEN_HISTORIAL}
+            {donde}
+            ORDER BY de.timestamp DESC, de.id DESC
+            LIMIT :limite
+        ''', parametros)
+        filas = cursor.fetchall()
+        
+        siguiente = (filas[-1][1], filas[-1][0]) if len(filas) == limite else None
+        if not tuplas:
+            filas = [dict(zip(self.COLUMNAS_HISTORIAL, fila)) for fila in filas]
+        return filas, siguiente
+    
+    def _filtros_historial(self, persona_id, emocion, desde, hasta, despues):
+        condiciones = []
+        parametros = {}
+        if persona_id is not None:
+            condiciones.append("de.persona_id = :persona")
+            parametros['persona'] = persona_id
+        if emocion is not None:
+            condiciones.append("de.emocion = :emocion")
+            parametros['emocion'] = emocion
+        if desde is not None:
+            condiciones.append("de.timestamp >= :desde")
+            parametros['desde'] = marca_bd(desde)
+        if hasta is not None:
+            condiciones.append("de.timestamp < :hasta")
+            parametros['hasta'] = marca_bd(hasta)
+        if despues is not None:
+            condiciones.append("(de.timestamp, de.id) < (:cursor_ts, :cursor_id)")
+            parametros['cursor_ts'], parametros['cursor_id'] = despues
+        donde = f"WHERE {' AND '.join(condiciones)}" if condiciones else ''
+        return donde, parametros
+    
+    def iterar_historial(self, persona_id=None, emocion=None, desde=None, hasta=None,
+                         tam_pagina=1000, tuplas=False):
+        """Recorrer el historial completo página a página con memoria acotada
+        
+        Cada página es una consulta corta, así no se mantiene abierta una
+        lectura durante todo el recorrido ni se bloquea el checkpoint del WAL.
+        """
+        despues = None
+        while True:
+            filas, despues = self.pagina_historial(persona_id, emocion, desde, hasta,
+                                                   despues, tam_pagina, tuplas)
+            yield from filas
+            if despues is None:
+                return
+    
+    def anclas_historial(self, tam_bloque, persona_id=None, emocion=None, despues=None):
+        """Cursores de inicio de cada bloque de `tam_bloque` filas del historial
+        
+        Permiten saltar a cualquier posición con `pagina_historial` sin
+        OFFSET. Cuenta las mismas filas que las páginas (mismo origen y
+        filtros) y sin filtros solo recorre el índice (timestamp, id,
+        persona_id), sin leer las filas ni ordenar; se genera de a un
+        cursor para poder informar el progreso.
+        """
+        cursor = self.conexiones.lectura().cursor()
+        while True:
+            donde, parametros = self._filtros_historial(persona_id, emocion, None, None, despues)
+            parametros['salto'] = tam_bloque - 1
+            cursor.execute(f'''
+                SELECT de.timestamp, de.id {self.ORIGEN_HISTORIAL}
+                {donde}
+                ORDER BY de.timestamp DESC, de.id DESC
+                LIMIT 1 OFFSET :salto
+            ''', parametros)
+            fila = cursor.fetchone()
+            if fila is None:
+                return
+            despues = (fila[0], fila[1])
+            yield despues
+    
+    def contar_historial(self, persona_id=None, emocion=None, desde=None, hasta=None, despues=None):
+        """Cantidad exacta de filas que devuelve `pagina_historial` con los mismos filtros
+        
+        Recorre el índice del filtro (décimas de segundo por millón de
+        filas); con `despues` cuenta solo las filas desde ese cursor.
+        """
+        donde, parametros = self._filtros_historial(persona_id, emocion, desde, hasta, despues)
+        cursor = self.conexiones.lectura().cursor()
+        cursor.execute(f"SELECT COUNT(*) {self.ORIGEN_HISTORIAL} {donde}", parametros)
+        return cursor.fetchone()[0]
+    
+    def estimar_historial(self, persona_id=None, emocion=None):
+        """Cantidad aproximada de detecciones según el resumen diario (sin recorrer el historial)
+        
+        Es inmediata pero puede no coincidir con las páginas: el resumen
+        incluye detecciones sin persona registrada y las que llegaron
+        después. Sirve para dimensionar, no para ubicar filas.
+        """
+        condiciones = []
+        parametros = {}
+        if persona_id is not None:
+            condiciones.append("persona_id = :persona")
+            parametros['persona'] = persona_id
+        if emocion is not None:
+            condiciones.append("emocion = :emocion")
+            parametros['emocion'] = emocion
+        donde = f"WHERE {' AND '.join(condiciones)}" if condiciones else ''
+        cursor = self.conexiones.lectura().cursor()
+        cursor.execute(f"SELECT COALESCE(SUM(conteo), 0) FROM resumen_emociones_dia {donde}", parametros)
+        return cursor.fetchone()[0]
+    
     def obtener_historial_emociones(self, persona_id=None):
-        """Obtener historial de detecciones emocionales"""
+        """Obtener historial de detecciones emocionales (todo en memoria; para volúmenes grandes usar `iterar_historial`)"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            if persona_id:
-                cursor.execute('''
-                    SELECT de.emocion, de.confianza, de.timestamp, p.nombre, p.apellido
-                    FROM detecciones_emociones de
-                    JOIN personas p ON de.persona_id = p.id
-                    WHERE de.persona_id = ?
-                    ORDER BY de.timestamp DESC
-                ''', (persona_id,))
-            else:
-                cursor.execute('''
-                    SELECT de.emocion, de.confianza, de.timestamp, p.nombre, p.apellido
-                    FROM detecciones_emociones de
-                    JOIN personas p ON de.persona_id = p.id
-                    ORDER BY de.timestamp DESC
-                ''')
-            
-            resultados = cursor.fetchall()
-            conn.close()
-            
-            return [{
-                'emocion': r[0],
-                'confianza': r[1],
-                'timestamp': r[2],
-                'nombre': r[3],
-                'apellido': r[4]
-            } for r in resultados]
+            return list(self.iterar_historial(persona_id))
         except Exception as e:
             print(f"❌ Error obteniendo historial: {e}")
             return []
     
+    def _rango_resumen(self, fecha_limite):
+        """Límites para combinar resúmenes: días completos desde el día siguiente
+        al corte y, del día del corte, solo las horas desde el corte"""
+        desde = marca_bd(fecha_limite)
+        return desde[:10], desde[:13]
+    
+    def obtener_estadisticas(self, fecha_limite=None):
+        """Distribución de emociones y actividad de los últimos 10 días desde `fecha_limite` (None = todo)
+        
+        Se lee de los resúmenes diarios y por hora, así el coste depende del
+        rango y no del tamaño del historial.
+        """
+        cursor = self.conexiones.lectura().cursor()
+        dia, hora = self._rango_resumen(fecha_limite)
+        rango = '''
+            SELECT fecha, emocion, conteo FROM resumen_emociones_dia
+            WHERE fecha > :dia
+            UNION ALL
+            SELECT substr(hora, 1, 10), emocion, conteo FROM resumen_emociones_hora
+            WHERE hora >= :hora AND hora < DATE(:dia, '+1 day')
+        '''
+        
+        # Distribución de emociones
+        cursor.execute(f'''
+            SELECT emocion, SUM(conteo) FROM ({rango})
+            GROUP BY emocion
+        ''', {'dia': dia, 'hora': hora})
+        
+        distribucion_emociones = {row[0]: row[1] for row in cursor.fetchall()}
+        
+        # Actividad temporal
+        cursor.execute(f'''
+            SELECT fecha, SUM(conteo) FROM ({rango})
+            GROUP BY fecha
+            ORDER BY fecha DESC
+            LIMIT 10
+        ''', {'dia': dia, 'hora': hora})
+        
+        actividad_temporal = {row[0]: row[1] for row in cursor.fetchall()}
+        
+        return {
+            'distribucion_emociones': distribucion_emociones,
+            'actividad_temporal': actividad_temporal
+        }
+    
+    def obtener_emociones_persona(self, persona_id, fecha_limite=None):
+        """Conteo de emociones de una persona, desde el resumen diario"""
+        cursor = self.conexiones.lectura().cursor()
+        dia, hora = self._rango_resumen(fecha_limite)
+        cursor.execute('''
+            SELECT emocion, SUM(conteo) FROM (
+                SELECT emocion, conteo FROM resumen_emociones_dia
+                WHERE persona_id = :persona AND fecha > :dia
+                UNION ALL
+                SELECT emocion, conteo FROM resumen_emociones_hora
+                WHERE persona_id = :persona AND hora >= :hora AND hora < DATE(:dia, '+1 day')
+            )
+            GROUP BY emocion
+        ''', {'persona': persona_id, 'dia': dia, 'hora': hora})
+        return {row[0]: row[1] for row in cursor.fetchall()}
+    
+    def obtener_nombres_personas(self):
+        """Nombres completos de las personas registradas como {nombre: id}
+        
+        Si dos personas se llaman igual, la segunda lleva su id entre paréntesis.
+        """
+        cursor = self.conexiones.lectura().cursor()
+        cursor.execute('SELECT id, nombre, apellido FROM personas ORDER BY id')
+        nombres = {}
+        for persona_id, nombre, apellido in cursor.fetchall():
+            completo = f"{nombre} {apellido}"
+            if completo in nombres:
+                completo = f"{completo} ({persona_id})"
+            nombres[completo] = persona_id
+        return nombres
+    
+    def cerrar(self):
+        """Cerrar las conexiones compartidas de esta base (al salir de la aplicación)"""
+        with ConnectionPool._lock_pools:
+            ConnectionPool._pools.pop(os.path.abspath(self.db_path), None)
+        self.conexiones.cerrar()
+    
     def diagnosticar_bd(self):
         """Función de diagnóstico para ver el estado de la base de datos"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
+            cursor = self.conexiones.lectura().cursor()
             
             # Ver tablas existentes
             cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
@@ -259,8 +901,25 @@ class DatabaseManager:
                 cursor.execute(f"SELECT COUNT(*) FROM {tabla}")
                 info['conteos'][tabla] = cursor.fetchone()[0]
             
-            conn.close()
             return info
             
         except Exception as e:
-            return {'error': str(e)}
\ No newline at end of file
+            return {'error': str(e)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mantenimiento de la base de datos")
+    parser.add_argument('--db', default='data/database.db')
+    parser.add_argument('--reconstruir-resumenes', action='store_true',
+                        help="Recalcular los resúmenes diarios y por hora desde el historial")
+    args = parser.parse_args()
+
+    db = DatabaseManager(args.db)
+    if args.reconstruir_resumenes:
+        db.reconstruir_resumenes()
+    else:
+        print(db.diagnosticar_bd())
+
+
+if __name__ == '__main__':
+    main()
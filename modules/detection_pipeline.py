@@ -0,0 +1,216 @@
+import argparse
+import json
+import time
+import numpy as np
+import cv2
+
+from modules.face_tracker import FaceTracker
+from modules.face_detectors import DETECTORES, crear_detector
+
+# Ajustes por defecto de la detección en vivo (frame reducido a 320 px de ancho)
+AJUSTES_DETECTOR = {
+    'haar': {'ancho_deteccion': 320, 'factor_escala': 1.1, 'vecinos': 4, 'tam_minimo': (50, 50)},
+    'lbp': {'ancho_deteccion': 320, 'factor_escala': 1.1, 'vecinos': 4, 'tam_minimo': (50, 50)},
+    'mtcnn': {'ancho_deteccion': 640, 'fraccion_rostro': 0.08},
+}
+
+
+class DetectionPipeline:
+    """Detección, reconocimiento y emociones de un frame, sin interfaz
+
+    La usan la ventana de detección (desde el hilo de inferencia) y la
+    medición sin interfaz. `instante` es el tiempo del frame: el de captura
+    en vivo o el del medio al reproducir una grabación, así una misma
+    grabación da siempre los mismos resultados.
+
+    Cada frame se detecta una sola vez con `detector` (nombre de
+    face_detectors o un detector ya creado); esas cajas alimentan el
+    seguimiento, el reconocimiento (que solo recorta y alinea, sin volver
+    a detectar) y el análisis de emociones. `ajustes` cambia los valores
+    por defecto del detector nombrado.
+    """
+
+    def __init__(self, face_system, emotion_analyzer, tracker=None, detector='haar', **ajustes):
+        self.face_system = face_system
+        self.emotion_analyzer = emotion_analyzer
+        self.tracker = tracker or FaceTracker()
+        if isinstance(detector, str):
+            detector = crear_detector(detector, **dict(AJUSTES_DETECTOR.get(detector, {}), **ajustes))
+        self.detector = detector
+
+    def reiniciar(self):
+        self.tracker.reiniciar()
+
+    def liberar(self):
+        """Devolver el modelo del detector (el MTCNN compartido) al registro"""
+        self.detector.liberar()
+
+    def detectar(self, frame):
+        """Etapa única de detección: cajas (x, y, w, h) en coordenadas del frame"""
+        return self.detector.detectar(frame)
+
+    def analizar(self, frame, instante):
+        """Anotaciones (caja, texto, color) y datos del panel para un frame"""
+        cajas = self.detectar(frame)
+
+        # Asociar rostros a tracks y reconocer solo los que lo necesitan
+        tracks = self.tracker.actualizar(cajas, instante)
+        pendientes = [t for t in tracks if self.tracker.necesita_reconocimiento(t, instante)]
+        if pendientes:
+            self.reconocer_tracks(frame, pendientes, instante)
+
+        anotaciones = []
+        for track in tracks:
+            x_orig, y_orig, w_orig, h_orig = track.caja
+
+            # La emoción también se cachea por track y se refresca por intervalo
+            if self.tracker.necesita_emocion(track, instante):
+                try:
+                    face_roi = frame[y_orig:y_orig+h_orig, x_orig:x_orig+w_orig]
+                    if face_roi.size > 0:
+                        emocion, confianza_emocion = self.emotion_analyzer.predecir_emocion(face_roi)
+                        print(f"😊 Emoción detectada: {emocion} ({confianza_emocion:.2f})")
+                        self.tracker.asignar_emocion(track, emocion, confianza_emocion, instante)
+                except Exception as e:
+                    print(f"❌ Error en análisis de emociones: {e}")
+                    self.tracker.asignar_emocion(track, "Error", 0.0, instante)
+
+            if track.nombre != "Desconocido" and track.confianza > 0.6:
+                color = (0, 255, 0)
+                texto = f"{track.nombre} ({track.confianza:.1%})"
+                if track.emocion != "---":
+                    texto += f" | {track.emocion}"
+            else:
+                color = (0, 0, 255)
+                texto = "No registrado"
+                if track.emocion != "---":
+                    texto += f" | {track.emocion}"
+
+            anotaciones.append((track.caja, texto, color))
+
+        # El panel muestra el rostro más grande en escena
+        if tracks:
+            principal = max(tracks, key=lambda t: t.caja[2] * t.caja[3])
+            panel = (
+                principal.nombre, principal.emocion,
+                max(principal.confianza, principal.confianza_emocion), principal.persona_id,
+                principal.ultima_emocion == instante
+            )
+        else:
+            panel = ("Desconocido", "---", 0.0, None, False)
+
+        return {'anotaciones': anotaciones, 'panel': panel}
+
+    def reconocer_tracks(self, frame, tracks, ahora):
+        """Reconocer en lote las cajas de los tracks pendientes"""
+        resultados = self.face_system.reconocer_en_cajas(frame, [t.caja for t in tracks], con_embeddings=True)
+        if not resultados:
+            for track in tracks:
+                self.tracker.marcar_intento(track, ahora)
+            return
+
+        for track, (persona_id, nombre, confianza, embedding) in zip(tracks, resultados):
+            self.tracker.asignar_identidad(track, persona_id, nombre, confianza, embedding, ahora)
+            print(f"🎭 Reconocimiento IA (track {track.id}): {nombre} ({confianza:.2f})")
+
+
+def medir(pipeline, fuente, max_frames=None, salida=None):
+    """Pasar cada frame de la fuente por el pipeline, en orden y sin descartes
+
+    Con `salida` se escribe una línea JSON por frame (cajas y textos) para
+    comparar dos ejecuciones sobre la misma grabación.
+    """
+    tiempos = []
+    inicio = time.perf_counter()
+    f = open(salida, 'w', encoding='utf-8') if salida else None
+    try:
+        while max_frames is None or len(tiempos) < max_frames:
+            ret, frame = fuente.read()
+            if not ret:
+                break
+            instante = fuente.instante()
+
+            antes = time.perf_counter()
+            resultado = pipeline.analizar(frame, instante)
+            tiempos.append(time.perf_counter() - antes)
+
+            if f is not None:
+                f.write(json.dumps({
+                    'frame': fuente.indice,
+                    'instante': round(instante, 4),
+                    'rostros': [[[int(v) for v in caja], texto] for caja, texto, _ in resultado['anotaciones']],
+                }, ensure_ascii=False) + '\n')
+    finally:
+        if f is not None:
+            f.close()
+
+    duracion = max(time.perf_counter() - inicio, 1e-9)
+    frames = len(tiempos)
+    tiempos = np.array(tiempos) * 1000 if tiempos else np.zeros(1)
+    return {
+        'frames': frames,
+        'segundos': duracion,
+        'fps': frames / duracion,
+        'ms_medio': float(tiempos.mean()),
+        'ms_p50': float(np.percentile(tiempos, 50)),
+        'ms_p95': float(np.percentile(tiempos, 95)),
+        'ms_max': float(tiempos.max()),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Medir el pipeline de detección sin interfaz sobre una grabación")
+    parser.add_argument('fuente', nargs='?', default='sintetico',
+                        help="Video, directorio de imágenes, índice de cámara o 'sintetico'")
+    parser.add_argument('--velocidad', type=float, default=None,
+                        help="Reproducir a esta velocidad (1 = nativa); por defecto sin límite")
+    parser.add_argument('--detector', default='haar', choices=list(DETECTORES))
+    parser.add_argument('--ancho-deteccion', type=int, default=None, help="Ancho de la copia reducida sobre la que se detecta")
+    parser.add_argument('--factor-escala', type=float, default=None, help="Paso de la pirámide de las cascadas (p. ej. 1.1-1.3)")
+    parser.add_argument('--vecinos', type=int, default=None, help="Vecinos mínimos de las cascadas")
+    parser.add_argument('--tam-minimo', type=int, default=None, help="Tamaño mínimo de rostro en píxeles")
+    parser.add_argument('--fraccion-rostro', type=float, default=None,
+                        help="Rostro más chico esperado (fracción del alto) para el min_face_size de MTCNN")
+    parser.add_argument('--factor-piramide', type=float, default=None, help="Reducción entre niveles de MTCNN (p. ej. 0.6-0.8)")
+    parser.add_argument('--frames', type=int, default=None, help="Máximo de frames a procesar")
+    parser.add_argument('--salida', default=None, help="JSONL con los resultados de cada frame")
+    args = parser.parse_args()
+
+    from modules.camera_utils import abrir_fuente
+    from modules.face_recognition_ai import FaceRecognitionAI
+    from modules.emotion_analysis import EmotionAnalyzer
+
+    fuente = abrir_fuente(args.fuente, velocidad=args.velocidad)
+    face_system = FaceRecognitionAI()
+    emotion_analyzer = EmotionAnalyzer()
+    pipeline = None
+    try:
+        print(f"🎬 Fuente: {fuente.descripcion()} | detector: {args.detector}")
+        ajustes = {
+            'ancho_deteccion': args.ancho_deteccion,
+            'factor_escala': args.factor_escala,
+            'vecinos': args.vecinos,
+            'factor_piramide': args.factor_piramide,
+            'fraccion_rostro': args.fraccion_rostro,
+        }
+        if args.tam_minimo is not None:
+            ajustes['tam_minimo'] = args.tam_minimo if args.detector == 'mtcnn' else (args.tam_minimo, args.tam_minimo)
+        ajustes = {clave: valor for clave, valor in ajustes.items() if valor is not None}
+        pipeline = DetectionPipeline(face_system, emotion_analyzer, detector=args.detector, **ajustes)
+        resumen = medir(pipeline, fuente, args.frames, args.salida)
+    finally:
+        fuente.release()
+        if pipeline is not None:
+            pipeline.liberar()
+        face_system.liberar()
+        emotion_analyzer.liberar()
+
+    print(f"\n📊 {resumen['frames']} frames en {resumen['segundos']:.1f}s ({resumen['fps']:.1f} FPS)")
+    print(f"   por frame: media {resumen['ms_medio']:.1f} ms, p50 {resumen['ms_p50']:.1f} ms, "
+          f"p95 {resumen['ms_p95']:.1f} ms, máx {resumen['ms_max']:.1f} ms")
+    if args.salida:
+        print(f"📝 Resultados por frame: {args.salida}")
+
+
+if __name__ == '__main__':
+    main()
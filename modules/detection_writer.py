@@ -0,0 +1,109 @@
+import queue
+import threading
+import time
+
+
+def marca_utc(instante=None):
+    """Marca de tiempo con el mismo formato que CURRENT_TIMESTAMP de SQLite (UTC)"""
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(instante))
+
+
+class DetectionWriter:
+    """Escritor en segundo plano del historial de emociones
+
+    `guardar` solo encola y nunca bloquea al bucle de la cámara. Un hilo
+    vacía la cola y escribe con `executemany` en una sola transacción cada
+    `filas_por_lote` filas o cada `intervalo_ms` desde la primera fila
+    pendiente, lo que ocurra antes. Si la cola se llena, las filas nuevas
+    se descartan y se cuentan. Al detener se escribe todo lo pendiente.
+    """
+
+    def __init__(self, db, filas_por_lote=50, intervalo_ms=500, capacidad=5000):
+        self.db = db
+        self.filas_por_lote = filas_por_lote
+        self.intervalo = intervalo_ms / 1000.0
+        self.cola = queue.Queue(maxsize=capacidad)
+
+        self.encoladas = 0
+        self.escritas = 0
+        self.descartadas = 0
+        self.lotes = 0
+        self.errores = 0
+
+        self._detener = threading.Event()
+        self._hilo = None
+
+    def iniciar(self):
+        if self._hilo is not None and self._hilo.is_alive():
+            return
+        self._detener.clear()
+        self._hilo = threading.Thread(target=self._bucle, name="escritor-detecciones", daemon=True)
+        self._hilo.start()
+
+    def guardar(self, persona_id, emocion, confianza, instante=None):
+        """Encolar una detección; devuelve False si se descartó por cola llena"""
+        try:
+            self.cola.put_nowait((persona_id, emocion, float(confianza), marca_utc(instante)))
+            self.encoladas += 1
+            return True
+        except queue.Full:
+            self.descartadas += 1
+            return False
+
+    def profundidad(self):
+        return self.cola.qsize()
+
+    def estadisticas(self):
+        return {
+            'en_cola': self.profundidad(),
+            'encoladas': self.encoladas,
+            'escritas': self.escritas,
+            'descartadas': self.descartadas,
+            'lotes': self.lotes,
+            'errores': self.errores,
+        }
+
+    def _escribir(self, lote):
+        try:
+            self.db.guardar_detecciones_emociones(lote)
+            self.escritas += len(lote)
+            self.lotes += 1
+        except Exception as e:
+            self.errores += 1
+            print(f"❌ Error guardando {len(lote)} detecciones: {e}")
+
+    def _bucle(self):
+        lote = []
+        limite = None
+        while not self._detener.is_set():
+            espera = 0.1 if limite is None else min(0.1, max(limite - time.monotonic(), 0.0))
+            try:
+                lote.append(self.cola.get(timeout=espera))
+                if limite is None:
+                    limite = time.monotonic() + self.intervalo
+            except queue.Empty:
+                pass
+
+            if lote and (len(lote) >= self.filas_por_lote or time.monotonic() >= limite):
+                self._escribir(lote)
+                lote = []
+                limite = None
+
+        # Vaciar lo que quede antes de terminar
+        while True:
+            try:
+                lote.append(self.cola.get_nowait())
+            except queue.Empty:
+                break
+            if len(lote) >= self.filas_por_lote:
+                self._escribir(lote)
+                lote = []
+        if lote:
+            self._escribir(lote)
+
+    def detener(self, timeout=5.0):
+        """Detener el hilo escribiendo antes todas las filas pendientes"""
+        self._detener.set()
+        if self._hilo is not None:
+            self._hilo.join(timeout)
+            self._hilo = None
@@ -2,26 +2,48 @@ import cv2
 import numpy as np
 from keras.models import load_model
 import os
+from modules.model_registry import registro
+
+MODEL_PATH = "models/emotion_model.h5"
+
+def cargar_modelo_emociones(model_path=MODEL_PATH):
+    """Cargar el modelo Keras de emociones (None = modo simulado)"""
+    try:
+        if os.path.exists(model_path):
+            model = load_model(model_path)
+            print("✅ Modelo de emociones cargado correctamente")
+            return model
+        print("⚠️  No se encontró modelo de emociones, usando modo simulado")
+    except Exception as e:
+        print(f"❌ Error cargando modelo de emociones: {e}")
+    return None
+
+def calentar_modelo_emociones(model):
+    """Primera predicción (construcción del grafo) con un rostro vacío"""
+    if model is not None:
+        model.predict(np.zeros((1, 48, 48, 1), dtype='float32'), verbose=0)
+
+registro.registrar_fabrica('emociones', cargar_modelo_emociones, calentar_modelo_emociones)
 
 class EmotionAnalyzer:
     def __init__(self):
         self.model = None
         self.emotion_labels = ['Enojo', 'Desagrado', 'Miedo', 'Felicidad', 'Tristeza', 'Sorpresa', 'Neutral']
-        self.model_path = "models/emotion_model.h5"
+        self.model_path = MODEL_PATH
+        self.modelo_obtenido = False
         self.load_model()
     
     def load_model(self):
-        """Cargar modelo de emociones"""
-        try:
-            if os.path.exists(self.model_path):
-                self.model = load_model(self.model_path)
-                print("✅ Modelo de emociones cargado correctamente")
-            else:
-                print("⚠️  No se encontró modelo de emociones, usando modo simulado")
-                self.model = None
-        except Exception as e:
-            print(f"❌ Error cargando modelo de emociones: {e}")
-            self.model = None
+        """Obtener el modelo de emociones del registro compartido"""
+        if not self.modelo_obtenido:
+            self.model = registro.obtener('emociones')
+            self.modelo_obtenido = True
+    
+    def liberar(self):
+        """Devolver la referencia al modelo compartido"""
+        if self.modelo_obtenido:
+            registro.liberar('emociones')
+            self.modelo_obtenido = False
     
     def predecir_emocion(self, face_image):
         """Predecir emoción en imagen de rostro - MEJORADO"""
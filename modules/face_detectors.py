@@ -0,0 +1,254 @@
+import os
+import threading
+import cv2
+import numpy as np
+from modules.model_registry import registro
+
+# Instancias de cada hilo: un CascadeClassifier no se comparte entre
+# hilos, pero cada hilo crea el suyo una sola vez
+_por_hilo = threading.local()
+
+
+def _en_hilo(clave, fabrica):
+    """Objeto de este hilo para `clave`, creado con `fabrica` la primera vez"""
+    objetos = getattr(_por_hilo, 'objetos', None)
+    if objetos is None:
+        objetos = _por_hilo.objetos = {}
+    if clave not in objetos:
+        objetos[clave] = fabrica()
+    return objetos[clave]
+
+
+# Los ajustes de la pirámide son atributos del MTCNN compartido: se fijan
+# y se detecta bajo este lock para que dos hilos no mezclen los suyos
+_lock_mtcnn = threading.Lock()
+
+
+def calentar_mtcnn(mtcnn):
+    """Primera pasada de MTCNN con una imagen vacía"""
+    from PIL import Image
+    mtcnn.detect(Image.new('RGB', (160, 160)))
+
+
+def _crear_mtcnn():
+    from facenet_pytorch import MTCNN
+    return MTCNN(keep_all=True, device='cpu')
+
+
+# Un solo MTCNN por proceso, el mismo que precalienta ModelWarmup y que
+# usa el reconocimiento para recortar y alinear
+registro.registrar_fabrica('mtcnn', _crear_mtcnn, calentar_mtcnn)
+
+
+class CascadeDetector:
+    """Detector de rostros con una cascada de OpenCV
+
+    Ajustes de velocidad/precisión:
+    - `ancho_deteccion`: se detecta sobre una copia de este ancho (None = tamaño original)
+    - `factor_escala`: paso de la pirámide; mayor = menos niveles y más rápido
+    - `vecinos`: detecciones vecinas requeridas; mayor = menos falsos positivos
+    - `tam_minimo` / `tam_maximo`: tamaño de rostro (en la imagen de detección)
+    - `ecualizar`: ecualizar el histograma antes de detectar (mala iluminación)
+    """
+
+    archivo = None
+
+    def __init__(self, ancho_deteccion=320, factor_escala=1.1, vecinos=4, tam_minimo=(30, 30),
+                 tam_maximo=None, ecualizar=False, ruta=None):
+        self.ancho_deteccion = ancho_deteccion
+        self.factor_escala = factor_escala
+        self.vecinos = vecinos
+        self.tam_minimo = tam_minimo
+        self.tam_maximo = tam_maximo
+        self.ecualizar = ecualizar
+        self.ruta = ruta or self.buscar_archivo()
+
+    def buscar_archivo(self):
+        return os.path.join(cv2.data.haarcascades, self.archivo)
+
+    def _clasificador(self):
+        def crear():
+            clasificador = cv2.CascadeClassifier(self.ruta)
+            if clasificador.empty():
+                raise Exception(f"No se pudo cargar la cascada: {self.ruta}")
+            return clasificador
+        return _en_hilo(('cascada', self.ruta), crear)
+
+    def liberar(self):
+        # Las cascadas son de cada hilo: no hay referencias compartidas que devolver
+        pass
+
+    def detectar(self, frame):
+        """Cajas (x, y, w, h) en coordenadas de `frame` (BGR o gris)"""
+        gris = frame if frame.ndim == 2 else cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+        escala = 1.0
+        if self.ancho_deteccion and gris.shape[1] > self.ancho_deteccion:
+            escala = gris.shape[1] / self.ancho_deteccion
+            alto = int(round(gris.shape[0] / escala))
+            gris = cv2.resize(gris, (self.ancho_deteccion, alto), interpolation=cv2.INTER_AREA)
+        if self.ecualizar:
+            gris = cv2.equalizeHist(gris)
+
+        opciones = {}
+        if self.tam_minimo:
+            opciones['minSize'] = tuple(self.tam_minimo)
+        if self.tam_maximo:
+            opciones['maxSize'] = tuple(self.tam_maximo)
+        rostros = self._clasificador().detectMultiScale(gris, self.factor_escala, self.vecinos, **opciones)
+
+        return [
+            (int(x * escala), int(y * escala), int(w * escala), int(h * escala))
+            for (x, y, w, h) in rostros
+        ]
+
+
+class HaarDetector(CascadeDetector):
+    """Cascada Haar frontal: la más precisa de las cascadas de OpenCV"""
+
+    archivo = 'haarcascade_frontalface_default.xml'
+
+
+class LBPDetector(CascadeDetector):
+    """Cascada LBP frontal: varias veces más rápida que Haar, algo menos precisa
+
+    Los paquetes pip de OpenCV no siempre incluyen las cascadas LBP; se
+    busca junto a las Haar y en `models/`, o se indica con `ruta`.
+    """
+
+    archivo = 'lbpcascade_frontalface_improved.xml'
+
+    def buscar_archivo(self):
+        candidatas = [
+            os.path.join(cv2.data.haarcascades, self.archivo),
+            os.path.join(os.path.dirname(os.path.normpath(cv2.data.haarcascades)), 'lbpcascades', self.archivo),
+            os.path.join('models', self.archivo),
+        ]
+        for ruta in candidatas:
+            if os.path.exists(ruta):
+                return ruta
+        raise Exception(f"No se encontró {self.archivo}; cópielo en models/ o indique la ruta")
+
+
+class MTCNNDetector:
+    """Detector MTCNN (más lento que las cascadas y mucho más robusto)
+
+    El coste de la pirámide de MTCNN crece con los píxeles de la imagen y
+    con lo chico que sea el rostro buscado, así que se detecta sobre una
+    copia de `ancho_deteccion` px y las cajas se devuelven escaladas a la
+    imagen original (los recortes para FaceNet se toman de ella, a
+    resolución completa).
+
+    Ajustes de velocidad/precisión:
+    - `ancho_deteccion`: ancho de la copia reducida (None = tamaño original)
+    - `fraccion_rostro`: rostro más chico esperado, como fracción del alto
+      de la imagen; de ahí sale `min_face_size` en cada imagen
+    - `tam_minimo`: `min_face_size` fijo en píxeles de la copia (anula lo anterior)
+    - `factor_piramide`: reducción entre niveles; menor = menos niveles y más rápido
+    - `umbrales`: umbrales de las tres redes
+    - `prob_minima`: probabilidad mínima para aceptar un rostro
+
+    Usa el MTCNN del registro de modelos: en cada detección le fija estos
+    ajustes, así que las detecciones de distintos hilos se turnan.
+    """
+
+    def __init__(self, prob_minima=0.9, ancho_deteccion=640, fraccion_rostro=0.08, tam_minimo=None,
+                 factor_piramide=0.709, umbrales=(0.6, 0.7, 0.7)):
+        self.prob_minima = prob_minima
+        self.ancho_deteccion = ancho_deteccion
+        self.fraccion_rostro = fraccion_rostro
+        self.tam_minimo = tam_minimo
+        self.factor_piramide = factor_piramide
+        self.umbrales = tuple(umbrales)
+        self._mtcnn = None
+        self._lock = threading.Lock()
+
+    def _modelo(self):
+        """MTCNN compartido (se toma una referencia del registro la primera vez)"""
+        with self._lock:
+            if self._mtcnn is None:
+                self._mtcnn = registro.obtener('mtcnn')
+            return self._mtcnn
+
+    def liberar(self):
+        """Devolver la referencia al MTCNN compartido"""
+        with self._lock:
+            if self._mtcnn is not None:
+                registro.liberar('mtcnn')
+                self._mtcnn = None
+
+    def tam_minimo_para(self, alto_deteccion):
+        """`min_face_size` para una imagen de detección de este alto"""
+        if self.tam_minimo:
+            return int(self.tam_minimo)
+        # 12 px es la ventana de P-Net: por debajo no se gana nada
+        return max(12, int(self.fraccion_rostro * alto_deteccion))
+
+    def detectar_rgb(self, imagen_rgb):
+        """Cajas (x1, y1, x2, y2) en coordenadas de `imagen_rgb` y sus probabilidades"""
+        from PIL import Image
+
+        escala = 1.0
+        reducida = imagen_rgb
+        if self.ancho_deteccion and imagen_rgb.shape[1] > self.ancho_deteccion:
+            escala = imagen_rgb.shape[1] / self.ancho_deteccion
+            alto = int(round(imagen_rgb.shape[0] / escala))
+            reducida = cv2.resize(imagen_rgb, (self.ancho_deteccion, alto), interpolation=cv2.INTER_AREA)
+
+        modelo = self._modelo()
+        ajustes = {
+            'min_face_size': self.tam_minimo_para(reducida.shape[0]),
+            'factor': self.factor_piramide,
+            'thresholds': list(self.umbrales),
+        }
+        imagen_pil = Image.fromarray(reducida)
+        with _lock_mtcnn:
+            # detect() lee estos atributos; al terminar se restauran los del registro
+            anteriores = {clave: getattr(modelo, clave) for clave in ajustes}
+            try:
+                for clave, valor in ajustes.items():
+                    setattr(modelo, clave, valor)
+                boxes, probs = modelo.detect(imagen_pil)
+            finally:
+                for clave, valor in anteriores.items():
+                    setattr(modelo, clave, valor)
+        if boxes is None:
+            return np.zeros((0, 4), dtype=np.float32), np.zeros(0, dtype=np.float32)
+
+        seleccion = probs >= self.prob_minima
+        boxes, probs = boxes[seleccion] * escala, probs[seleccion]
+
+        # MTCNN devuelve cajas que pueden salirse de la imagen: recortarlas
+        # a ella y descartar las que quedan sin área
+        alto, ancho = imagen_rgb.shape[:2]
+        boxes[:, [0, 2]] = np.clip(boxes[:, [0, 2]], 0, ancho)
+        boxes[:, [1, 3]] = np.clip(boxes[:, [1, 3]], 0, alto)
+        validas = (boxes[:, 2] > boxes[:, 0]) & (boxes[:, 3] > boxes[:, 1])
+        return boxes[validas], probs[validas]
+
+    def detectar_con_probabilidad(self, frame):
+        """Cajas (x1, y1, x2, y2) dentro de `frame` (BGR) y sus probabilidades"""
+        return self.detectar_rgb(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+
+    def detectar(self, frame):
+        """Cajas (x, y, w, h) dentro de `frame`, listas para recortar con slicing"""
+        boxes, _ = self.detectar_con_probabilidad(frame)
+        cajas = [(int(x1), int(y1), int(x2 - x1), int(y2 - y1)) for x1, y1, x2, y2 in boxes]
+        return [caja for caja in cajas if caja[2] > 0 and caja[3] > 0]
+
+
+DETECTORES = {
+    'haar': HaarDetector,
+    'lbp': LBPDetector,
+    'mtcnn': MTCNNDetector,
+}
+
+
+def crear_detector(nombre, **ajustes):
+    """Detector por nombre ('haar', 'lbp' o 'mtcnn') con sus ajustes"""
+    if nombre not in DETECTORES:
+        raise ValueError(f"Detector desconocido: {nombre} (opciones: {', '.join(DETECTORES)})")
+    try:
+        return DETECTORES[nombre](**ajustes)
+    except TypeError as e:
+        raise ValueError(f"Ajuste no válido para el detector {nombre}: {e}")
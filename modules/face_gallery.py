@@ -0,0 +1,286 @@
+import threading
+import numpy as np
+from modules.face_index import FlatIndex
+from modules.quantization import cuantizar, decuantizar, similitudes as similitudes_cuantizadas
+
+
+class FaceGallery:
+    """Galería de rostros conocidos en una matriz contigua pre-normalizada
+
+    `precision` elige la representación en memoria: 'float32', 'float16'
+    o 'int8' con una escala por fila (2x y 4x menos memoria). Una persona
+    puede tener varias plantillas en filas consecutivas; las búsquedas
+    puntúan cada identidad con la mejor de sus plantillas.
+    """
+
+    def __init__(self, dimension=None, indice=None, precision='float32'):
+        self.dimension = dimension
+        self.indice = indice if indice is not None else FlatIndex()
+        self.precision = precision
+        # La búsqueda corre en el hilo de inferencia mientras la interfaz
+        # añade o quita personas: todas las operaciones toman este lock
+        self.lock = threading.RLock()
+        self._reiniciar(np.zeros((0, dimension or 0), dtype=np.float32), [], [], [])
+
+    def __len__(self):
+        return self._n
+
+    # Los datos viven en búferes con capacidad libre al final; estas vistas
+    # exponen solo las filas ocupadas
+    @property
+    def matriz(self):
+        return self._matriz[:self._n]
+
+    @property
+    def escalas(self):
+        return None if self._escalas is None else self._escalas[:self._n]
+
+    @property
+    def ids(self):
+        return self._ids[:self._n]
+
+    @property
+    def nombres(self):
+        return self._nombres[:self._n]
+
+    @property
+    def claves(self):
+        return self._claves[:self._n]
+
+    def _reiniciar(self, normalizadas, ids, nombres, claves):
+        self._matriz, self._escalas = cuantizar(normalizadas, self.precision)
+        self._ids = np.array(ids, dtype=np.int64)
+        self._nombres = np.array(nombres, dtype=object)
+        self._claves = np.array(claves, dtype=np.int64)
+        self._n = len(self._ids)
+
+    def _reservar(self, total):
+        """Duplicar la capacidad de los búferes cuando se llenan (coste amortizado O(1))"""
+        capacidad = len(self._ids)
+        if total <= capacidad:
+            return
+        capacidad = max(total, 2 * capacidad, 16)
+
+        def crecer(buffer, forma):
+            nuevo = np.zeros(forma, dtype=buffer.dtype)
+            nuevo[:self._n] = buffer[:self._n]
+            return nuevo
+
+        self._matriz = crecer(self._matriz, (capacidad, self._matriz.shape[1]))
+        if self._escalas is not None:
+            self._escalas = crecer(self._escalas, capacidad)
+        self._ids = crecer(self._ids, capacidad)
+        self._nombres = crecer(self._nombres, capacidad)
+        self._claves = crecer(self._claves, capacidad)
+
+    @staticmethod
+    def normalizar(vectores):
+        """Normalizar filas a norma 1 en float32 contiguo"""
+        matriz = np.ascontiguousarray(np.atleast_2d(vectores), dtype=np.float32)
+        normas = np.linalg.norm(matriz, axis=1, keepdims=True)
+        normas[normas == 0] = 1.0
+        return matriz / normas
+
+    def cargar(self, ids, nombres, embeddings, claves=None, ya_normalizadas=False):
+        """Reemplazar el contenido de la galería de una sola vez
+
+        `claves` identifica cada embedding (id de la tabla embeddings) para
+        que el índice pueda reutilizar su estado persistido. Una matriz 2D
+        (por ejemplo un memmap) se carga de una vez, sin recorrer filas; con
+        `ya_normalizadas` y precisión float32 se usa tal cual, sin copiarla,
+        y sus filas se leen del disco a medida que se consultan.
+        """
+        if claves is None:
+            claves = [-1] * len(ids)
+        if isinstance(embeddings, np.ndarray) and embeddings.ndim == 2 and \
+                self.dimension in (None, embeddings.shape[1]):
+            normalizadas = embeddings if ya_normalizadas else self.normalizar(embeddings)
+            with self.lock:
+                self.dimension = embeddings.shape[1]
+                self._reiniciar(normalizadas, ids, nombres, claves)
+                self.indice.sincronizar(normalizadas, self.claves)
+            return
+
+        embeddings = [np.asarray(e, dtype=np.float32).ravel() for e in embeddings]
+        dimension = self.dimension
+        if dimension is None and embeddings:
+            # Sin dimensión fija manda la primera fila; quien mezcle modelos
+            # debe fijar `dimension` o filtrar las filas antes de cargarlas
+            dimension = len(embeddings[0])
+
+        filas = []
+        ids_validos = []
+        nombres_validos = []
+        claves_validas = []
+        for persona_id, nombre, embedding, clave in zip(ids, nombres, embeddings, claves):
+            if len(embedding) != dimension:
+                print(f"⚠️  Embedding de {nombre} ignorado: {len(embedding)} dimensiones (esperadas {dimension})")
+                continue
+            filas.append(embedding)
+            ids_validos.append(persona_id)
+            nombres_validos.append(nombre)
+            claves_validas.append(clave)
+
+        if filas:
+            normalizadas = self.normalizar(np.stack(filas))
+        else:
+            normalizadas = np.zeros((0, dimension or 0), dtype=np.float32)
+        with self.lock:
+            self.dimension = dimension
+            self._reiniciar(normalizadas, ids_validos, nombres_validos, claves_validas)
+            self.indice.sincronizar(normalizadas, self.claves)
+
+    def agregar(self, persona_id, nombre, embedding, clave=-1):
+        """Añadir un embedding a la galería sin reconstruirla"""
+        fila = self.normalizar(np.asarray(embedding, dtype=np.float32).ravel())
+        with self.lock:
+            if self.dimension is None or len(self) == 0:
+                self.dimension = self.dimension or fila.shape[1]
+                self._reiniciar(np.zeros((0, self.dimension), dtype=np.float32), [], [], [])
+            if fila.shape[1] != self.dimension:
+                print(f"⚠️  Embedding de {nombre} ignorado: {fila.shape[1]} dimensiones (esperadas {self.dimension})")
+                return False
+
+            codigos, escalas = cuantizar(fila, self.precision)
+            self._reservar(self._n + 1)
+            n = self._n
+            self._matriz[n] = codigos[0]
+            if escalas is not None:
+                self._escalas[n] = escalas[0]
+            self._ids[n] = persona_id
+            self._nombres[n] = nombre
+            self._claves[n] = clave
+            self._n += 1
+            self.indice.agregar(fila, [clave], self.vectores)
+            return True
+
+    def eliminar_persona(self, persona_id):
+        """Quitar todos los embeddings de una persona; devuelve cuántos se quitaron"""
+        with self.lock:
+            conservar = self.ids != persona_id
+            quedan = int(conservar.sum())
+            if quedan == self._n:
+                return 0
+
+            # Compactar dentro de los mismos búferes (copiando antes un memmap de solo lectura)
+            if not self._matriz.flags.writeable:
+                self._matriz = np.array(self._matriz)
+            self._matriz[:quedan] = self.matriz[conservar]
+            if self._escalas is not None:
+                self._escalas[:quedan] = self.escalas[conservar]
+            self._ids[:quedan] = self.ids[conservar]
+            self._nombres[:quedan] = self.nombres[conservar]
+            self._claves[:quedan] = self.claves[conservar]
+            eliminados = self._n - quedan
+            self._n = quedan
+            self.indice.compactar(conservar)
+            return eliminados
+
+    def ultima_clave(self):
+        """Mayor id de embedding cargado (-1 si no hay); marca desde dónde sincronizar"""
+        with self.lock:
+            return int(self.claves.max()) if len(self) else -1
+
+    def vectores(self, filas=None):
+        """Filas de la galería en float32 (decuantizadas si hace falta)"""
+        with self.lock:
+            if filas is None:
+                return decuantizar(self.matriz, self.escalas)
+            return decuantizar(self.matriz[filas], None if self.escalas is None else self.escalas[filas])
+
+    def _puntuar(self, consultas, filas=None):
+        if filas is None:
+            return similitudes_cuantizadas(self.matriz, self.escalas, consultas)
+        escalas = None if self.escalas is None else self.escalas[filas]
+        return similitudes_cuantizadas(self.matriz[filas], escalas, consultas)
+
+    def _consulta(self, embedding):
+        consulta = self.normalizar(np.asarray(embedding, dtype=np.float32).ravel())[0]
+        if len(self) == 0 or consulta.shape[0] != self.dimension:
+            return None
+        return consulta
+
+    def _por_persona(self, filas, puntajes):
+        """Máximo por identidad sobre tramos consecutivos de filas (segment-max)
+
+        `puntajes` tiene las filas en el último eje. Devuelve (filas de
+        inicio de cada tramo, puntajes reducidos).
+        """
+        ids = self.ids[filas]
+        inicios = np.flatnonzero(np.r_[True, ids[1:] != ids[:-1]])
+        if len(inicios) == len(ids):
+            return filas, puntajes
+        return filas[inicios], np.maximum.reduceat(puntajes, inicios, axis=-1)
+
+    @staticmethod
+    def _mejores(puntajes, k):
+        k = min(k, puntajes.shape[-1])
+        if k < puntajes.shape[-1]:
+            mejores = np.argpartition(-puntajes, k - 1, axis=-1)[..., :k]
+        else:
+            mejores = np.broadcast_to(np.arange(puntajes.shape[-1]), puntajes.shape[:-1] + (k,))
+        orden = np.argsort(-np.take_along_axis(puntajes, mejores, axis=-1), axis=-1)
+        return np.take_along_axis(mejores, orden, axis=-1)
+
+    def _resultados(self, filas, puntajes, mejores, k):
+        resultados = []
+        vistos = set()
+        for i in mejores:
+            persona_id = int(self.ids[filas[i]])
+            # Una persona con plantillas no consecutivas aparece en varios tramos
+            if persona_id in vistos:
+                continue
+            vistos.add(persona_id)
+            resultados.append((persona_id, self.nombres[filas[i]], float(puntajes[i])))
+        return resultados[:k]
+
+    def similitudes(self, embedding):
+        """Similitud coseno del embedding contra toda la galería en un solo producto"""
+        with self.lock:
+            consulta = self._consulta(embedding)
+            if consulta is None:
+                return np.zeros(0, dtype=np.float32)
+            return self._puntuar(consulta)
+
+    def buscar(self, embedding, k=1):
+        """Devolver las k mejores identidades como (persona_id, nombre, similitud)"""
+        with self.lock:
+            consulta = self._consulta(embedding)
+            if consulta is None:
+                return []
+
+            # El índice acota las filas a puntuar (None = búsqueda exacta)
+            filas = self.indice.candidatos(consulta)
+            if filas is None:
+                filas = np.arange(len(self))
+                puntajes = self._puntuar(consulta)
+            else:
+                # Ordenadas, las plantillas de cada persona quedan consecutivas
+                filas = np.sort(filas)
+                puntajes = self._puntuar(consulta, filas)
+            if puntajes.size == 0:
+                return []
+
+            filas, puntajes = self._por_persona(filas, puntajes)
+            # Margen por si una persona aparece en más de un tramo
+            mejores = self._mejores(puntajes, k + 2)
+            return self._resultados(filas, puntajes, mejores, k)
+
+    def buscar_lote(self, embeddings, k=1):
+        """Buscar varias consultas a la vez; devuelve una lista de coincidencias por consulta"""
+        with self.lock:
+            consultas = self.normalizar(np.asarray(embeddings, dtype=np.float32).reshape(len(embeddings), -1))
+            if len(self) == 0 or consultas.shape[1] != self.dimension:
+                return [[] for _ in range(len(consultas))]
+
+            if not self.indice.entrenado():
+                # Búsqueda exacta: un único producto matriz-matriz y un segment-max para todo el lote
+                filas, todos = self._por_persona(np.arange(len(self)), self._puntuar(consultas).T)
+                mejores = self._mejores(todos, k + 2)
+                return [
+                    self._resultados(filas, fila_puntajes, fila_mejores, k)
+                    for fila_puntajes, fila_mejores in zip(todos, mejores)
+                ]
+
+            # Con índice aproximado cada consulta tiene sus propios candidatos
+            return [self.buscar(consulta, k) for consulta in consultas]
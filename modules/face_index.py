@@ -0,0 +1,323 @@
+import argparse
+import os
+import time
+import numpy as np
+
+
+class FlatIndex:
+    """Índice exacto: todos los rostros de la galería son candidatos"""
+
+    tipo = 'flat'
+
+    def __init__(self):
+        self.modificado = False
+
+    def entrenado(self):
+        return False
+
+    def sincronizar(self, matriz, claves):
+        pass
+
+    def agregar(self, nuevas, claves, obtener_matriz):
+        pass
+
+    def compactar(self, conservar):
+        pass
+
+    def candidatos(self, consulta):
+        """None indica búsqueda exhaustiva"""
+        return None
+
+    def guardar(self, ruta):
+        self.modificado = False
+
+
+class IVFIndex:
+    """Índice aproximado IVF (listas invertidas) sobre embeddings normalizados
+
+    Los centroides se entrenan con k-means esférico y cada rostro queda
+    asignado a su centroide más cercano. En la búsqueda solo se puntúan
+    los rostros de las `n_sondeos` listas más parecidas a la consulta.
+    Con menos de `min_filas` rostros el índice no se entrena y la
+    búsqueda sigue siendo exacta.
+    """
+
+    tipo = 'ivf'
+
+    def __init__(self, n_listas=None, n_sondeos=8, min_filas=20000, factor_reentrenamiento=4):
+        self.n_listas = n_listas
+        self.n_sondeos = n_sondeos
+        self.min_filas = min_filas
+        self.factor_reentrenamiento = factor_reentrenamiento
+
+        self.centroides = None
+        self.filas_entrenamiento = 0
+        self.claves = np.zeros(0, dtype=np.int64)
+        self.asignaciones = np.zeros(0, dtype=np.int32)
+        self._listas = None
+        self.modificado = False
+
+    def entrenado(self):
+        return self.centroides is not None
+
+    def entrenar(self, matriz, iteraciones=10, semilla=0):
+        """K-means esférico sobre una muestra de la galería"""
+        rng = np.random.default_rng(semilla)
+        n_listas = self.n_listas or max(1, int(4 * np.sqrt(len(matriz))))
+        n_listas = min(n_listas, len(matriz))
+
+        tam_muestra = min(len(matriz), max(n_listas * 64, 10000))
+        muestra = matriz[rng.choice(len(matriz), tam_muestra, replace=False)]
+        centroides = muestra[rng.choice(tam_muestra, n_listas, replace=False)].copy()
+
+        for _ in range(iteraciones):
+            asignaciones = self._asignar(muestra, centroides)
+            orden = np.argsort(asignaciones, kind='stable')
+            conteos = np.bincount(asignaciones, minlength=n_listas)
+            no_vacias = np.flatnonzero(conteos)
+            inicios = np.concatenate([[0], np.cumsum(conteos)[:-1]])[no_vacias]
+
+            sumas = np.add.reduceat(muestra[orden], inicios, axis=0)
+            centroides[no_vacias] = sumas
+
+            # Reubicar listas vacías en rostros aleatorios de la muestra
+            vacias = np.flatnonzero(conteos == 0)
+            if len(vacias):
+                centroides[vacias] = muestra[rng.choice(tam_muestra, len(vacias), replace=False)]
+
+            normas = np.linalg.norm(centroides, axis=1, keepdims=True)
+            normas[normas == 0] = 1.0
+            centroides = (centroides / normas).astype(np.float32)
+
+        self.centroides = np.ascontiguousarray(centroides, dtype=np.float32)
+        self.filas_entrenamiento = len(matriz)
+        self.asignaciones = self._asignar(matriz, self.centroides)
+        self._listas = None
+        self.modificado = True
+        print(f"🗂️  Índice IVF entrenado: {n_listas} listas sobre {len(matriz)} rostros")
+
+    @staticmethod
+    def _asignar(matriz, centroides, bloque=16384):
+        """Centroide más cercano de cada fila, por bloques para acotar memoria"""
+        asignaciones = np.empty(len(matriz), dtype=np.int32)
+        for inicio in range(0, len(matriz), bloque):
+            puntajes = matriz[inicio:inicio + bloque] @ centroides.T
+            asignaciones[inicio:inicio + bloque] = np.argmax(puntajes, axis=1)
+        return asignaciones
+
+    def _necesita_entrenamiento(self, total):
+        if total < self.min_filas:
+            return False
+        if self.centroides is None:
+            return True
+        return total > self.factor_reentrenamiento * self.filas_entrenamiento
+
+    def sincronizar(self, matriz, claves):
+        """Alinear el índice con la galería reutilizando las asignaciones conocidas"""
+        claves = np.asarray(claves, dtype=np.int64)
+
+        if self._necesita_entrenamiento(len(matriz)):
+            self.claves = claves
+            self.entrenar(matriz)
+            return
+
+        if self.centroides is None or len(matriz) < self.min_filas:
+            # Galería pequeña: búsqueda exacta, no hay nada que mantener
+            if self.centroides is not None:
+                self.modificado = True
+            self.centroides = None
+            self.claves = claves
+            self.asignaciones = np.zeros(len(claves), dtype=np.int32)
+            self._listas = None
+            return
+
+        asignaciones = np.full(len(claves), -1, dtype=np.int32)
+        if len(self.claves):
+            orden = np.argsort(self.claves)
+            claves_previas = self.claves[orden]
+            posiciones = np.clip(np.searchsorted(claves_previas, claves), 0, len(orden) - 1)
+            encontrados = (claves_previas[posiciones] == claves) & (claves >= 0)
+            asignaciones[encontrados] = self.asignaciones[orden[posiciones[encontrados]]]
+
+        nuevos = asignaciones < 0
+        if nuevos.any():
+            asignaciones[nuevos] = self._asignar(matriz[nuevos], self.centroides)
+        if nuevos.any() or len(claves) != len(self.claves):
+            self.modificado = True
+
+        self.claves = claves
+        self.asignaciones = asignaciones
+        self._listas = None
+
+    def agregar(self, nuevas, claves, obtener_matriz):
+        """Asignar las filas añadidas al final de la galería
+
+        `obtener_matriz` devuelve la galería completa en float32 y solo se
+        invoca si hay que (re)entrenar los centroides.
+        """
+        claves = np.asarray(claves, dtype=np.int64)
+        self.claves = np.concatenate([self.claves, claves])
+
+        if self._necesita_entrenamiento(len(self.claves)):
+            self.entrenar(obtener_matriz())
+            return
+        if self.centroides is None:
+            self.asignaciones = np.zeros(len(self.claves), dtype=np.int32)
+            return
+
+        self.asignaciones = np.concatenate([self.asignaciones, self._asignar(nuevas, self.centroides)])
+        self._listas = None
+        self.modificado = True
+
+    def compactar(self, conservar):
+        """Quitar las filas eliminadas de la galería (máscara booleana)"""
+        self.claves = self.claves[conservar]
+        self.asignaciones = self.asignaciones[conservar]
+        self._listas = None
+        self.modificado = True
+
+    def _construir_listas(self):
+        orden = np.argsort(self.asignaciones, kind='stable')
+        limites = np.concatenate([[0], np.cumsum(np.bincount(self.asignaciones, minlength=len(self.centroides)))])
+        self._listas = (orden, limites)
+
+    def candidatos(self, consulta):
+        """Filas de la galería en las listas más cercanas a la consulta"""
+        if self.centroides is None:
+            return None
+        if self._listas is None:
+            self._construir_listas()
+
+        orden, limites = self._listas
+        puntajes = self.centroides @ consulta
+        n_sondeos = min(self.n_sondeos, len(puntajes))
+        listas = np.argpartition(-puntajes, n_sondeos - 1)[:n_sondeos]
+        return np.concatenate([orden[limites[l]:limites[l + 1]] for l in listas])
+
+    def guardar(self, ruta):
+        """Persistir centroides y asignaciones (escritura atómica)"""
+        temporal = ruta + '.tmp'
+        with open(temporal, 'wb') as f:
+            np.savez(
+                f,
+                tipo=self.tipo,
+                centroides=self.centroides if self.centroides is not None else np.zeros((0, 0), np.float32),
+                filas_entrenamiento=self.filas_entrenamiento,
+                claves=self.claves,
+                asignaciones=self.asignaciones,
+            )
+        os.replace(temporal, ruta)
+        self.modificado = False
+
+    def cargar_estado(self, datos):
+        centroides = datos['centroides']
+        self.centroides = centroides if centroides.size else None
+        self.filas_entrenamiento = int(datos['filas_entrenamiento'])
+        self.claves = datos['claves'].astype(np.int64)
+        self.asignaciones = datos['asignaciones'].astype(np.int32)
+        self._listas = None
+
+
+INDICES = {
+    FlatIndex.tipo: FlatIndex,
+    IVFIndex.tipo: IVFIndex,
+}
+
+
+def crear_indice(tipo='flat', **opciones):
+    """Crear un índice por nombre ('flat' o 'ivf')"""
+    if tipo not in INDICES:
+        raise ValueError(f"Tipo de índice desconocido: {tipo}")
+    return INDICES[tipo](**opciones)
+
+
+def cargar_indice(ruta, tipo='flat', **opciones):
+    """Cargar un índice persistido o crear uno vacío si no existe o es de otro tipo"""
+    indice = crear_indice(tipo, **opciones)
+    if not hasattr(indice, 'cargar_estado') or not os.path.exists(ruta):
+        return indice
+
+    try:
+        with np.load(ruta, allow_pickle=False) as datos:
+            if str(datos['tipo']) == tipo:
+                indice.cargar_estado(datos)
+                print(f"🗂️  Índice {tipo} cargado: {len(indice.claves)} rostros")
+    except Exception as e:
+        print(f"⚠️  No se pudo cargar el índice ({e}), se reconstruirá")
+    return indice
+
+
+def evaluar_indice(matriz, indice, consultas, k=1):
+    """Comparar un índice contra la búsqueda exacta: recall@k y latencia"""
+    aciertos = 0
+    candidatos_totales = 0
+    tiempo_exacto = 0.0
+    tiempo_aprox = 0.0
+
+    for consulta in consultas:
+        inicio = time.perf_counter()
+        exactos = np.argpartition(-(matriz @ consulta), k - 1)[:k]
+        tiempo_exacto += time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        candidatos = indice.candidatos(consulta)
+        if candidatos is None:
+            candidatos = np.arange(len(matriz))
+        puntajes = matriz[candidatos] @ consulta
+        kk = min(k, len(candidatos))
+        aprox = candidatos[np.argpartition(-puntajes, kk - 1)[:kk]] if kk else candidatos
+        tiempo_aprox += time.perf_counter() - inicio
+
+        aciertos += len(np.intersect1d(exactos, aprox))
+        candidatos_totales += len(candidatos)
+
+    n = max(len(consultas), 1)
+    return {
+        'recall': aciertos / (n * k),
+        'latencia_exacta_ms': 1000 * tiempo_exacto / n,
+        'latencia_aprox_ms': 1000 * tiempo_aprox / n,
+        'candidatos_medios': candidatos_totales / n,
+    }
+
+
+def _galeria_sintetica(n_rostros, dimension, rng):
+    """Identidades aleatorias normalizadas"""
+    matriz = rng.standard_normal((n_rostros, dimension)).astype(np.float32)
+    return matriz / np.linalg.norm(matriz, axis=1, keepdims=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall y latencia del índice IVF frente a la búsqueda exacta")
+    parser.add_argument('--rostros', type=int, default=50000, help="Tamaño de la galería sintética")
+    parser.add_argument('--dimension', type=int, default=512)
+    parser.add_argument('--consultas', type=int, default=200)
+    parser.add_argument('--ruido', type=float, default=0.6, help="Ruido de las consultas respecto a su identidad")
+    parser.add_argument('--listas', type=int, default=None)
+    parser.add_argument('--sondeos', type=int, nargs='+', default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument('-k', type=int, default=1)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    matriz = _galeria_sintetica(args.rostros, args.dimension, rng)
+
+    # Consultas: nuevas "fotos" de personas registradas
+    elegidos = rng.choice(args.rostros, args.consultas, replace=False)
+    ruido = rng.standard_normal((args.consultas, args.dimension)).astype(np.float32)
+    consultas = matriz[elegidos] + args.ruido * ruido / np.sqrt(args.dimension)
+    consultas /= np.linalg.norm(consultas, axis=1, keepdims=True)
+
+    indice = IVFIndex(n_listas=args.listas, min_filas=0)
+    inicio = time.perf_counter()
+    indice.sincronizar(matriz, np.arange(len(matriz)))
+    print(f"⏱️  Entrenamiento: {time.perf_counter() - inicio:.2f}s")
+
+    print(f"{'sondeos':>8} {'recall':>8} {'exacta ms':>10} {'IVF ms':>8} {'candidatos':>11}")
+    for n_sondeos in args.sondeos:
+        indice.n_sondeos = n_sondeos
+        r = evaluar_indice(matriz, indice, consultas, k=args.k)
+        print(f"{n_sondeos:>8} {r['recall']:>8.3f} {r['latencia_exacta_ms']:>10.3f} "
+              f"{r['latencia_aprox_ms']:>8.3f} {r['candidatos_medios']:>11.0f}")
+
+
+if __name__ == '__main__':
+    main()
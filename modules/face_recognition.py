@@ -1,18 +1,33 @@
 import cv2
 import numpy as np
-import sqlite3
-import json
+import os
+import threading
 from modules.database import DatabaseManager
+from modules.gallery_snapshot import GallerySnapshot
+from modules.face_detectors import HaarDetector
+
+# Las características son el rostro en gris a 100x100
+DIMENSION = 100 * 100
 
 class FaceRecognitionSystem:
     def __init__(self):
         self.db = DatabaseManager()
-        # Usar el clasificador de rostros de OpenCV
-        self.face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+        # Usar el clasificador de rostros de OpenCV (una cascada por hilo)
+        self.detector = HaarDetector(ancho_deteccion=None, factor_escala=1.1, vecinos=5, tam_minimo=(30, 30))
         self.known_face_encodings = []
         self.known_face_names = []
         self.known_face_ids = []
+        self.known_face_claves = []
+        self.version_padron = None
+        # Copia binaria para arrancar sin leer SQLite; se reescribe unos
+        # segundos después de cada cambio del padrón
+        self.snapshot = GallerySnapshot(os.path.join(os.path.dirname(self.db.db_path), 'galeria_haar'))
+        self.version_snapshot = None
+        self.espera_snapshot = 2.0
+        self._temporizador_snapshot = None
+        self._lock = threading.Lock()
         self.cargar_rostros_conocidos()
+        self.db.suscribir(self.aplicar_cambio_padron)
     
     def extraer_caracteristicas(self, imagen_rostro):
         """Extraer características básicas del rostro usando OpenCV"""
@@ -31,9 +46,8 @@ class FaceRecognitionSystem:
     def extraer_embedding(self, imagen):
         """Extraer embedding facial usando OpenCV"""
         try:
-            gris = cv2.cvtColor(imagen, cv2.COLOR_BGR2GRAY)
             # Detectar rostros
-            rostros = self.face_cascade.detectMultiScale(gris, scaleFactor=1.1, minNeighbors=5, minSize=(30, 30))
+            rostros = self.detector.detectar(imagen)
             
             if len(rostros) > 0:
                 x, y, w, h = rostros[0]
@@ -58,32 +72,98 @@ class FaceRecognitionSystem:
             return 0.0
     
     def cargar_rostros_conocidos(self):
-        """Cargar todos los rostros conocidos de la base de datos"""
-        conn = sqlite3.connect(self.db.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT p.id, p.nombre, p.apellido, e.embedding 
-            FROM personas p 
-            JOIN embeddings e ON p.id = e.persona_id
-        ''')
-        
-        resultados = cursor.fetchall()
-        conn.close()
+        """Cargar todos los rostros conocidos (copia binaria o base de datos)"""
+        version = self.db.obtener_version_padron()
+        copia = self.snapshot.leer(version, DIMENSION)
+        self.version_padron = version
+        if copia is not None:
+            ids, nombres, claves, matriz = copia
+            # Las filas del memmap se leen del disco solo al compararlas
+            self.known_face_encodings = list(matriz)
+            self.known_face_names = nombres
+            self.known_face_ids = ids
+            self.known_face_claves = claves
+            self.version_snapshot = version
+            return
         
         self.known_face_encodings = []
         self.known_face_names = []
         self.known_face_ids = []
+        self.known_face_claves = []
+        
+        # Los embeddings de FaceNet no son comparables con estas características:
+        # se filtran en la consulta, sin decodificarlos
+        for persona_id, nombre, clave, embedding in self.db.obtener_embeddings(dimension=DIMENSION):
+            self.known_face_encodings.append(embedding)
+            self.known_face_names.append(nombre)
+            self.known_face_ids.append(persona_id)
+            self.known_face_claves.append(clave)
         
-        for resultado in resultados:
-            persona_id, nombre, apellido, embedding_json = resultado
-            try:
-                embedding = np.array(json.loads(embedding_json))
-                self.known_face_encodings.append(embedding)
-                self.known_face_names.append(f"{nombre} {apellido}")
-                self.known_face_ids.append(persona_id)
-            except Exception as e:
-                print(f"Error cargando rostro para {nombre}: {e}")
+        self.guardar_snapshot()
+    
+    def guardar_snapshot(self):
+        """Escribir la copia binaria para la versión actual del padrón"""
+        # La versión se toma antes que las filas: una copia con filas más
+        # nuevas que su versión se descarta al cargar, nunca al revés
+        version = self.version_padron
+        if version is None:
+            return
+        with self._lock:
+            ids = list(self.known_face_ids)
+            nombres = list(self.known_face_names)
+            claves = list(self.known_face_claves)
+            matriz = np.array(self.known_face_encodings, dtype=np.float32).reshape(-1, DIMENSION)
+        if self.snapshot.escribir(version, ids, nombres, claves, matriz):
+            self.version_snapshot = version
+    
+    def programar_snapshot(self):
+        """Guardar la copia binaria `espera_snapshot` segundos después del último cambio"""
+        with self._lock:
+            if self._temporizador_snapshot is not None:
+                self._temporizador_snapshot.cancel()
+            self._temporizador_snapshot = threading.Timer(self.espera_snapshot, self._guardar_snapshot_programado)
+            self._temporizador_snapshot.daemon = True
+            self._temporizador_snapshot.start()
+    
+    def _guardar_snapshot_programado(self):
+        try:
+            if self.version_snapshot != self.version_padron:
+                self.guardar_snapshot()
+        except Exception as e:
+            print(f"⚠️  No se pudo guardar la copia de la galería: {e}")
+    
+    def liberar(self):
+        """Dejar de recibir eventos y guardar la copia binaria si quedó atrasada"""
+        self.db.desuscribir(self.aplicar_cambio_padron)
+        with self._lock:
+            if self._temporizador_snapshot is not None:
+                self._temporizador_snapshot.cancel()
+                self._temporizador_snapshot = None
+        if self.version_snapshot != self.version_padron:
+            self.guardar_snapshot()
+    
+    def aplicar_cambio_padron(self, evento, datos):
+        """Aplicar un alta o baja notificada por la base de datos sin recargar todo"""
+        with self._lock:
+            if evento == 'alta':
+                for clave, embedding in datos['embeddings']:
+                    if len(embedding) != DIMENSION:
+                        continue
+                    self.known_face_encodings.append(embedding)
+                    self.known_face_names.append(datos['nombre'])
+                    self.known_face_ids.append(datos['persona_id'])
+                    self.known_face_claves.append(clave)
+            elif evento == 'baja':
+                conservar = [i for i, persona_id in enumerate(self.known_face_ids) if persona_id != datos['persona_id']]
+                self.known_face_encodings = [self.known_face_encodings[i] for i in conservar]
+                self.known_face_names = [self.known_face_names[i] for i in conservar]
+                self.known_face_ids = [self.known_face_ids[i] for i in conservar]
+                self.known_face_claves = [self.known_face_claves[i] for i in conservar]
+            
+            # Si la versión salta, hubo cambios de otro proceso: la copia queda sin reescribir
+            if self.version_padron is not None and datos['version'] == self.version_padron + 1:
+                self.version_padron = datos['version']
+        self.programar_snapshot()
     
     def reconocer_rostro(self, imagen):
         """Reconocer un rostro en una imagen"""
@@ -134,10 +214,7 @@ class FaceRecognitionSystem:
             # Registrar en base de datos
             success, mensaje = self.db.registrar_persona(nombre, apellido, email, embedding)
             
-            if success:
-                # Actualizar lista de rostros conocidos
-                self.cargar_rostros_conocidos()
-            
+            # La lista de rostros conocidos se actualiza con el evento de alta
             return success, mensaje
             
         except Exception as e:
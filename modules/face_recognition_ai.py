@@ -1,55 +1,133 @@
 import cv2
 import numpy as np
 import torch
-from facenet_pytorch import MTCNN, InceptionResnetV1
-import sqlite3
-import json
+from facenet_pytorch import InceptionResnetV1
 from PIL import Image
 import os
+import threading
 from modules.database import DatabaseManager
+from modules.face_gallery import FaceGallery
+from modules.face_detectors import HaarDetector, MTCNNDetector
+from modules.face_index import cargar_indice
+from modules.gallery_snapshot import GallerySnapshot
+from modules.model_registry import registro
+
+# Tamaño de los embeddings de FaceNet: las filas de otros modelos no se comparan
+DIMENSION = 512
+
+def calentar_facenet(resnet):
+    """Primera pasada de FaceNet con un lote ficticio"""
+    with torch.no_grad():
+        resnet(torch.zeros(1, 3, 160, 160))
+
+def detectar_y_alinear(mtcnn, imagen, detector=None):
+    """Detectar rostros en una imagen BGR y recortar las caras alineadas con una sola pasada de MTCNN
+    
+    Con `detector` (MTCNNDetector) se detecta sobre una copia reducida y
+    las cajas vuelven a la escala original; las caras siempre se recortan
+    de la imagen a resolución completa.
+    """
+    # Convertir OpenCV a PIL
+    imagen_rgb = cv2.cvtColor(imagen, cv2.COLOR_BGR2RGB)
+    imagen_pil = Image.fromarray(imagen_rgb)
+    
+    if detector is None:
+        boxes, probs = mtcnn.detect(imagen_pil)
+    else:
+        boxes, probs = detector.detectar_rgb(imagen_rgb)
+    if boxes is None or len(boxes) == 0:
+        return None, None, None
+    
+    # Reutilizar las cajas detectadas en lugar de volver a ejecutar la cascada
+    caras = mtcnn.extract(imagen_pil, boxes, None)
+    return boxes, probs, caras
+
+# Detector de respaldo del método tradicional (la cascada se carga una vez por hilo)
+detector_respaldo = HaarDetector(ancho_deteccion=None, factor_escala=1.1, vecinos=5, tam_minimo=(30, 30), ecualizar=True)
+
+# Los pesos se cargan una sola vez por proceso y se comparten entre ventanas
+# (la fábrica de 'mtcnn' la registra face_detectors)
+registro.registrar_fabrica('facenet', lambda: InceptionResnetV1(pretrained='vggface2').eval(), calentar_facenet)
 
 class FaceRecognitionAI:
-    def __init__(self):
+    def __init__(self, tipo_indice='ivf', precision='float32', ancho_deteccion=640, fraccion_rostro=0.08):
         self.db = DatabaseManager()
         
-        # Cargar modelo MTCNN para detección de rostros
-        self.mtcnn = MTCNN(keep_all=True, device='cpu')
+        # Modelo MTCNN para recortar y alinear rostros (compartido)
+        self.mtcnn = registro.obtener('mtcnn')
+        # Detección sobre una copia reducida, con min_face_size según el rostro
+        # esperado, con ese mismo MTCNN ya precalentado
+        self.detector = MTCNNDetector(prob_minima=0.0, ancho_deteccion=ancho_deteccion,
+                                      fraccion_rostro=fraccion_rostro)
         
-        # Cargar modelo FaceNet pre-entrenado para embeddings
-        self.resnet = InceptionResnetV1(pretrained='vggface2').eval()
+        # Modelo FaceNet pre-entrenado para embeddings (compartido)
+        self.resnet = registro.obtener('facenet')
+        self.modelos_liberados = False
         
-        self.known_face_encodings = []
-        self.known_face_names = []
-        self.known_face_ids = []
+        # Índice de búsqueda persistido junto a la base de datos
+        self.ruta_indice = os.path.join(os.path.dirname(self.db.db_path), 'face_index.npz')
+        self.galeria = FaceGallery(dimension=DIMENSION, indice=cargar_indice(self.ruta_indice, tipo_indice),
+                                   precision=precision)
+        self.version_padron = None
+        # Copia binaria de la galería para arrancar sin leer SQLite; se
+        # reescribe unos segundos después de cada cambio del padrón
+        self.snapshot = GallerySnapshot(os.path.join(os.path.dirname(self.db.db_path), 'galeria_ia'))
+        self.version_snapshot = None
+        self.espera_snapshot = 2.0
+        self._temporizador_snapshot = None
+        self._lock_snapshot = threading.Lock()
+        self._lock_guardado = threading.Lock()
         
         self.cargar_rostros_conocidos()
+        # Altas y bajas de cualquier ventana llegan como eventos, sin releer la tabla
+        self.db.suscribir(self.aplicar_cambio_padron)
         print("✅ IA de Reconocimiento Facial INICIALIZADA")
-        print(f"👥 Rostros conocidos cargados: {len(self.known_face_encodings)}")
+        print(f"👥 Rostros conocidos cargados: {len(self.galeria)}")
+    
+    def liberar(self):
+        """Devolver las referencias a los modelos compartidos"""
+        if not self.modelos_liberados:
+            self.db.desuscribir(self.aplicar_cambio_padron)
+            with self._lock_snapshot:
+                if self._temporizador_snapshot is not None:
+                    self._temporizador_snapshot.cancel()
+                    self._temporizador_snapshot = None
+            if self.version_snapshot != self.version_padron:
+                self.guardar_snapshot()
+            self.detector.liberar()
+            registro.liberar('mtcnn')
+            registro.liberar('facenet')
+            self.modelos_liberados = True
+    
+    @property
+    def known_face_encodings(self):
+        return list(self.galeria.vectores())
+    
+    @property
+    def known_face_names(self):
+        return list(self.galeria.nombres)
+    
+    @property
+    def known_face_ids(self):
+        return list(self.galeria.ids)
+    
+    def detectar_y_alinear(self, imagen):
+        """Detectar rostros y recortar las caras alineadas con una sola pasada de MTCNN"""
+        return detectar_y_alinear(self.mtcnn, imagen, self.detector)
     
     def extraer_embedding_ia(self, imagen):
         """Extraer embedding facial usando FaceNet"""
         try:
-            # Convertir OpenCV a PIL
-            imagen_rgb = cv2.cvtColor(imagen, cv2.COLOR_BGR2RGB)
-            imagen_pil = Image.fromarray(imagen_rgb)
+            boxes, _, caras = self.detectar_y_alinear(imagen)
             
-            # Detectar rostros usando MTCNN
-            boxes, _ = self.mtcnn.detect(imagen_pil)
-            
-            if boxes is not None and len(boxes) > 0:
+            if caras is not None:
                 # Tomar el primer rostro detectado
-                box = boxes[0]
-                x1, y1, x2, y2 = box.astype(int)
-                
-                # Extraer embedding usando FaceNet
-                cara = self.mtcnn(imagen_pil)
+                with torch.no_grad():
+                    embedding = self.resnet(caras[:1])
+                embedding = embedding.numpy().flatten()
                 
-                if cara is not None:
-                    embedding = self.resnet(cara.unsqueeze(0))
-                    embedding = embedding.detach().numpy().flatten()
-                    
-                    print(f"✅ Embedding IA extraído: {len(embedding)} dimensiones")
-                    return embedding
+                print(f"✅ Embedding IA extraído: {len(embedding)} dimensiones")
+                return embedding
             
             print("❌ No se detectaron rostros con IA")
             return None
@@ -59,15 +137,41 @@ class FaceRecognitionAI:
             # Fallback a método tradicional
             return self.extraer_embedding_tradicional(imagen)
     
+    def extraer_embeddings_ia(self, imagenes, prob_minima=0.9):
+        """Extraer un embedding por imagen con una sola pasada de FaceNet en lote
+        
+        De cada imagen se toma el rostro más probable. Devuelve (embeddings,
+        calidades) con la probabilidad de MTCNN como calidad, ordenados de
+        mejor a peor; las capturas por debajo de `prob_minima` se descartan
+        salvo que no quede ninguna.
+        """
+        caras = []
+        calidades = []
+        for imagen in imagenes:
+            _, probs, caras_imagen = self.detectar_y_alinear(imagen)
+            if caras_imagen is None:
+                continue
+            mejor = int(np.argmax(probs))
+            caras.append(caras_imagen[mejor])
+            calidades.append(float(probs[mejor]))
+        
+        if not caras:
+            return None, None
+        
+        orden = np.argsort(calidades)[::-1]
+        buenas = [i for i in orden if calidades[i] >= prob_minima] or [orden[0]]
+        
+        with torch.no_grad():
+            embeddings = self.resnet(torch.stack([caras[i] for i in buenas])).numpy()
+        
+        print(f"✅ {len(embeddings)} embeddings IA extraídos de {len(imagenes)} capturas")
+        return embeddings, [calidades[i] for i in buenas]
+    
     def extraer_embedding_tradicional(self, imagen):
         """Método tradicional como fallback"""
         try:
             # Detector OpenCV como respaldo
-            face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-            gray = cv2.cvtColor(imagen, cv2.COLOR_BGR2GRAY)
-            gray = cv2.equalizeHist(gray)
-            
-            rostros = face_cascade.detectMultiScale(gray, 1.1, 5, minSize=(30, 30))
+            rostros = detector_respaldo.detectar(imagen)
             
             if len(rostros) > 0:
                 x, y, w, h = rostros[0]
@@ -105,38 +209,153 @@ class FaceRecognitionAI:
             print(f"❌ Error comparando: {e}")
             return 0.0
     def cargar_rostros_conocidos(self):
-        """Cargar rostros conocidos de la base de datos"""
+        """Cargar rostros conocidos desde la copia binaria o, si está obsoleta, de la base de datos"""
         try:
-            conn = sqlite3.connect(self.db.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                SELECT p.id, p.nombre, p.apellido, e.embedding 
-                FROM personas p 
-                JOIN embeddings e ON p.id = e.persona_id
-            ''')
-            
-            resultados = cursor.fetchall()
-            conn.close()
-            
-            self.known_face_encodings = []
-            self.known_face_names = []
-            self.known_face_ids = []
-            
-            for resultado in resultados:
-                persona_id, nombre, apellido, embedding_json = resultado
-                try:
-                    embedding = np.array(json.loads(embedding_json))
-                    self.known_face_encodings.append(embedding)
-                    self.known_face_names.append(f"{nombre} {apellido}")
-                    self.known_face_ids.append(persona_id)
-                    print(f"✅ Cargado: {nombre} {apellido}")
-                except Exception as e:
-                    print(f"❌ Error cargando {nombre}: {e}")
+            # La versión se lee antes: un cambio concurrente se recupera en sincronizar()
+            version = self.db.obtener_version_padron()
+            
+            copia = self.snapshot.leer(version, DIMENSION)
+            if copia is not None:
+                ids, nombres, claves, matriz = copia
+                # Filas ya normalizadas: en float32 la galería usa el memmap sin copiarlo
+                self.galeria.cargar(ids, nombres, matriz, claves, ya_normalizadas=True)
+                self.version_padron = version
+                self.version_snapshot = version
+                self.guardar_indice()
+                print(f"⚡ Galería cargada desde la copia binaria (versión {version})")
+                return
+            
+            # Los embeddings de otros modelos (p. ej. el tradicional) se filtran en la consulta
+            filas = self.db.obtener_embeddings(dimension=DIMENSION)
+            
+            ids = [fila[0] for fila in filas]
+            nombres = [fila[1] for fila in filas]
+            claves = [fila[2] for fila in filas]
+            embeddings = [fila[3] for fila in filas]
+            
+            # El índice reutiliza las asignaciones persistidas y solo ubica los cambios
+            self.galeria.cargar(ids, nombres, embeddings, claves)
+            self.version_padron = version
+            self.guardar_indice()
+            self.guardar_snapshot(filas)
             
         except Exception as e:
             print(f"❌ Error cargando rostros: {e}")
     
+    def guardar_snapshot(self, filas=None):
+        """Escribir la copia binaria de la galería para la versión actual del padrón
+        
+        La copia guarda filas float32 normalizadas. Una galería float16/int8
+        solo tiene filas aproximadas, así que entonces se usan `filas` (las
+        de obtener_embeddings) o se leen de la base de datos.
+        """
+        # La versión se toma antes que las filas: una copia con filas más
+        # nuevas que su versión se descarta al cargar, nunca al revés
+        version = self.version_padron
+        if version is None:
+            return
+        with self._lock_guardado:
+            if filas is None and self.galeria.precision == 'float32':
+                with self.galeria.lock:
+                    ids, nombres, claves = self.galeria.ids.copy(), self.galeria.nombres.copy(), self.galeria.claves.copy()
+                    matriz = self.galeria.matriz.copy()
+            else:
+                if filas is None:
+                    filas = self.db.obtener_embeddings(dimension=DIMENSION)
+                ids = [fila[0] for fila in filas]
+                nombres = [fila[1] for fila in filas]
+                claves = [fila[2] for fila in filas]
+                matriz = FaceGallery.normalizar(np.array([fila[3] for fila in filas], dtype=np.float32).reshape(-1, DIMENSION))
+            if self.snapshot.escribir(version, ids, nombres, claves, matriz):
+                self.version_snapshot = version
+    
+    def programar_snapshot(self):
+        """Guardar la copia binaria `espera_snapshot` segundos después del último cambio
+        
+        Varias altas seguidas (un registro masivo) producen una sola escritura.
+        """
+        with self._lock_snapshot:
+            if self.modelos_liberados:
+                return
+            if self._temporizador_snapshot is not None:
+                self._temporizador_snapshot.cancel()
+            self._temporizador_snapshot = threading.Timer(self.espera_snapshot, self._guardar_snapshot_programado)
+            self._temporizador_snapshot.daemon = True
+            self._temporizador_snapshot.start()
+    
+    def _guardar_snapshot_programado(self):
+        try:
+            if self.version_snapshot != self.version_padron:
+                self.guardar_snapshot()
+        except Exception as e:
+            print(f"⚠️  No se pudo guardar la copia de la galería: {e}")
+        finally:
+            # El temporizador corre en su propio hilo: cerrar su conexión de lectura
+            self.db.conexiones.soltar_lectura()
+    
+    def aplicar_cambio_padron(self, evento, datos):
+        """Aplicar un alta o baja notificada por la base de datos a la galería"""
+        if evento == 'alta':
+            ultima = self.galeria.ultima_clave()
+            for embedding_id, vector in datos['embeddings']:
+                if embedding_id > ultima and len(vector) == DIMENSION:
+                    self.galeria.agregar(datos['persona_id'], datos['nombre'], vector, embedding_id)
+        elif evento == 'baja':
+            self.galeria.eliminar_persona(datos['persona_id'])
+        
+        # Si la versión salta, hubo cambios de otro proceso que sincronizar() recogerá
+        if self.version_padron is not None and datos['version'] == self.version_padron + 1:
+            self.version_padron = datos['version']
+        self.guardar_indice()
+        self.programar_snapshot()
+    
+    def sincronizar(self):
+        """Ponerse al día con cambios hechos desde otro proceso leyendo solo lo nuevo"""
+        try:
+            version = self.db.obtener_version_padron()
+            if version == self.version_padron:
+                return False
+            
+            nuevos = self.db.obtener_embeddings(desde_id=self.galeria.ultima_clave(), dimension=DIMENSION)
+            for persona_id, nombre, clave, vector in nuevos:
+                self.galeria.agregar(persona_id, nombre, vector, clave)
+            
+            vigentes = self.db.obtener_ids_personas()
+            for persona_id in set(self.galeria.ids.tolist()) - vigentes:
+                self.galeria.eliminar_persona(persona_id)
+            
+            self.version_padron = version
+            self.guardar_indice()
+            self.programar_snapshot()
+            print(f"🔄 Padrón sincronizado (versión {version}): {len(self.galeria)} rostros")
+            return True
+            
+        except Exception as e:
+            print(f"❌ Error sincronizando rostros: {e}")
+            return False
+    
+    def guardar_indice(self):
+        """Persistir el índice de búsqueda si cambió"""
+        try:
+            if self.galeria.indice.modificado:
+                self.galeria.indice.guardar(self.ruta_indice)
+        except Exception as e:
+            print(f"⚠️  No se pudo guardar el índice: {e}")
+    
+    def resolver_identidad(self, coincidencias):
+        """Aplicar los umbrales de similitud a la mejor coincidencia"""
+        if coincidencias:
+            persona_id, nombre, mejor_similitud = coincidencias[0]
+            
+            print(f"🎯 Mejor coincidencia: {nombre} ({mejor_similitud:.3f})")
+            
+            if mejor_similitud > 0.6:  # Umbral para IA
+                return persona_id, nombre, mejor_similitud
+            elif mejor_similitud > 0.4:
+                return persona_id, f"Posiblemente {nombre}", mejor_similitud
+        
+        return None, "Persona no registrada", 0.0
+    
     def reconocer_rostro(self, imagen):
         """Reconocer rostro usando IA"""
         try:
@@ -146,46 +365,99 @@ class FaceRecognitionAI:
             if embedding is None:
                 return None, "No se detectó rostro", 0.0
             
-            if not self.known_face_encodings:
+            if len(self.galeria) == 0:
                 return None, "No hay personas registradas", 0.0
             
-            # Comparar con rostros conocidos
-            mejores_similitudes = []
-            for i, known_embedding in enumerate(self.known_face_encodings):
-                similitud = self.comparar_rostros_ia(embedding, known_embedding)
-                mejores_similitudes.append(similitud)
-                print(f"  📊 {self.known_face_names[i]}: {similitud:.3f}")
-            
-            if mejores_similitudes:
-                mejor_indice = np.argmax(mejores_similitudes)
-                mejor_similitud = mejores_similitudes[mejor_indice]
-                
-                print(f"🎯 Mejor coincidencia: {self.known_face_names[mejor_indice]} ({mejor_similitud:.3f})")
-                
-                if mejor_similitud > 0.6:  # Umbral para IA
-                    return (
-                        self.known_face_ids[mejor_indice],
-                        self.known_face_names[mejor_indice],
-                        mejor_similitud
-                    )
-                elif mejor_similitud > 0.4:
-                    return (
-                        self.known_face_ids[mejor_indice],
-                        f"Posiblemente {self.known_face_names[mejor_indice]}",
-                        mejor_similitud
-                    )
-            
-            return None, "Persona no registrada", 0.0
+            # Comparar contra toda la galería con un solo producto matriz-vector
+            return self.resolver_identidad(self.galeria.buscar(embedding, k=1))
             
         except Exception as e:
             print(f"❌ Error en IA: {e}")
             return None, "Error en reconocimiento", 0.0
     
+    def reconocer_rostros(self, imagen, prob_minima=0.9, con_embeddings=False):
+        """Reconocer todos los rostros de la imagen: una detección, un forward en lote
+
+        Devuelve una lista de (box, persona_id, nombre, similitud) con la caja
+        en coordenadas (x1, y1, x2, y2) de la imagen original. Con
+        `con_embeddings` cada tupla incluye además el embedding del rostro.
+        """
+        try:
+            boxes, probs, caras = self.detectar_y_alinear(imagen)
+            if caras is None:
+                return []
+            
+            seleccion = [i for i, prob in enumerate(probs) if prob >= prob_minima]
+            if not seleccion:
+                return []
+            
+            with torch.no_grad():
+                embeddings = self.resnet(caras[seleccion]).numpy()
+            
+            if len(self.galeria) == 0:
+                coincidencias = [[] for _ in seleccion]
+            else:
+                coincidencias = self.galeria.buscar_lote(embeddings, k=1)
+            
+            resultados = []
+            for i, embedding, candidatos in zip(seleccion, embeddings, coincidencias):
+                if candidatos:
+                    persona_id, nombre, similitud = self.resolver_identidad(candidatos)
+                else:
+                    persona_id, nombre, similitud = None, "No hay personas registradas", 0.0
+                resultado = (boxes[i].astype(int), persona_id, nombre, similitud)
+                resultados.append(resultado + (embedding,) if con_embeddings else resultado)
+            return resultados
+            
+        except Exception as e:
+            print(f"❌ Error en reconocimiento múltiple: {e}")
+            return []
+    
+    def reconocer_en_cajas(self, imagen, cajas, con_embeddings=False):
+        """Reconocer los rostros de cajas (x, y, w, h) ya detectadas, sin volver a detectar
+        
+        MTCNN solo recorta y alinea cada caja y FaceNet procesa todas en un
+        forward. Devuelve una tupla (persona_id, nombre, similitud) por caja,
+        en el mismo orden, más el embedding con `con_embeddings`.
+        """
+        if len(cajas) == 0:
+            return []
+        try:
+            imagen_pil = Image.fromarray(cv2.cvtColor(imagen, cv2.COLOR_BGR2RGB))
+            boxes = np.array([(x, y, x + w, y + h) for x, y, w, h in cajas], dtype=np.float32)
+            caras = self.mtcnn.extract(imagen_pil, boxes, None)
+            
+            with torch.no_grad():
+                embeddings = self.resnet(caras).numpy()
+            
+            if len(self.galeria) == 0:
+                coincidencias = [[] for _ in cajas]
+            else:
+                coincidencias = self.galeria.buscar_lote(embeddings, k=1)
+            
+            resultados = []
+            for embedding, candidatos in zip(embeddings, coincidencias):
+                if candidatos:
+                    resultado = self.resolver_identidad(candidatos)
+                else:
+                    resultado = (None, "No hay personas registradas", 0.0)
+                resultados.append(resultado + (embedding,) if con_embeddings else resultado)
+            return resultados
+            
+        except Exception as e:
+            print(f"❌ Error reconociendo cajas: {e}")
+            return []
+    
     def registrar_nueva_persona(self, nombre, apellido, email, imagen):
-        """Registrar nueva persona usando IA"""
+        """Registrar nueva persona usando IA
+        
+        `imagen` puede ser una captura o una lista de capturas; cada una se
+        guarda como una plantilla de la persona.
+        """
         try:
             print(f"📝 IA Registrando: {nombre} {apellido}")
-            embedding = self.extraer_embedding_ia(imagen)
+            imagenes = [imagen] if isinstance(imagen, np.ndarray) else list(imagen)
+            embedding, _ = self.extraer_embeddings_ia(imagenes)
             
             if embedding is None:
                 return False, "No se pudo detectar un rostro con IA. Asegúrese de:\n• Buena iluminación\n• Rostro frontal y claro\n• Sin obstrucciones"
@@ -199,7 +471,7 @@ class FaceRecognitionAI:
             success, mensaje = self.db.registrar_persona(nombre, apellido, email, embedding)
             
             if success:
-                self.cargar_rostros_conocidos()
+                # La galería ya recibió el alta por el evento de la base de datos
                 print(f"✅ {nombre} {apellido} registrado con IA")
             
             return success, mensaje
@@ -212,32 +484,22 @@ class FaceRecognitionAI:
     def dibujar_detecciones(self, imagen):
         """Dibujar detecciones en la imagen"""
         try:
-            imagen_rgb = cv2.cvtColor(imagen, cv2.COLOR_BGR2RGB)
-            imagen_pil = Image.fromarray(imagen_rgb)
-            
-            # Detectar rostros
-            boxes, probs = self.mtcnn.detect(imagen_pil)
-            
-            if boxes is not None:
-                for box, prob in zip(boxes, probs):
-                    if prob > 0.9:  # Confianza alta
-                        x1, y1, x2, y2 = box.astype(int)
-                        
-                        # Dibujar rectángulo
-                        cv2.rectangle(imagen, (x1, y1), (x2, y2), (0, 255, 0), 2)
-                        
-                        # Reconocer persona
-                        persona_id, nombre, confianza = self.reconocer_rostro(imagen)
-                        
-                        if persona_id is not None:
-                            texto = f"{nombre} ({confianza:.1%})"
-                            color = (0, 255, 0)
-                        else:
-                            texto = "Desconocido"
-                            color = (0, 0, 255)
-                        
-                        cv2.putText(imagen, texto, (x1, y1-10), 
-                                  cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
+            # Detectar y reconocer todos los rostros de una sola vez
+            for box, persona_id, nombre, confianza in self.reconocer_rostros(imagen):
+                x1, y1, x2, y2 = box
+                
+                # Dibujar rectángulo
+                cv2.rectangle(imagen, (x1, y1), (x2, y2), (0, 255, 0), 2)
+                
+                if persona_id is not None:
+                    texto = f"{nombre} ({confianza:.1%})"
+                    color = (0, 255, 0)
+                else:
+                    texto = "Desconocido"
+                    color = (0, 0, 255)
+                
+                cv2.putText(imagen, texto, (x1, y1-10), 
+                          cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
             
             return imagen
             
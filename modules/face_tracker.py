@@ -0,0 +1,182 @@
+import time
+import numpy as np
+
+
+def calcular_iou(cajas_a, cajas_b):
+    """Matriz IoU entre dos conjuntos de cajas (x, y, w, h)"""
+    a = np.asarray(cajas_a, dtype=np.float32).reshape(-1, 4)
+    b = np.asarray(cajas_b, dtype=np.float32).reshape(-1, 4)
+
+    ax2, ay2 = a[:, 0] + a[:, 2], a[:, 1] + a[:, 3]
+    bx2, by2 = b[:, 0] + b[:, 2], b[:, 1] + b[:, 3]
+
+    ancho = np.minimum(ax2[:, None], bx2[None, :]) - np.maximum(a[:, 0][:, None], b[:, 0][None, :])
+    alto = np.minimum(ay2[:, None], by2[None, :]) - np.maximum(a[:, 1][:, None], b[:, 1][None, :])
+    interseccion = np.clip(ancho, 0, None) * np.clip(alto, 0, None)
+
+    area_a = a[:, 2] * a[:, 3]
+    area_b = b[:, 2] * b[:, 3]
+    union = area_a[:, None] + area_b[None, :] - interseccion
+    return np.where(union > 0, interseccion / np.maximum(union, 1e-6), 0.0)
+
+
+def emparejar_cajas(cajas_a, cajas_b, umbral=0.3):
+    """Emparejamiento voraz por IoU; devuelve pares (i, j)"""
+    if len(cajas_a) == 0 or len(cajas_b) == 0:
+        return []
+
+    iou = calcular_iou(cajas_a, cajas_b)
+    pares = []
+    usados_a = set()
+    usados_b = set()
+    for plano in np.argsort(-iou, axis=None):
+        i, j = np.unravel_index(plano, iou.shape)
+        if iou[i, j] < umbral:
+            break
+        if i in usados_a or j in usados_b:
+            continue
+        pares.append((int(i), int(j)))
+        usados_a.add(i)
+        usados_b.add(j)
+    return pares
+
+
+class Track:
+    """Rostro seguido entre frames con su identidad y emoción en caché"""
+
+    def __init__(self, track_id, caja, ahora):
+        self.id = track_id
+        self.caja = tuple(int(v) for v in caja)
+        self.creado = ahora
+        self.visto = ahora
+        self.perdidos = 0
+
+        self.persona_id = None
+        self.nombre = "Desconocido"
+        self.confianza = 0.0
+        self.embedding = None
+        self.ultimo_reconocimiento = None
+        self.ultimo_intento = None
+
+        self.emocion = "---"
+        self.confianza_emocion = 0.0
+        self.ultima_emocion = None
+
+    def centro(self):
+        x, y, w, h = self.caja
+        return x + w / 2.0, y + h / 2.0
+
+
+class FaceTracker:
+    """Seguimiento IoU/centroide para reutilizar identidades entre frames
+
+    Cada rostro recibe un id estable. Un track solo se vuelve a reconocer
+    cuando es nuevo, cuando su confianza decae por debajo de
+    `confianza_minima` o cuando vence `intervalo_refresco`; los rostros aún
+    no identificados se reintentan cada `intervalo_reintento`.
+    """
+
+    def __init__(self, umbral_iou=0.3, max_perdidos=10, intervalo_refresco=3.0,
+                 intervalo_reintento=0.5, intervalo_emocion=0.5,
+                 decaimiento=0.05, confianza_minima=0.6):
+        self.umbral_iou = umbral_iou
+        self.max_perdidos = max_perdidos
+        self.intervalo_refresco = intervalo_refresco
+        self.intervalo_reintento = intervalo_reintento
+        self.intervalo_emocion = intervalo_emocion
+        self.decaimiento = decaimiento
+        self.confianza_minima = confianza_minima
+
+        self.tracks = []
+        self._siguiente_id = 1
+
+    def reiniciar(self):
+        self.tracks = []
+
+    def _emparejar_por_centroide(self, tracks, cajas, libres_t, libres_c):
+        """Recuperar movimientos bruscos que dejan IoU bajo pero centros cercanos"""
+        pares = []
+        for i in list(libres_t):
+            cx, cy = tracks[i].centro()
+            _, _, w, h = tracks[i].caja
+            mejor, mejor_dist = None, 0.5 * max(w, h)
+            for j in libres_c:
+                x, y, cw, ch = cajas[j]
+                dist = np.hypot(x + cw / 2.0 - cx, y + ch / 2.0 - cy)
+                if dist < mejor_dist:
+                    mejor, mejor_dist = j, dist
+            if mejor is not None:
+                pares.append((i, mejor))
+                libres_t.discard(i)
+                libres_c.discard(mejor)
+        return pares
+
+    def actualizar(self, cajas, ahora=None):
+        """Asociar las cajas del frame a tracks; devuelve un track por caja, en orden"""
+        ahora = time.time() if ahora is None else ahora
+        cajas = [tuple(int(v) for v in caja) for caja in cajas]
+
+        pares = emparejar_cajas([t.caja for t in self.tracks], cajas, self.umbral_iou)
+        libres_t = set(range(len(self.tracks))) - {i for i, _ in pares}
+        libres_c = set(range(len(cajas))) - {j for _, j in pares}
+        pares += self._emparejar_por_centroide(self.tracks, cajas, libres_t, libres_c)
+
+        asignados = [None] * len(cajas)
+        for i, j in pares:
+            track = self.tracks[i]
+            track.caja = cajas[j]
+            track.visto = ahora
+            track.perdidos = 0
+            asignados[j] = track
+
+        for i in libres_t:
+            self.tracks[i].perdidos += 1
+
+        for j in sorted(libres_c):
+            track = Track(self._siguiente_id, cajas[j], ahora)
+            self._siguiente_id += 1
+            self.tracks.append(track)
+            asignados[j] = track
+
+        self.tracks = [t for t in self.tracks if t.perdidos <= self.max_perdidos]
+        return asignados
+
+    def confianza_actual(self, track, ahora):
+        """Confianza de la identidad decayendo con el tiempo desde el último reconocimiento"""
+        if track.ultimo_reconocimiento is None:
+            return 0.0
+        return track.confianza - self.decaimiento * (ahora - track.ultimo_reconocimiento)
+
+    def necesita_reconocimiento(self, track, ahora):
+        if track.ultimo_intento is not None and ahora - track.ultimo_intento < self.intervalo_reintento:
+            return False
+        if track.ultimo_reconocimiento is None:
+            return True
+        transcurrido = ahora - track.ultimo_reconocimiento
+        if track.persona_id is None:
+            return transcurrido >= self.intervalo_reintento
+        if transcurrido >= self.intervalo_refresco:
+            return True
+        return self.confianza_actual(track, ahora) < self.confianza_minima
+
+    def marcar_intento(self, track, ahora=None):
+        """Registrar un reconocimiento fallido para no reintentarlo en cada frame"""
+        track.ultimo_intento = time.time() if ahora is None else ahora
+
+    def asignar_identidad(self, track, persona_id, nombre, confianza, embedding=None, ahora=None):
+        ahora = time.time() if ahora is None else ahora
+        track.persona_id = persona_id
+        track.nombre = nombre if persona_id is not None else "Desconocido"
+        track.confianza = confianza
+        if embedding is not None:
+            track.embedding = embedding
+        track.ultimo_reconocimiento = ahora
+        track.ultimo_intento = ahora
+
+    def necesita_emocion(self, track, ahora):
+        return track.ultima_emocion is None or ahora - track.ultima_emocion >= self.intervalo_emocion
+
+    def asignar_emocion(self, track, emocion, confianza, ahora=None):
+        track.emocion = emocion
+        track.confianza_emocion = confianza
+        track.ultima_emocion = time.time() if ahora is None else ahora
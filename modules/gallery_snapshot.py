@@ -0,0 +1,125 @@
+import glob
+import json
+import os
+import tempfile
+import threading
+import numpy as np
+
+# Un lock por copia (ruta base): varias galerías del mismo proceso reciben
+# los mismos eventos del padrón y guardan la misma copia casi a la vez
+_locks = {}
+_lock_locks = threading.Lock()
+
+
+def _lock_de(ruta_base):
+    with _lock_locks:
+        return _locks.setdefault(os.path.abspath(ruta_base), threading.Lock())
+
+
+class GallerySnapshot:
+    """Copia binaria versionada de una galería para arrancar sin leer SQLite
+
+    La matriz se guarda como `.npy` float32 y se abre con memmap, sin
+    parsear nada; ids, nombres y claves van en un `.json` junto a ella.
+    El `.json` se reemplaza al final y apunta al `.npy` de su versión,
+    así un lector nunca mezcla la matriz de una versión con los ids de
+    otra. La copia solo es válida si su versión coincide con la del padrón.
+    """
+
+    def __init__(self, ruta_base):
+        self.ruta_base = ruta_base
+        self.ruta_json = ruta_base + '.json'
+
+    def leer(self, version, dimension=None):
+        """Devolver (ids, nombres, claves, matriz) o None si falta, está obsoleta o dañada"""
+        try:
+            with open(self.ruta_json, encoding='utf-8') as f:
+                meta = json.load(f)
+            if meta['version'] != version:
+                return None
+            if dimension is not None and meta['dimension'] != dimension:
+                return None
+
+            ruta_matriz = os.path.join(os.path.dirname(self.ruta_json), meta['matriz'])
+            matriz = np.load(ruta_matriz, mmap_mode='r')
+            if matriz.shape != (len(meta['ids']), meta['dimension']) or matriz.dtype != np.float32:
+                return None
+            return meta['ids'], meta['nombres'], meta['claves'], matriz
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"⚠️  Copia de galería inválida ({e}), se leerá la base de datos")
+            return None
+
+    def _version_escrita(self):
+        try:
+            with open(self.ruta_json, encoding='utf-8') as f:
+                return json.load(f)['version']
+        except Exception:
+            return None
+
+    def _temporal(self, destino):
+        """Archivo temporal único junto a `destino` (os.replace exige el mismo disco)"""
+        descriptor, temporal = tempfile.mkstemp(dir=os.path.dirname(destino) or '.',
+                                                prefix=os.path.basename(destino) + '.', suffix='.tmp')
+        os.close(descriptor)
+        return temporal
+
+    def escribir(self, version, ids, nombres, claves, matriz):
+        """Escribir la copia de una versión del padrón (escritura atómica)
+
+        Cada escritura usa sus propios temporales; dentro del proceso se
+        serializan por copia y una versión más vieja que la ya escrita se
+        omite, así el `.json` nunca apunta a una matriz borrada.
+        """
+        with _lock_de(self.ruta_base):
+            escrita = self._version_escrita()
+            if escrita is not None and escrita > version:
+                return False
+            return self._escribir(version, ids, nombres, claves, matriz)
+
+    def _escribir(self, version, ids, nombres, claves, matriz):
+        matriz = np.ascontiguousarray(matriz, dtype=np.float32)
+        if matriz.ndim != 2:
+            matriz = matriz.reshape(len(ids), -1)
+        nombre_matriz = f"{os.path.basename(self.ruta_base)}.v{version}.npy"
+        ruta_matriz = os.path.join(os.path.dirname(self.ruta_json), nombre_matriz)
+
+        temporal = None
+        try:
+            temporal = self._temporal(ruta_matriz)
+            with open(temporal, 'wb') as f:
+                np.save(f, matriz)
+            os.replace(temporal, ruta_matriz)
+
+            meta = {
+                'version': version,
+                'dimension': int(matriz.shape[1]),
+                'matriz': nombre_matriz,
+                'ids': [int(i) for i in ids],
+                'nombres': [str(n) for n in nombres],
+                'claves': [int(c) for c in claves],
+            }
+            temporal = self._temporal(self.ruta_json)
+            with open(temporal, 'w', encoding='utf-8') as f:
+                json.dump(meta, f, ensure_ascii=False)
+            os.replace(temporal, self.ruta_json)
+        except Exception as e:
+            print(f"⚠️  No se pudo guardar la copia de la galería: {e}")
+            if temporal is not None and os.path.exists(temporal):
+                os.remove(temporal)
+            return False
+
+        self._limpiar(ruta_matriz)
+        print(f"💾 Copia de galería guardada: {len(ids)} rostros (versión {version})")
+        return True
+
+    def _limpiar(self, vigente):
+        """Borrar las matrices de versiones anteriores"""
+        for ruta in glob.glob(glob.escape(self.ruta_base) + '.v*.npy'):
+            if os.path.abspath(ruta) != os.path.abspath(vigente):
+                try:
+                    os.remove(ruta)
+                except OSError:
+                    # En Windows puede seguir abierta como memmap en otra ventana
+                    pass
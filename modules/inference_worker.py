@@ -0,0 +1,108 @@
+import queue
+import threading
+import time
+
+
+class InferenceWorker:
+    """Hilo de inferencia en segundo plano para no bloquear el bucle de Tk
+
+    El bucle de la interfaz entrega frames con `enviar` y recoge resultados
+    con `obtener_resultado`. La cola de entrada tiene un solo hueco: si
+    llega un frame nuevo mientras el anterior sigue esperando, el viejo se
+    descarta, así la inferencia siempre trabaja sobre el frame más reciente.
+    Se usa un único hilo porque el seguimiento entre frames es secuencial y
+    los modelos de torch/Keras ya paralelizan internamente.
+    """
+
+    def __init__(self, procesar, nombre="inferencia"):
+        self.procesar = procesar
+        self.nombre = nombre
+        self.entrada = queue.Queue(maxsize=1)
+        self.salida = queue.Queue()
+
+        self.frames_enviados = 0
+        self.frames_procesados = 0
+        self.frames_descartados = 0
+        self.ultima_latencia = 0.0
+
+        self._detener = threading.Event()
+        self._hilo = None
+
+    def iniciar(self):
+        if self._hilo is not None and self._hilo.is_alive():
+            if not self._detener.is_set():
+                return
+            # Un detener() anterior no alcanzó a esperar la inferencia en
+            # curso: se espera a que termine para no tener dos hilos
+            self._hilo.join()
+            self._vaciar()
+        self._hilo = None
+        self._detener.clear()
+        self._hilo = threading.Thread(target=self._bucle, name=self.nombre, daemon=True)
+        self._hilo.start()
+
+    def activo(self):
+        return self._hilo is not None and self._hilo.is_alive()
+
+    def enviar(self, frame, marca_tiempo=None):
+        """Encolar un frame descartando el pendiente si la inferencia va atrasada"""
+        marca_tiempo = time.time() if marca_tiempo is None else marca_tiempo
+        try:
+            self.entrada.get_nowait()
+            self.frames_descartados += 1
+        except queue.Empty:
+            pass
+        try:
+            self.entrada.put_nowait((frame, marca_tiempo))
+            self.frames_enviados += 1
+        except queue.Full:
+            self.frames_descartados += 1
+
+    def ocupado(self):
+        return not self.entrada.empty()
+
+    def obtener_resultado(self):
+        """Devolver el resultado más reciente (o None), descartando los anteriores"""
+        resultado = None
+        while True:
+            try:
+                resultado = self.salida.get_nowait()
+            except queue.Empty:
+                return resultado
+
+    def _bucle(self):
+        while not self._detener.is_set():
+            try:
+                frame, marca_tiempo = self.entrada.get(timeout=0.1)
+            except queue.Empty:
+                continue
+
+            try:
+                resultado = self.procesar(frame, marca_tiempo)
+            except Exception as e:
+                print(f"❌ Error en hilo de inferencia: {e}")
+                continue
+
+            self.frames_procesados += 1
+            self.ultima_latencia = time.time() - marca_tiempo
+            self.salida.put(resultado)
+
+    def detener(self, timeout=2.0):
+        """Pedir al hilo que termine; False si una inferencia sigue en curso tras `timeout`"""
+        self._detener.set()
+        if self._hilo is not None:
+            self._hilo.join(timeout)
+            if self._hilo.is_alive():
+                # Se conserva el hilo: iniciar() lo esperará y vaciará las colas
+                print(f"⚠️  La inferencia en curso no terminó en {timeout:.1f}s")
+                return False
+            self._hilo = None
+        self._vaciar()
+        return True
+
+    def _vaciar(self):
+        # Vaciar colas para un próximo inicio limpio
+        while not self.entrada.empty():
+            self.entrada.get_nowait()
+        while not self.salida.empty():
+            self.salida.get_nowait()
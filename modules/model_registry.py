@@ -0,0 +1,130 @@
+import threading
+import time
+
+
+class ModelRegistry:
+    """Registro de modelos compartidos por todo el proceso
+
+    Cada modelo se carga una sola vez, la primera vez que alguien lo pide,
+    y se cuentan las referencias activas. Liberar una referencia no borra
+    el modelo: queda en memoria para que reabrir una ventana sea inmediato
+    hasta que se llame explícitamente a `descargar`.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._fabricas = {}
+        self._calentadores = {}
+        self._modelos = {}
+        self._referencias = {}
+        self._tiempos_carga = {}
+        self._cargando = {}
+
+    def registrar_fabrica(self, nombre, fabrica, calentar=None):
+        """Declarar cómo se construye un modelo (sin cargarlo todavía)
+
+        `calentar(modelo)` ejecuta una inferencia con datos ficticios para
+        pagar por adelantado el coste de la primera pasada.
+        """
+        with self._lock:
+            self._fabricas[nombre] = fabrica
+            if calentar is not None:
+                self._calentadores[nombre] = calentar
+
+    def nombres(self):
+        with self._lock:
+            return list(self._fabricas)
+
+    def calentar(self, nombre):
+        """Ejecutar la pasada de calentamiento del modelo (debe estar cargado)"""
+        with self._lock:
+            modelo = self._modelos.get(nombre)
+            calentador = self._calentadores.get(nombre)
+        if modelo is not None and calentador is not None:
+            calentador(modelo)
+
+    def obtener(self, nombre):
+        """Obtener el modelo (cargándolo si hace falta) y sumar una referencia"""
+        modelo = self._cargar(nombre)
+        with self._lock:
+            self._referencias[nombre] = self._referencias.get(nombre, 0) + 1
+        return modelo
+
+    def _cargar(self, nombre):
+        with self._lock:
+            if nombre in self._modelos:
+                return self._modelos[nombre]
+            if nombre not in self._fabricas:
+                raise KeyError(f"Modelo no registrado: {nombre}")
+            evento = self._cargando.get(nombre)
+            propio = evento is None
+            if propio:
+                evento = threading.Event()
+                self._cargando[nombre] = evento
+
+        if not propio:
+            # Otro hilo ya lo está cargando: esperar en lugar de cargarlo dos veces
+            evento.wait()
+            with self._lock:
+                if nombre in self._modelos:
+                    return self._modelos[nombre]
+            return self._cargar(nombre)
+
+        try:
+            inicio = time.perf_counter()
+            modelo = self._fabricas[nombre]()
+            duracion = time.perf_counter() - inicio
+            with self._lock:
+                self._modelos[nombre] = modelo
+                self._tiempos_carga[nombre] = duracion
+            print(f"📦 Modelo '{nombre}' cargado en {duracion:.2f}s")
+            return modelo
+        finally:
+            with self._lock:
+                self._cargando.pop(nombre, None)
+            evento.set()
+
+    def liberar(self, nombre):
+        """Restar una referencia (el modelo sigue cargado)"""
+        with self._lock:
+            if self._referencias.get(nombre, 0) > 0:
+                self._referencias[nombre] -= 1
+
+    def descargar(self, nombre, forzar=False):
+        """Quitar un modelo de memoria si nadie lo está usando"""
+        with self._lock:
+            if nombre not in self._modelos:
+                return False
+            if self._referencias.get(nombre, 0) > 0 and not forzar:
+                print(f"⚠️  Modelo '{nombre}' en uso ({self._referencias[nombre]} referencias), no se descarga")
+                return False
+            del self._modelos[nombre]
+            self._referencias.pop(nombre, None)
+            print(f"🗑️  Modelo '{nombre}' descargado")
+            return True
+
+    def descargar_todos(self, forzar=False):
+        with self._lock:
+            nombres = list(self._modelos)
+        for nombre in nombres:
+            self.descargar(nombre, forzar)
+
+    def cargado(self, nombre):
+        with self._lock:
+            return nombre in self._modelos
+
+    def estado(self):
+        """Resumen de modelos cargados, referencias y tiempos de carga"""
+        with self._lock:
+            return {
+                nombre: {
+                    'cargado': nombre in self._modelos,
+                    'referencias': self._referencias.get(nombre, 0),
+                    'tiempo_carga': self._tiempos_carga.get(nombre),
+                }
+                for nombre in self._fabricas
+            }
+
+
+# Registro único del proceso
+registro = ModelRegistry()
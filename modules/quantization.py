@@ -0,0 +1,161 @@
+import argparse
+import json
+import time
+import numpy as np
+
+PRECISIONES = ('float32', 'float16', 'int8')
+
+
+def cuantizar(matriz, precision='float32'):
+    """Cuantizar filas de embeddings; devuelve (codigos, escalas)
+
+    int8 usa una escala por fila (máximo absoluto / 127), así cada vector
+    aprovecha todo el rango independientemente de su magnitud.
+    """
+    matriz = np.ascontiguousarray(np.atleast_2d(matriz), dtype=np.float32)
+    if precision == 'float32':
+        return matriz, None
+    if precision == 'float16':
+        return matriz.astype(np.float16), None
+    if precision == 'int8':
+        escalas = np.abs(matriz).max(axis=1, initial=0.0) / 127.0
+        escalas[escalas == 0] = 1.0
+        codigos = np.clip(np.rint(matriz / escalas[:, None]), -127, 127).astype(np.int8)
+        return codigos, escalas.astype(np.float32)
+    raise ValueError(f"Precisión desconocida: {precision}")
+
+
+def decuantizar(codigos, escalas=None):
+    """Reconstruir las filas en float32"""
+    matriz = np.asarray(codigos).astype(np.float32)
+    if escalas is not None:
+        matriz *= escalas[:, None]
+    return matriz
+
+
+def similitudes(codigos, escalas, consultas, bloque=65536):
+    """Producto punto de las consultas contra filas cuantizadas, por bloques
+
+    Las filas se convierten a float32 por bloques para usar BLAS sin
+    materializar toda la galería en float32.
+    """
+    consultas = np.asarray(consultas, dtype=np.float32)
+    if codigos.dtype == np.float32:
+        return codigos @ consultas.T
+
+    una = consultas.ndim == 1
+    consultas = np.atleast_2d(consultas)
+    salida = np.empty((len(codigos), len(consultas)), dtype=np.float32)
+    for inicio in range(0, len(codigos), bloque):
+        filas = codigos[inicio:inicio + bloque].astype(np.float32)
+        puntajes = filas @ consultas.T
+        if escalas is not None:
+            puntajes *= escalas[inicio:inicio + bloque, None]
+        salida[inicio:inicio + bloque] = puntajes
+    return salida[:, 0] if una else salida
+
+
+def codificar_embedding(embedding, formato='float32'):
+    """Serializar un embedding para la base de datos
+
+    'json' produce texto; el resto bytes little-endian. En int8 los
+    primeros 4 bytes son la escala float32.
+    """
+    vector = np.asarray(embedding, dtype=np.float32).ravel()
+    if formato == 'json':
+        return json.dumps(vector.tolist())
+    codigos, escalas = cuantizar(vector, formato)
+    datos = codigos.astype(codigos.dtype.newbyteorder('<')).tobytes()
+    if escalas is not None:
+        datos = escalas.astype('<f4').tobytes() + datos
+    return datos
+
+
+def decodificar_embedding(valor, formato=None):
+    """Leer un embedding guardado como JSON (texto) o como bytes cuantizados"""
+    if formato in (None, 'json') or isinstance(valor, str):
+        return np.array(json.loads(valor), dtype=np.float32)
+    datos = bytes(valor)
+    if formato == 'float32':
+        return np.frombuffer(datos, dtype='<f4').astype(np.float32)
+    if formato == 'float16':
+        return np.frombuffer(datos, dtype='<f2').astype(np.float32)
+    if formato == 'int8':
+        escala = np.frombuffer(datos[:4], dtype='<f4')[0]
+        return np.frombuffer(datos[4:], dtype=np.int8).astype(np.float32) * escala
+    raise ValueError(f"Formato de embedding desconocido: {formato}")
+
+
+def medir_perdida(matriz, consultas, precisiones=PRECISIONES, k=1):
+    """Comparar cada precisión contra float32: memoria, error de similitud y acuerdo top-k"""
+    matriz = np.asarray(matriz, dtype=np.float32)
+    referencia = matriz @ np.asarray(consultas, dtype=np.float32).T
+    k = min(k, len(matriz))
+    top_referencia = np.argpartition(-referencia, k - 1, axis=0)[:k]
+
+    resultados = {}
+    for precision in precisiones:
+        codigos, escalas = cuantizar(matriz, precision)
+
+        inicio = time.perf_counter()
+        puntajes = similitudes(codigos, escalas, consultas)
+        duracion = time.perf_counter() - inicio
+
+        top = np.argpartition(-puntajes, k - 1, axis=0)[:k]
+        acuerdo = np.mean([
+            len(np.intersect1d(top[:, i], top_referencia[:, i])) / k
+            for i in range(top.shape[1])
+        ])
+        error = np.abs(puntajes - referencia)
+        memoria = codigos.nbytes + (escalas.nbytes if escalas is not None else 0)
+
+        resultados[precision] = {
+            'memoria_mb': memoria / 1e6,
+            'error_medio': float(error.mean()),
+            'error_maximo': float(error.max()),
+            'acuerdo_top_k': float(acuerdo),
+            'latencia_ms': 1000 * duracion / max(len(consultas), 1),
+        }
+    return resultados
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pérdida de precisión de las galerías float16/int8 frente a float32")
+    parser.add_argument('--db', default=None, help="Usar los embeddings de esta base de datos")
+    parser.add_argument('--rostros', type=int, default=20000, help="Tamaño de la galería sintética")
+    parser.add_argument('--dimension', type=int, default=512)
+    parser.add_argument('--consultas', type=int, default=200)
+    parser.add_argument('--ruido', type=float, default=0.6)
+    parser.add_argument('-k', type=int, default=1)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    if args.db:
+        from modules.database import DatabaseManager
+        from modules.face_gallery import FaceGallery
+        filas = DatabaseManager(args.db).obtener_embeddings(dimension=args.dimension)
+        galeria = FaceGallery(dimension=args.dimension)
+        galeria.cargar([f[0] for f in filas], [f[1] for f in filas], [f[3] for f in filas])
+        matriz = galeria.matriz
+    else:
+        matriz = rng.standard_normal((args.rostros, args.dimension)).astype(np.float32)
+        matriz /= np.linalg.norm(matriz, axis=1, keepdims=True)
+
+    if len(matriz) == 0:
+        print("❌ No hay embeddings para evaluar")
+        return
+
+    elegidos = rng.choice(len(matriz), min(args.consultas, len(matriz)), replace=False)
+    ruido = rng.standard_normal((len(elegidos), matriz.shape[1])).astype(np.float32)
+    consultas = matriz[elegidos] + args.ruido * ruido / np.sqrt(matriz.shape[1])
+    consultas /= np.linalg.norm(consultas, axis=1, keepdims=True)
+
+    print(f"📊 {len(matriz)} rostros x {matriz.shape[1]} dimensiones, {len(consultas)} consultas")
+    print(f"{'precisión':>10} {'MB':>8} {'err medio':>10} {'err máx':>9} {'top-k':>7} {'ms':>7}")
+    for precision, r in medir_perdida(matriz, consultas, k=args.k).items():
+        print(f"{precision:>10} {r['memoria_mb']:>8.2f} {r['error_medio']:>10.5f} "
+              f"{r['error_maximo']:>9.5f} {r['acuerdo_top_k']:>7.3f} {r['latencia_ms']:>7.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+import threading
+import time
+from modules.model_registry import registro
+
+
+class ModelWarmup:
+    """Carga y calienta los modelos en segundo plano al iniciar la aplicación
+
+    Importa los módulos de IA, carga cada modelo del registro compartido y
+    ejecuta una inferencia con datos ficticios, midiendo ambos tiempos. La
+    interfaz consulta `estado()` periódicamente; el hilo nunca toca Tk.
+    """
+
+    def __init__(self, modelos=('mtcnn', 'facenet', 'emociones')):
+        self.modelos = list(modelos)
+        self._lock = threading.Lock()
+        self._estado = {
+            nombre: {'estado': 'pendiente', 'carga': None, 'calentamiento': None, 'error': None}
+            for nombre in self.modelos
+        }
+        self._hilo = None
+        self.terminado = False
+
+    def iniciar(self):
+        if self._hilo is None:
+            self._hilo = threading.Thread(target=self._ejecutar, name="precalentamiento", daemon=True)
+            self._hilo.start()
+
+    def _actualizar(self, nombre, **cambios):
+        with self._lock:
+            self._estado[nombre].update(cambios)
+
+    def _ejecutar(self):
+        try:
+            # Registra las fábricas de MTCNN, FaceNet y el modelo de emociones
+            import modules.face_recognition_ai  # noqa: F401
+            import modules.emotion_analysis  # noqa: F401
+        except Exception as e:
+            for nombre in self.modelos:
+                self._actualizar(nombre, estado='error', error=str(e))
+            self.terminado = True
+            return
+
+        for nombre in self.modelos:
+            obtenido = False
+            try:
+                self._actualizar(nombre, estado='cargando')
+                inicio = time.perf_counter()
+                registro.obtener(nombre)
+                obtenido = True
+                carga = time.perf_counter() - inicio
+
+                self._actualizar(nombre, estado='calentando', carga=carga)
+                inicio = time.perf_counter()
+                registro.calentar(nombre)
+                calentamiento = time.perf_counter() - inicio
+
+                self._actualizar(nombre, estado='listo', calentamiento=calentamiento)
+                print(f"🔥 {nombre}: carga {carga:.2f}s, calentamiento {calentamiento:.2f}s")
+            except Exception as e:
+                print(f"❌ Error precalentando {nombre}: {e}")
+                self._actualizar(nombre, estado='error', error=str(e))
+            finally:
+                # El modelo queda en el registro; solo devolvemos nuestra referencia
+                if obtenido:
+                    registro.liberar(nombre)
+
+        self.terminado = True
+
+    def estado(self):
+        with self._lock:
+            return {nombre: dict(info) for nombre, info in self._estado.items()}
+
+    def listo(self):
+        return all(info['estado'] == 'listo' for info in self.estado().values())
+
+    def resumen(self):
+        """Texto corto para la barra de estado"""
+        partes = []
+        for nombre, info in self.estado().items():
+            if info['estado'] == 'listo':
+                partes.append(f"{nombre} ✅ {info['carga']:.1f}s+{info['calentamiento']:.1f}s")
+            elif info['estado'] == 'error':
+                partes.append(f"{nombre} ❌")
+            else:
+                partes.append(f"{nombre} ⏳ {info['estado']}")
+        return " | ".join(partes)
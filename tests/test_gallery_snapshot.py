@@ -0,0 +1,47 @@
+import threading
+import numpy as np
+from modules.gallery_snapshot import GallerySnapshot
+
+
+def _escribir_a_la_vez(ruta_base, versiones, filas=200, dimension=512):
+    barrera = threading.Barrier(len(versiones))
+    resultados = [None] * len(versiones)
+
+    def escribir(i, version):
+        # Cada hilo con su instancia, como dos ventanas con su propio reconocedor
+        copia = GallerySnapshot(ruta_base)
+        matriz = np.full((filas, dimension), version, dtype=np.float32)
+        barrera.wait()
+        resultados[i] = copia.escribir(version, list(range(filas)), [f"p{j}" for j in range(filas)],
+                                       list(range(filas)), matriz)
+
+    hilos = [threading.Thread(target=escribir, args=(i, v)) for i, v in enumerate(versiones)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    return resultados
+
+
+def test_escrituras_concurrentes_de_la_misma_version(tmp_path):
+    ruta_base = str(tmp_path / 'galeria_ia')
+    for _ in range(20):
+        assert _escribir_a_la_vez(ruta_base, [3, 3]) == [True, True]
+        ids, nombres, claves, matriz = GallerySnapshot(ruta_base).leer(3)
+        assert matriz.shape == (200, 512)
+        assert np.all(matriz == 3)
+    assert not list(tmp_path.glob('*.tmp'))
+
+
+def test_escrituras_concurrentes_de_versiones_distintas(tmp_path):
+    ruta_base = str(tmp_path / 'galeria_ia')
+    for ronda in range(20):
+        versiones = [2 * ronda + 1, 2 * ronda + 2]
+        resultados = _escribir_a_la_vez(ruta_base, versiones)
+        # La versión nueva siempre queda escrita; la vieja solo si llegó antes
+        assert resultados[1] is True
+        copia = GallerySnapshot(ruta_base).leer(versiones[1])
+        assert copia is not None
+        assert np.all(copia[3] == versiones[1])
+    assert not list(tmp_path.glob('*.tmp'))
+    assert len(list(tmp_path.glob('galeria_ia.v*.npy'))) == 1